@@ -8,3 +8,6 @@ echo "Building static files for onboarding web server"
   yarn install
   yarn build
 )
+
+echo "Precompressing static files"
+python3 "${DIR}/pt_os_web_portal/backend/precompress.py" "${DIR}/pt_os_web_portal/backend/build"
@@ -38,10 +38,41 @@ def _patch_modules():
         modules[module] = Mock()
 
 
+@pytest.fixture(autouse=True)
+def clear_helper_caches():
+    yield
+    cache_module = modules.get("pt_os_web_portal.backend.helpers.cache")
+    if cache_module:
+        cache_module.clear_caches()
+
+
+@pytest.fixture(autouse=True)
+def unregister_os_updater_clients():
+    yield
+    message_handler = modules.get("pt_os_web_portal.os_updater.message_handler")
+    if message_handler:
+        handler = message_handler.OSUpdaterFrontendMessageHandler()
+        handler.unregister_all_clients()
+        handler.clear_history()
+
+
 @pytest.fixture(scope="session")
-def patch_modules():
+def patch_modules(tmp_path_factory):
     _patch_modules()
 
+    # Keep the output of the commands run by tests out of the system log
+    from pt_os_web_portal.os_updater.log_sink import updater_log
+
+    updater_log.file_path = str(tmp_path_factory.mktemp("log") / "os-updater.log")
+
+
+@pytest.fixture(scope="function")
+def os_updater_job_file(patch_modules, tmp_path, mocker):
+    # Keep OS updater jobs out of the system state and other tests
+    job_file = tmp_path / "os-updater-job.json"
+    mocker.patch("pt_os_web_portal.os_updater.updater.JOB_STATE_FILE", str(job_file))
+    return job_file
+
 
 @pytest.fixture(scope="session")
 def app():
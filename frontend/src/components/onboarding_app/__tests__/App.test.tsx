@@ -41,6 +41,10 @@ import serverStatus from "../../../services/serverStatus";
 import restartWebPortalService from "../../../services/restartWebPortalService";
 import isConnectedThroughAp from "../../../services/isConnectedThroughAp";
 import isOnOpenboxSession from "../../../services/isOnOpenboxSession";
+import subscribeToStatus, {
+  Status,
+  SubscribeOptions,
+} from "../../../services/subscribeToStatus";
 
 import { waitFor } from "../../../../test/helpers/waitFor";
 import wsBaseUrl from "../../../services/wsBaseUrl";
@@ -66,6 +70,7 @@ jest.mock("../../../services/serverStatus");
 jest.mock("../../../services/restartWebPortalService");
 jest.mock("../../../services/isConnectedThroughAp");
 jest.mock("../../../services/isOnOpenboxSession");
+jest.mock("../../../services/subscribeToStatus");
 
 const getBuildInfoMock = getBuildInfo as jest.Mock;
 const getLocalesMock = getLocales as jest.Mock;
@@ -88,6 +93,22 @@ const serverStatusMock = serverStatus as jest.Mock;
 const restartWebPortalServiceMock = restartWebPortalService as jest.Mock;
 const isConnectedThroughApMock = isConnectedThroughAp as jest.Mock;
 const isOnOpenboxSessionMock = isOnOpenboxSession as jest.Mock;
+const subscribeToStatusMock = subscribeToStatus as jest.Mock;
+
+type Subscriber = SubscribeOptions & { onStatus: (status: Status) => void };
+let subscribers: Subscriber[] = [];
+
+// the status stream of the subscribers closes and fails to reconnect
+const loseStatusStream = (failures: number) =>
+  subscribers.forEach(({ onDisconnect }) => {
+    for (let i = 0; i < failures; i++) {
+      onDisconnect && onDisconnect();
+    }
+  });
+
+// the status stream of the subscribers reconnects
+const restoreStatusStream = () =>
+  subscribers.forEach(({ onStatus }) => onStatus({}));
 
 const keyboardVariants = {
   us: {
@@ -201,6 +222,17 @@ describe("App", () => {
     serverStatusMock.mockResolvedValue("OK");
     restartWebPortalServiceMock.mockResolvedValue("OK");
 
+    subscribers = [];
+    subscribeToStatusMock.mockImplementation(
+      (onStatus, options: SubscribeOptions = {}) => {
+        const subscriber = { onStatus, ...options };
+        subscribers.push(subscriber);
+        return () => {
+          subscribers = subscribers.filter((s) => s !== subscriber);
+        };
+      }
+    );
+
     // asume we're not on openbox session; this is the default for the new 'no onboarding' flow
     isOnOpenboxSessionMock.mockResolvedValue(false);
 
@@ -247,7 +279,6 @@ describe("App", () => {
   });
 
   it("when using AP mode, displays reconnect to AP dialog", async () => {
-    jest.useFakeTimers();
     jest.setTimeout(30_000);
     isConnectedThroughApMock.mockResolvedValue({ isUsingAp: true });
 
@@ -264,36 +295,26 @@ describe("App", () => {
     } = mount();
 
     const checkForDialog = async () => {
-      await act(async () => {
-        jest.useFakeTimers();
-
-        expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
-
-        serverStatusMock.mockRejectedValue("Error");
-        // Advance time to wait for 3 failed requests for dialog to appear
-        jest.advanceTimersByTime(11_000);
-        jest.useRealTimers();
-        await waitFor(
-          () =>
-            expect(getByTestId("reconnect-ap-dialog")).not.toHaveClass(
-              "hidden"
-            ),
-          { timeout: 10_000 }
-        );
-
-        serverStatusMock.mockResolvedValue("OK");
-        // Advance time and wait for dialog to dissapear
-        jest.useFakeTimers();
-        jest.advanceTimersByTime(1_000);
-        jest.useRealTimers();
-        await waitFor(
-          () =>
-            expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden"),
-          { timeout: 10_000 }
-        );
+      await waitFor(() => expect(subscribers).not.toHaveLength(0));
+      expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
+
+      // the dialog appears after 3 failed reconnections
+      act(() => loseStatusStream(3));
+      await waitFor(
+        () =>
+          expect(getByTestId("reconnect-ap-dialog")).not.toHaveClass(
+            "hidden"
+          ),
+        { timeout: 10_000 }
+      );
 
-        jest.useRealTimers();
-      });
+      // and disappears once the status stream reconnects
+      act(() => restoreStatusStream());
+      await waitFor(
+        () =>
+          expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden"),
+        { timeout: 10_000 }
+      );
     };
 
     // on splash page
@@ -332,11 +353,11 @@ describe("App", () => {
     // dialog is NOT displayed on this page
     expect(await getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
 
-    serverStatusMock.mockRejectedValue("Error");
+    act(() => loseStatusStream(3));
     await new Promise((r) => setTimeout(r, 1000));
     expect(await getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
 
-    serverStatusMock.mockResolvedValue("OK");
+    act(() => restoreStatusStream());
     await new Promise((r) => setTimeout(r, 1000));
     expect(await getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
   });
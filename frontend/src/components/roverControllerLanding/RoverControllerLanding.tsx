@@ -8,46 +8,10 @@ import Spinner from "../atoms/spinner/Spinner";
 import startRoverController from "../../services/startRoverController";
 import stopRoverController from "../../services/stopRoverController";
 import getRoverControllerStatus from "../../services/getRoverControllerStatus";
-import usePrevious from "../../hooks/usePrevious";
+import subscribeToStatus from "../../services/subscribeToStatus";
 import Link from "../atoms/link/Link";
 import { runningOnWebRenderer } from "../../helpers/utils";
 
-const pollControllerStatus = ({
-  onStatus,
-  timeout,
-  onTimeout = () => {},
-  interval = 1000,
-}: {
-  onStatus: (status: string) => void;
-  timeout?: number;
-  onTimeout?: () => void;
-  interval?: number;
-}) => {
-  const intervalId = setInterval(async () => {
-    const { status } = await getRoverControllerStatus({
-      timeout: interval - 250,
-    });
-
-    onStatus(status);
-  }, interval);
-
-  const timeoutId =
-    !!timeout &&
-    setTimeout(() => {
-      clearInterval(intervalId);
-      onTimeout();
-    }, timeout);
-
-  // return clear method
-  return () => {
-    clearInterval(intervalId);
-    if (timeoutId) {
-      clearTimeout(timeoutId);
-    }
-  };
-};
-
-
 const getRoverControllerUrl = () => {
   const protocol = window.location.protocol;
   const hostname = window.location.hostname;
@@ -75,9 +39,31 @@ enum ControllerState {
   Crashed = "CRASHED",
 }
 
+const CONTROLLER_TIMEOUT = 30000;
+
+const nextControllerState = (state: ControllerState, status: string) => {
+  switch (state) {
+    case ControllerState.Starting:
+      if (status === "active") return ControllerState.Started;
+      if (status === "failed") return ControllerState.Crashed;
+      return state;
+
+    case ControllerState.Stopping:
+      if (status === "inactive" || status === "failed") {
+        return ControllerState.Stopped;
+      }
+      return state;
+
+    case ControllerState.Started:
+      return status === "failed" ? ControllerState.Crashed : state;
+
+    default:
+      return state;
+  }
+};
+
 const RoverControllerLanding = ({ standalone }: { standalone?: boolean }) => {
   const [controllerState, setControllerState] = useState<ControllerState>();
-  const previousControllerState = usePrevious(controllerState);
 
   const initialiseControllerState = useCallback(async () => {
     const { status } = await getRoverControllerStatus();
@@ -86,21 +72,21 @@ const RoverControllerLanding = ({ standalone }: { standalone?: boolean }) => {
     );
   }, []);
 
-  const start = useCallback(
-    () =>
-      startRoverController()
-        .then(() => setControllerState(ControllerState.Starting))
-        .catch(() => setControllerState(ControllerState.StartFailed)),
-    []
-  );
+  // state is set before the request, so that status changes pushed while it
+  // is being sent aren't missed
+  const start = useCallback(() => {
+    setControllerState(ControllerState.Starting);
+    return startRoverController().catch(() =>
+      setControllerState(ControllerState.StartFailed)
+    );
+  }, []);
 
-  const stop = useCallback(
-    () =>
-      stopRoverController()
-        .then(() => setControllerState(ControllerState.Stopping))
-        .catch(() => setControllerState(ControllerState.StopFailed)),
-    []
-  );
+  const stop = useCallback(() => {
+    setControllerState(ControllerState.Stopping);
+    return stopRoverController().catch(() =>
+      setControllerState(ControllerState.StopFailed)
+    );
+  }, []);
 
   const { content, buttonLabel, buttonDisabled, onButtonClick } =
     useMemo(() => {
@@ -234,60 +220,39 @@ const RoverControllerLanding = ({ standalone }: { standalone?: boolean }) => {
     initialiseControllerState();
   }, [initialiseControllerState]);
 
-  // wait for active status when starting
+  // follow controller status changes pushed by the server
   useEffect(() => {
-    if (
-      controllerState !== previousControllerState &&
-      controllerState === ControllerState.Starting
-    ) {
-      return pollControllerStatus({
-        onStatus: (status) => {
-          if (status === "active") {
-            setControllerState(ControllerState.Started);
-          }
-          if (status === "failed") {
-            setControllerState(ControllerState.Crashed);
-          }
-        },
-        onTimeout: () => setControllerState(ControllerState.StartFailed),
-        timeout: 30000,
-      });
-    }
-  }, [controllerState, previousControllerState]);
+    if (runningOnWebRenderer()) return;
 
-  // wait for inactive status when stopping
-  useEffect(() => {
-    if (
-      controllerState !== previousControllerState &&
-      controllerState === ControllerState.Stopping
-    ) {
-      return pollControllerStatus({
-        onStatus: (status) => {
-          if (status === "inactive" || status === "failed") {
-            setControllerState(ControllerState.Stopped);
-          }
-        },
-        onTimeout: () => setControllerState(ControllerState.StopFailed),
-        timeout: 30000,
-      });
-    }
-  }, [controllerState, previousControllerState]);
+    let previousStatus: string | undefined;
+    return subscribeToStatus(({ roverController }) => {
+      // the first status is only used to detect changes
+      if (previousStatus !== undefined && roverController !== previousStatus) {
+        setControllerState(
+          (state) => state && nextControllerState(state, roverController)
+        );
+      }
+      previousStatus = roverController;
+    }, { probes: ["roverController"] });
+  }, []);
 
-  // wait for failure status when running
+  // give up waiting for the controller to start or stop
   useEffect(() => {
-    if (
-      controllerState !== previousControllerState &&
-      controllerState === ControllerState.Started
-    ) {
-      return pollControllerStatus({
-        onStatus: (status) => {
-          if (status === "failed") {
-            setControllerState(ControllerState.Crashed);
-          }
-        },
-      });
+    if (controllerState === ControllerState.Starting) {
+      const timeoutId = setTimeout(
+        () => setControllerState(ControllerState.StartFailed),
+        CONTROLLER_TIMEOUT
+      );
+      return () => clearTimeout(timeoutId);
+    }
+    if (controllerState === ControllerState.Stopping) {
+      const timeoutId = setTimeout(
+        () => setControllerState(ControllerState.StopFailed),
+        CONTROLLER_TIMEOUT
+      );
+      return () => clearTimeout(timeoutId);
     }
-  }, [controllerState, previousControllerState]);
+  }, [controllerState]);
 
   return (
     <Layout
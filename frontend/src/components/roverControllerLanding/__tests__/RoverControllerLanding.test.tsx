@@ -1,9 +1,11 @@
 import React from "react";
 import { rest } from "msw";
+import { Server } from "mock-socket";
 import {
   fireEvent,
   render,
   screen,
+  waitFor,
   waitForElementToBeRemoved,
 } from "@testing-library/react";
 
@@ -12,6 +14,7 @@ import textContentMatcher from "../../../../test/helpers/textContentMatcher";
 import { server } from "../../../msw/server";
 import { act } from "react-dom/test-utils";
 import { runningOnWebRenderer } from '../../../helpers/utils'
+import wsBaseUrl from "../../../services/wsBaseUrl";
 
 jest.mock('../../../helpers/utils')
 
@@ -34,19 +37,52 @@ const matchers = {
   openLink: "Open Rover Controller",
 };
 
+let statusServer: Server;
+let controllerStatus: string;
+
 function setControllerStatus(status: string) {
   server.use(
     rest.get("/rover-controller-status", (_, res, ctx) =>
       res(ctx.json({ status }))
     )
   );
+
+  if (status !== controllerStatus) {
+    statusServer.clients().forEach((socket) =>
+      socket.send(
+        JSON.stringify({
+          type: "STATUS_DELTA",
+          payload: { roverController: status },
+        })
+      )
+    );
+  }
+  controllerStatus = status;
 }
 
 const mount = () => render(<RoverControllerLanding />);
 
+// status changes are only pushed to connected clients
+const waitForStatusStream = () =>
+  waitFor(() => expect(statusServer.clients()).toHaveLength(1));
+
 describe("RoverControllerLanding", () => {
+  beforeEach(() => {
+    controllerStatus = "inactive";
+    statusServer = new Server(`${wsBaseUrl}/events?probe=roverController`);
+    statusServer.on("connection", (socket) => {
+      socket.send(
+        JSON.stringify({
+          type: "STATUS",
+          payload: { roverController: controllerStatus },
+        })
+      );
+    });
+  });
+
   afterEach(() => {
     runningOnWebRendererMock.mockImplementation(() => false)
+    statusServer.stop();
   })
 
   it('shows warning message when on web renderer', () => {
@@ -99,6 +135,7 @@ describe("RoverControllerLanding", () => {
     mount();
 
     expect(await screen.findByText(matchers.stopped)).toBeInTheDocument();
+    await waitForStatusStream();
     fireEvent.click(screen.getByText("Launch"));
 
     // it tells the user the controller is starting and shows disabled Stop button
@@ -119,6 +156,7 @@ describe("RoverControllerLanding", () => {
     mount();
 
     expect(await screen.findByText(matchers.started)).toBeInTheDocument();
+    await waitForStatusStream();
     fireEvent.click(screen.getByText("Stop"));
 
     // it tells the user the controller is stopping and shows disabled Stop button
@@ -137,6 +175,7 @@ describe("RoverControllerLanding", () => {
     mount();
 
     expect(await screen.findByText(matchers.stopped)).toBeInTheDocument();
+    await waitForStatusStream();
     fireEvent.click(screen.getByText("Launch"));
 
     // simulate controller starting successfully
@@ -161,6 +200,7 @@ describe("RoverControllerLanding", () => {
     mount();
 
     expect(await screen.findByText(matchers.stopped)).toBeInTheDocument();
+    await waitForStatusStream();
     fireEvent.click(screen.getByText("Launch"));
 
     // simulate service crashing on startup
@@ -188,6 +228,7 @@ describe("RoverControllerLanding", () => {
     mount();
 
     expect(await screen.findByText(matchers.stopped)).toBeInTheDocument();
+    await waitForStatusStream();
     fireEvent.click(screen.getByText("Launch"));
 
     // shows message that controller has failed to start
@@ -215,6 +256,7 @@ describe("RoverControllerLanding", () => {
     mount();
 
     expect(await screen.findByText(matchers.started)).toBeInTheDocument();
+    await waitForStatusStream();
     fireEvent.click(screen.getByText("Stop"));
 
     // shows message that controller has failed to stop
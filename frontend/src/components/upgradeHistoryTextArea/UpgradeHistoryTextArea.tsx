@@ -17,7 +17,8 @@ export default ({
   const [msg, setMsg] = useState<string[]>([]);
 
   useEffect(() => {
-    setMsg(m => [...m, message])
+    // progress updates come without a message
+    message && setMsg(m => [...m, message])
   }, [message]);
 
   return (
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import serverStatus from "../../services/serverStatus";
+import subscribeToStatus from "../../services/subscribeToStatus";
 import isConnectedThroughAp from "../../services/isConnectedThroughAp";
 import Dialog from "../../components/atoms/dialog/Dialog";
 import ImageComponent from "../../components/atoms/image/Image";
@@ -10,6 +10,8 @@ export type Props = {
   enabled?: boolean;
 };
 
+export const reconnectIntervalMs = 2000;
+
 export default ({ enabled = true }: Props) => {
   const [disconnectedFromAp, setDisconnectedFromAp] = useState(false);
   const [requestFailures, setRequestFailures] = useState(0);
@@ -30,20 +32,29 @@ export default ({ enabled = true }: Props) => {
   }, [enabled]);
 
   useEffect(() => {
-    // when connected to the pi-top hotspot, monitor disconnections
+    let isMounted = true;
+    let unsubscribe: (() => void) | undefined;
+
+    // when connected to the pi-top hotspot, monitor disconnections: the
+    // status stream closes when the connection is lost, and is reopened until
+    // the connection is back
     isConnectedThroughAp()
       .then((connectedViaAp) => {
-        if (!connectedViaAp) {
+        if (!connectedViaAp || !isMounted) {
           return;
         }
 
-        setInterval(async () => {
-          serverStatus({ timeout: 7000 })
-            .then(() => setRequestFailures(0))
-            .catch(() => setRequestFailures(prevCount => prevCount + 1));
-        }, 2000);
+        unsubscribe = subscribeToStatus(() => setRequestFailures(0), {
+          onDisconnect: () => setRequestFailures((prevCount) => prevCount + 1),
+          reconnectIntervalMs,
+        });
       })
       .catch(() => null);
+
+    return () => {
+      isMounted = false;
+      unsubscribe && unsubscribe();
+    };
   }, [setDisconnectedFromAp, setRequestFailures]);
 
   return (
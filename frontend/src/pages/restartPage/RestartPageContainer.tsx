@@ -3,22 +3,42 @@ import { useHistory } from 'react-router-dom';
 
 import RestartPage from "./RestartPage";
 
-import configureLanding from "../../services/configureLanding";
-import deprioritiseOpenboxSession from "../../services/deprioritiseOpenboxSession";
-import enableFirmwareUpdaterService from "../../services/enableFirmwareUpdaterService";
-import enableFurtherLinkService from "../../services/enableFurtherLinkService";
-import stopOnboardingAutostart from "../../services/stopOnboardingAutostart";
+import finalise from "../../services/finalise";
+import getJob from "../../services/getJob";
 import reboot from "../../services/reboot";
-import restoreFiles from "../../services/restoreFiles";
 import serverStatus from "../../services/serverStatus"
-import updateEeprom from "../../services/updateEeprom"
-import enablePtMiniscreen from "../../services/enablePtMiniscreen";
-import disableApMode from "../../services/disableApMode";
+import subscribeToStatus, { Status } from "../../services/subscribeToStatus";
 import verifyDeviceNetwork from "../../services/verifyDeviceNetwork";
 
 import { runningOnWebRenderer } from "../../helpers/utils";
 
-const maxProgress = 11; // this is the number of services for setting up
+// the finalise steps run when setting up, with the message shown when each
+// one is done
+const setupSteps: { [name: string]: string } = {
+  enable_firmware_updater_service:
+    "Reminded myself to keep an eye out for cool new stuff for my friends...",
+  enable_further_link_service:
+    "Reminded myself to stay connected, so I can help you go Further...",
+  deprioritise_openbox_session: "Put away all my open boxes...",
+  restore_files: "Reminded myself to show you around...",
+  configure_landing: "Reminded myself to show you around...",
+  stop_onboarding_autostart:
+    "Made sure not to make you go through this again...",
+  update_eeprom: "Made things easier for me to go to sleep when you ask...",
+  enable_pt_miniscreen:
+    "Reminded myself to tell the miniscreen to do its thing in the morning...",
+  disable_ap_mode: "Disabling my access point...",
+};
+const failedStepMessage =
+  "I couldn't do that, please contact support if I have any problems...";
+const finishedStatuses = ["SUCCESS", "FAILED"];
+
+// how long to wait for the status stream before starting without it, and
+// for the steps to finish before rebooting anyway
+export const statusStreamTimeoutMs = 5000;
+export const finaliseTimeoutMs = 300000;
+// how often to ask for the finalise job when the status stream is closed
+export const jobPollIntervalMs = 1000;
 
 const calculatePercentageProgress = (progress: number, maxProgress: number) => {
   if (!Number.isFinite(progress / maxProgress)) {
@@ -42,6 +62,7 @@ export default ({
   const [rebootError, setRebootError] = useState(false);
   const [progressMessage, setProgressMessage] = useState("Alright let's get started!");
   const [progress, setProgress] = useState(0);
+  const [maxProgress, setMaxProgress] = useState(1);
   const [isWaitingForServer, setIsWaitingForServer] = useState(false);
   const [serverRebooted, setServerRebooted] = useState(false);
   const [checkingOnSameNetwork, setCheckingOnSameNetwork] = useState(true);
@@ -77,19 +98,102 @@ export default ({
       window.removeEventListener("beforeunload", beforeUnloadListener);
   }, [isSettingUpDevice, isWaitingForServer]);
 
-  function safelyRunService(service: () => Promise<void>, message: string) {
-    return service()
-      .then(() => setProgressMessage(message))
-      .catch(() =>
-        setProgressMessage(
-          "I couldn't do that, please contact support if I have any problems..."
-        )
-      )
-      .finally(() => {
-        setProgress(currentProgess =>
-          Math.min(currentProgess + 1, maxProgress)
-        );
-      });
+  // runs the steps in a single finalise job and follows their progress in
+  // the status stream, or polls for the job if the stream closes; resolves
+  // when the job is done
+  function runSetupSteps(steps: string[]) {
+    return new Promise<void>((resolve) => {
+      let jobId: string | undefined;
+      let latestStatus: Status | undefined;
+      const stepStatuses: { [name: string]: string } = {};
+
+      const onStatus = (status: Status) => {
+        latestStatus = status;
+        steps.forEach((name) => {
+          const step = status.finalise && status.finalise[name];
+          if (!step) {
+            return;
+          }
+          // the first status received can have steps from an earlier run,
+          // so only count steps that finish while following them
+          const previousStatus = stepStatuses[name];
+          stepStatuses[name] = step.status;
+          if (
+            previousStatus === undefined ||
+            previousStatus === step.status ||
+            !finishedStatuses.includes(step.status)
+          ) {
+            return;
+          }
+          setProgressMessage(
+            step.status === "SUCCESS" ? setupSteps[name] : failedStepMessage
+          );
+          setProgress((currentProgress) =>
+            Math.min(currentProgress + 1, steps.length)
+          );
+        });
+
+        const job = status.jobs && status.jobs.finalise;
+        if (job && job.id === jobId && finishedStatuses.includes(job.status)) {
+          done();
+        }
+      };
+
+      let started = false;
+      let isDone = false;
+      const start = () => {
+        if (started) {
+          return;
+        }
+        started = true;
+        finalise(steps)
+          .then((id) => {
+            jobId = id;
+            latestStatus && onStatus(latestStatus);
+          })
+          .catch((error) => {
+            console.error(error);
+            done();
+          });
+      };
+
+      let pollInterval: number | undefined;
+      const pollJob = () => {
+        jobId &&
+          getJob(jobId)
+            .then((job) => finishedStatuses.includes(job.status) && done())
+            .catch(() => null);
+      };
+
+      const unsubscribe = subscribeToStatus(
+        (status) => {
+          onStatus(status);
+          start();
+        },
+        {
+          onDisconnect: () => {
+            start();
+            if (pollInterval === undefined) {
+              pollInterval = window.setInterval(pollJob, jobPollIntervalMs);
+            }
+          },
+        }
+      );
+      const startTimeout = window.setTimeout(start, statusStreamTimeoutMs);
+      const finaliseTimeout = window.setTimeout(done, finaliseTimeoutMs);
+
+      function done() {
+        if (isDone) {
+          return;
+        }
+        isDone = true;
+        window.clearTimeout(startTimeout);
+        window.clearTimeout(finaliseTimeout);
+        window.clearInterval(pollInterval);
+        unsubscribe();
+        resolve();
+      }
+    });
   }
 
   const rebootTimeoutMs = 120000;
@@ -146,73 +250,25 @@ export default ({
       setupDevice={() => {
         setIsSettingUpDevice(true);
 
-        safelyRunService(
-          enableFirmwareUpdaterService,
-          "Reminded myself to keep an eye out for cool new stuff for my friends..."
-        )
-          .finally(() =>
-            safelyRunService(
-              enableFurtherLinkService,
-              "Reminded myself to stay connected, so I can help you go Further..."
-            )
-          )
-          .finally(() =>
-            safelyRunService(
-              deprioritiseOpenboxSession,
-              "Put away all my open boxes..."
-            )
-          )
-          .finally(() =>
-            safelyRunService(
-              restoreFiles,
-              "Reminded myself to show you around..."
-            )
-          )
-          .finally(() =>
-            safelyRunService(
-              configureLanding,
-              "Reminded myself to show you around..."
-            )
-          )
-          .finally(() =>
-            safelyRunService(
-              stopOnboardingAutostart,
-              "Made sure not to make you go through this again..."
-            )
-          )
-          .finally(() =>
-            safelyRunService(
-              updateEeprom,
-              "Made things easier for me to go to sleep when you ask..."
-            )
-          )
-          .finally(() =>
-            safelyRunService(
-              enablePtMiniscreen,
-              "Reminded myself to tell the miniscreen to do its thing in the morning..."
-            )
-          )
-          .finally(() =>
-            // shouldDisplayConnectivityDialog = client using AP network
-            // shouldMoveAwayFromAp = pi-top has networks other than AP
-            //
-            // so turn off AP if !shouldDisplayConnectivityDialog || shouldMoveAwayFromAp
-            // = client not using AP or they are but there is an alternative
-            //
-            // ...except if there is an alternative they should have already been
-            // prompted to switch to it before tiggering these actions...
-            // if they didn't follow that prompt, we need to keep AP on despite alternatives
-            //
-            // so actually only turn AP off if they are not using it currently... !shouldDisplayConnectivityDialog
-            !shouldDisplayConnectivityDialog && safelyRunService(
-              disableApMode,
-              "Disabling my access point..."
-            )
-          )
-          .catch(console.error)
-          .finally(() => {
-              rebootPiTop();
-          })
+        const steps = Object.keys(setupSteps).filter(
+          // shouldDisplayConnectivityDialog = client using AP network
+          // shouldMoveAwayFromAp = pi-top has networks other than AP
+          //
+          // so turn off AP if !shouldDisplayConnectivityDialog || shouldMoveAwayFromAp
+          // = client not using AP or they are but there is an alternative
+          //
+          // ...except if there is an alternative they should have already been
+          // prompted to switch to it before tiggering these actions...
+          // if they didn't follow that prompt, we need to keep AP on despite alternatives
+          //
+          // so actually only turn AP off if they are not using it currently... !shouldDisplayConnectivityDialog
+          (name) => name !== "disable_ap_mode" || !shouldDisplayConnectivityDialog
+        );
+        setMaxProgress(steps.length);
+
+        runSetupSteps(steps).finally(() => {
+          rebootPiTop();
+        });
       }}
     />
   );
@@ -17,74 +17,94 @@ import RestartPageContainer, { Props } from "../RestartPageContainer";
 import { ErrorMessage, ExplanationMessages } from "../RestartPage";
 import querySpinner from "../../../../test/helpers/querySpinner";
 
-import configureLanding from "../../../services/configureLanding";
-import deprioritiseOpenboxSession from "../../../services/deprioritiseOpenboxSession";
-import enableFurtherLinkService from "../../../services/enableFurtherLinkService";
-import enableFirmwareUpdaterService from "../../../services/enableFirmwareUpdaterService";
-import restoreFiles from "../../../services/restoreFiles";
-import stopOnboardingAutostart from "../../../services/stopOnboardingAutostart";
+import finalise from "../../../services/finalise";
+import getJob from "../../../services/getJob";
 import reboot from "../../../services/reboot";
 import serverStatus from "../../../services/serverStatus";
-import updateEeprom from "../../../services/updateEeprom";
-import enablePtMiniscreen from "../../../services/enablePtMiniscreen";
+import subscribeToStatus, { Status } from "../../../services/subscribeToStatus";
 import verifyDeviceNetwork from "../../../services/verifyDeviceNetwork";
-import disableApMode from "../../../services/disableApMode";
 
 
 import { act } from "react-dom/test-utils";
 
-jest.mock("../../../services/configureLanding");
-jest.mock("../../../services/deprioritiseOpenboxSession");
-jest.mock("../../../services/enableFurtherLinkService");
-jest.mock("../../../services/enableFirmwareUpdaterService");
-jest.mock("../../../services/restoreFiles");
-jest.mock("../../../services/stopOnboardingAutostart");
+jest.mock("../../../services/finalise");
+jest.mock("../../../services/getJob");
 jest.mock("../../../services/reboot");
 jest.mock("../../../services/serverStatus");
-jest.mock("../../../services/updateEeprom");
-jest.mock("../../../services/enablePtMiniscreen");
+jest.mock("../../../services/subscribeToStatus");
 jest.mock("../../../services/verifyDeviceNetwork");
-jest.mock("../../../services/disableApMode");
 
 
-const configureLandingMock = configureLanding as jest.Mock;
-const deprioritiseOpenboxSessionMock = deprioritiseOpenboxSession as jest.Mock;
-const enableFurtherLinkServiceMock = enableFurtherLinkService as jest.Mock;
-const enableFirmwareUpdaterServiceMock = enableFirmwareUpdaterService as jest.Mock;
-const restoreFilesMock = restoreFiles as jest.Mock;
-const stopOnboardingAutostartMock = stopOnboardingAutostart as jest.Mock;
+const finaliseMock = finalise as jest.Mock;
+const getJobMock = getJob as jest.Mock;
 const rebootMock = reboot as jest.Mock;
 const serverStatusMock = serverStatus as jest.Mock;
-const updateEepromMock = updateEeprom as jest.Mock;
-const enablePtMiniscreenMock = enablePtMiniscreen as jest.Mock;
+const subscribeToStatusMock = subscribeToStatus as jest.Mock;
 const verifyDeviceNetworkMock = verifyDeviceNetwork as jest.Mock;
-const disableApModeMock = disableApMode as jest.Mock;
-
-
-const mockServices = [
-  enableFirmwareUpdaterServiceMock,
-  enableFurtherLinkServiceMock,
-  deprioritiseOpenboxSessionMock,
-  restoreFilesMock,
-  configureLandingMock,
-  stopOnboardingAutostartMock,
-  updateEepromMock,
-  enablePtMiniscreenMock,
-  disableApModeMock,
-  rebootMock,
+
+const mockServices = [finaliseMock, rebootMock];
+
+const setupSteps = [
+  "enable_firmware_updater_service",
+  "enable_further_link_service",
+  "deprioritise_openbox_session",
+  "restore_files",
+  "configure_landing",
+  "stop_onboarding_autostart",
+  "update_eeprom",
+  "enable_pt_miniscreen",
+  "disable_ap_mode",
 ];
 
+// the status pushed by the '/events' websocket
+let status: Status;
+let onStatus: ((status: Status) => void) | undefined;
+let onDisconnect: (() => void) | undefined;
+const unsubscribeMock = jest.fn();
+
+const publishStatus = (delta: Status) => {
+  status = Object.entries(delta).reduce(
+    (merged, [key, value]) => ({
+      ...merged,
+      [key]: { ...merged[key], ...value },
+    }),
+    status
+  );
+  onStatus && onStatus(status);
+};
 
-const resolveMocks = (mocks: jest.Mock[] = mockServices) => {
-  mocks.forEach((mock) => {
-    mock.mockResolvedValue("OK");
+// runs the finalise job in the status stream, failing 'failedSteps'
+const runFinaliseJob = (failedSteps: string[] = []) => async (
+  steps: string[]
+) => {
+  const stepStatus = (name: string, value: string) => ({
+    [name]: { name, status: value, error: "" },
+  });
+  const job = (jobStatus: string) => ({
+    finalise: { id: "finalise-job", resource: "finalise", status: jobStatus },
   });
-};
 
-const rejectMocks = (mocks: jest.Mock[] = mockServices) => {
-  mocks.forEach((mock, i) => {
-    mock.mockRejectedValue(new Error(`Test error message ${i}`));
+  Promise.resolve().then(() => {
+    publishStatus({ jobs: job("RUNNING") });
+    steps.forEach((name) =>
+      publishStatus({ finalise: stepStatus(name, "QUEUED") })
+    );
+    steps.forEach((name) =>
+      publishStatus({
+        finalise: stepStatus(
+          name,
+          failedSteps.includes(name) ? "FAILED" : "SUCCESS"
+        ),
+      })
+    );
+    publishStatus({ jobs: job(failedSteps.length ? "FAILED" : "SUCCESS") });
   });
+  return "finalise-job";
+};
+
+const resolveMocks = () => {
+  finaliseMock.mockImplementation(runFinaliseJob());
+  rebootMock.mockResolvedValue("OK");
 };
 
 let mockUserAgent = "web-renderer";
@@ -126,6 +146,15 @@ describe("RestartPageContainer", () => {
 
   beforeEach(async () => {
     resolveMocks();
+    status = { jobs: {}, finalise: {} };
+    onStatus = undefined;
+    onDisconnect = undefined;
+    subscribeToStatusMock.mockImplementation((callback, options) => {
+      onStatus = callback;
+      onDisconnect = options && options.onDisconnect;
+      Promise.resolve().then(() => onStatus && onStatus(status));
+      return unsubscribeMock;
+    });
     serverStatusMock.mockResolvedValue("OK");
     verifyDeviceNetworkMock.mockResolvedValue({
       shouldSwitchNetwork: false,
@@ -149,6 +178,8 @@ describe("RestartPageContainer", () => {
     mockServices.forEach((mock) => {
       mock.mockRestore();
     });
+    unsubscribeMock.mockClear();
+    getJobMock.mockReset();
   });
 
   it("does not render back button", () => {
@@ -238,95 +269,140 @@ describe("RestartPageContainer", () => {
       await wait();
     });
 
-    it("calls correct services", async () => {
+    it("runs the setup steps in a finalise job", async () => {
       const restartButton = getByText("Restart").parentElement
       if(restartButton) fireEvent.click(restartButton);
 
       await wait();
 
-      mockServices.forEach((mock) => {
-        expect(mock).toHaveBeenCalled();
-      });
+      expect(finaliseMock).toHaveBeenCalledWith(setupSteps);
     });
 
-    describe('when configure landing fails', () => {
-      beforeEach(() => {
-        configureLandingMock.mockRejectedValue(new Error());
-      });
+    it("reboots when the finalise job is done", async () => {
+      fireEvent.click(getByText("Restart"));
 
-      it('calls remaining services', async () => {
-        fireEvent.click(getByText("Restart"));
+      await wait(() => expect(rebootMock).toHaveBeenCalled());
+      expect(unsubscribeMock).toHaveBeenCalled();
+    });
 
-        await wait();
+    it("renders the message of the last finished step", async () => {
+      fireEvent.click(getByText("Restart"));
 
-        mockServices.forEach((mock) => {
-          expect(mock).toHaveBeenCalled();
-        });
-      });
+      await wait(() => expect(rebootMock).toHaveBeenCalled());
+      expect(getByText("Disabling my access point...")).toBeInTheDocument();
+    });
+
+    it("doesn't count steps finished by an earlier finalise job", async () => {
+      status = {
+        jobs: {},
+        finalise: {
+          update_eeprom: { name: "update_eeprom", status: "SUCCESS", error: "" },
+        },
+      };
+      finaliseMock.mockResolvedValue("finalise-job");
+
+      fireEvent.click(getByText("Restart"));
+      await wait(() => expect(finaliseMock).toHaveBeenCalled());
+
+      expect(
+        queryByText("Made things easier for me to go to sleep when you ask...")
+      ).not.toBeInTheDocument();
+      expect(rebootMock).not.toHaveBeenCalled();
     });
 
-    describe('when deprioritise openbox session fails', () => {
+    describe('when the status stream closes', () => {
       beforeEach(() => {
-        deprioritiseOpenboxSessionMock.mockRejectedValue(new Error());
+        finaliseMock.mockResolvedValue("finalise-job");
+        getJobMock.mockResolvedValue({
+          id: "finalise-job",
+          resource: "finalise",
+          status: "RUNNING",
+          error: "",
+        });
       });
 
-      it('calls remaining services', async () => {
+      it('starts the finalise job without waiting for a status', async () => {
         fireEvent.click(getByText("Restart"));
+        await wait(() => expect(onDisconnect).toBeDefined());
 
-        await wait();
-
-        mockServices.forEach((mock) => {
-          expect(mock).toHaveBeenCalled();
+        act(() => {
+          onDisconnect && onDisconnect();
         });
-      });
-    });
 
-    describe('when stop onboarding autostart fails', () => {
-      beforeEach(() => {
-        stopOnboardingAutostartMock.mockRejectedValue(new Error());
+        await wait(() => expect(finaliseMock).toHaveBeenCalled());
       });
 
-      it('calls remaining services', async () => {
+      it('polls for the finalise job and reboots when it is done', async () => {
         fireEvent.click(getByText("Restart"));
+        await wait(() => expect(onDisconnect).toBeDefined());
 
-        await wait();
-
-        mockServices.forEach((mock) => {
-          expect(mock).toHaveBeenCalled();
+        act(() => {
+          onDisconnect && onDisconnect();
         });
+        await wait(() => expect(getJobMock).toHaveBeenCalledWith("finalise-job"));
+        expect(rebootMock).not.toHaveBeenCalled();
+
+        getJobMock.mockResolvedValue({
+          id: "finalise-job",
+          resource: "finalise",
+          status: "SUCCESS",
+          error: "",
+        });
+        await wait(() => expect(rebootMock).toHaveBeenCalled());
+        expect(unsubscribeMock).toHaveBeenCalled();
       });
     });
 
-    describe('when update EEPROM fails', () => {
+    describe('when a step fails', () => {
       beforeEach(() => {
-        updateEepromMock.mockRejectedValue(new Error());
+        finaliseMock.mockImplementation(runFinaliseJob(["disable_ap_mode"]));
       });
 
-      it('calls remaining services', async () => {
+      it('renders failure message', async () => {
         fireEvent.click(getByText("Restart"));
 
-        await wait();
-
-        mockServices.forEach((mock) => {
-          expect(mock).toHaveBeenCalled();
-        });
+        await wait(() => expect(rebootMock).toHaveBeenCalled());
+        expect(
+          getByText("I couldn't do that, please contact support if I have any problems...")
+        ).toBeInTheDocument();
       });
     });
 
-    describe('when disabling access point fails', () => {
+    describe('when the finalise request fails', () => {
       beforeEach(() => {
-        disableApModeMock.mockRejectedValue(new Error());
+        finaliseMock.mockRejectedValue(new Error());
       });
 
-      it('calls remaining services', async () => {
+      it('still reboots', async () => {
         fireEvent.click(getByText("Restart"));
 
-        await wait();
+        await wait(() => expect(rebootMock).toHaveBeenCalled());
+        expect(unsubscribeMock).toHaveBeenCalled();
+      });
+    });
 
-        mockServices.forEach((mock) => {
-          expect(mock).toHaveBeenCalled();
+    describe('when the client is connected through the access point', () => {
+      beforeEach(async () => {
+        verifyDeviceNetworkMock.mockResolvedValue({
+          shouldSwitchNetwork: false,
+          shouldDisplayDialog: true,
+          piTopIp: "192.168.64.1",
+          clientIp: "192.168.64.10",
         });
       });
+
+      it("doesn't disable the access point", async () => {
+        const { getAllByText } = render(<RestartPageContainer {...defaultProps} />);
+        await wait();
+
+        const restartButtons = getAllByText("Restart");
+        fireEvent.click(restartButtons[restartButtons.length - 1]);
+        await wait(() => expect(finaliseMock).toHaveBeenCalled());
+
+        expect(finaliseMock).toHaveBeenCalledWith(
+          setupSteps.filter((name) => name !== "disable_ap_mode")
+        );
+      });
     });
 
     describe('when reboot fails', () => {
@@ -122,7 +122,7 @@ export default ({
       let msg = JSON.stringify(message.payload?.message)
         .trim()
         .replace(/^"(.*)"$/, "$1")
-        .replace(/\\\\n/g, String.fromCharCode(10));
+        .replace(/\\\\n|\\n/g, String.fromCharCode(10));
       if (message.payload.status === UpdateMessageStatus.Error) {
         // Add a newline before an ERROR message
         msg = String.fromCharCode(13, 10) + msg;
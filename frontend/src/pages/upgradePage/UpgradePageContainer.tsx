@@ -1,4 +1,3 @@
-import axios from "axios";
 import React, { useCallback, useRef, useState, useEffect } from "react";
 
 import UpgradePage from "./UpgradePage";
@@ -9,14 +8,17 @@ import usePrevious from "../../hooks/usePrevious";
 import getAvailableSpace from "../../services/getAvailableSpace";
 import wsBaseUrl from "../../services/wsBaseUrl";
 import restartWebPortalService from "../../services/restartWebPortalService";
+import subscribeToStatus from "../../services/subscribeToStatus";
 import getMajorOsUpdates from "../../services/getMajorOsUpdates";
 
 export enum OSUpdaterMessageType {
   UpdateSources = "UPDATE_SOURCES",
   PrepareUpgrade = "OS_PREPARE_UPGRADE",
+  Download = "OS_DOWNLOAD",
   Upgrade = "OS_UPGRADE",
   Size = "SIZE",
   State = "STATE",
+  Replay = "REPLAY",
 }
 
 export enum UpdateMessageStatus {
@@ -45,6 +47,7 @@ export enum SocketMessage {
   PREPARE_SYSTEM_UPGRADE = "prepare",
   PREPARE_WEB_PORTAL_UPGRADE = "prepare_web_portal",
   UPDATE_SOURCES = "update_sources",
+  DOWNLOAD_UPGRADE = "download",
   START_UPGRADE = "start",
   GET_UPGRADE_SIZE = "size",
   GET_STATE = "state",
@@ -80,6 +83,7 @@ export type StateMessagePayload = {
 export type UpgradeMessage = {
   type:
     | OSUpdaterMessageType.PrepareUpgrade
+    | OSUpdaterMessageType.Download
     | OSUpdaterMessageType.Upgrade
     | OSUpdaterMessageType.UpdateSources;
   payload: UpgradeMessagePayload;
@@ -97,6 +101,13 @@ export type StateMessage = {
 
 export type OSUpdaterMessage = UpgradeMessage | SizeMessage | StateMessage;
 
+export type ReplayMessage = {
+  type: OSUpdaterMessageType.Replay;
+  payload: {
+    messages: OSUpdaterMessage[];
+  };
+};
+
 export type Props = {
   goToNextPage?: () => void;
   goToPreviousPage?: () => void;
@@ -121,8 +132,13 @@ export default ({
   const [socket, reconnectSocket] = useSocket(`${wsBaseUrl}/os-upgrade`);
   socket.onmessage = (e: MessageEvent) => {
     try {
-      const data = JSON.parse(e.data);
-      setMessage(data);
+      const data: OSUpdaterMessage | ReplayMessage = JSON.parse(e.data);
+      if (data.type === OSUpdaterMessageType.Replay) {
+        // messages sent before connecting, to catch up with a running upgrade
+        data.payload.messages.forEach((replayed) => setMessage(replayed));
+      } else {
+        setMessage(data);
+      }
     } catch (_) {}
   };
   socket.onopen = () => {
@@ -198,6 +214,13 @@ export default ({
         case UpdateState.PreparingSystemUpgrade:
           socket.send(SocketMessage.PREPARE_SYSTEM_UPGRADE);
           break;
+        case UpdateState.WaitingForUserInput:
+          // download the packages in the background while the user decides,
+          // so that starting the upgrade only has to install them. If the
+          // download fails, starting the upgrade downloads them again.
+          previousState !== UpdateState.Reattaching &&
+            socket.send(SocketMessage.DOWNLOAD_UPGRADE);
+          break;
         case UpdateState.UpgradingWebPortal:
         case UpdateState.UpgradingSystem:
           previousState !== UpdateState.Reattaching &&
@@ -240,34 +263,26 @@ export default ({
   }, [socket, state]);
 
   const serviceRestartTimoutMs = 30000;
-  const timeoutServerStatusRequestMs = 300;
-  const serverStatusRequestIntervalMs = 700;
-  let elapsedWaitingTimeMs = 0;
+  const statusStreamReconnectIntervalMs = 1000;
 
+  // the status stream reconnects to the restarted server, which doesn't
+  // report that it's restarting like the server that is going down
   let waitUntilServerIsOnline = () => {
-    const interval = setInterval(async () => {
-      try {
-        elapsedWaitingTimeMs +=
-          timeoutServerStatusRequestMs + serverStatusRequestIntervalMs;
-        elapsedWaitingTimeMs >= serviceRestartTimoutMs &&
-          setError(ErrorType.GenericError);
-
-        await axios.get(window.location.href + "?all", {
-          headers: {
-            "Cache-Control": "no-cache",
-            Pragma: "no-cache",
-            Expires: "0",
-          },
-        });
-        await new Promise((res, rej) => {
-          const testSocket = new WebSocket(`${wsBaseUrl}/os-upgrade`);
-          testSocket.onopen = res;
-          testSocket.onerror = () => rej(new Error("socket not ready"));
-        });
-        clearInterval(interval);
+    const restartTimeout = setTimeout(
+      () => setError(ErrorType.GenericError),
+      serviceRestartTimoutMs
+    );
+    const unsubscribe = subscribeToStatus(
+      ({ restartingWebPortal }) => {
+        if (restartingWebPortal) {
+          return;
+        }
+        clearTimeout(restartTimeout);
+        unsubscribe();
         window.location.replace(window.location.pathname + "?all");
-      } catch (_) {}
-    }, serverStatusRequestIntervalMs);
+      },
+      { reconnectIntervalMs: statusStreamReconnectIntervalMs }
+    );
   };
 
   useEffect(() => {
@@ -316,6 +331,9 @@ export default ({
         case OSUpdaterMessageType.PrepareUpgrade:
           setState(UpdateState.PreparingWebPortal);
           break;
+        case OSUpdaterMessageType.Download:
+          setState(UpdateState.WaitingForUserInput);
+          break;
         case OSUpdaterMessageType.Upgrade:
           setState(UpdateState.UpgradingWebPortal);
           break;
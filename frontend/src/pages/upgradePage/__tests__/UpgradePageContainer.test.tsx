@@ -17,21 +17,30 @@ import { UpgradePageExplanation, ErrorMessage } from "../UpgradePage";
 import Messages from "./data/socketMessages.json";
 import getAvailableSpace from "../../../services/getAvailableSpace";
 import wsBaseUrl from "../../../services/wsBaseUrl";
-import axios from "axios";
 import restartWebPortalService from "../../../services/restartWebPortalService";
 import getMajorOsUpdates from "../../../services/getMajorOsUpdates";
+import subscribeToStatus, { Status } from "../../../services/subscribeToStatus";
 import { OsVersionUpdate } from "../../../types/OsVersionUpdate";
 import { waitFor } from "../../../../test/helpers/waitFor";
 
-jest.mock("axios");
 jest.mock("../../../services/getAvailableSpace");
 jest.mock("../../../services/restartWebPortalService");
 jest.mock("../../../services/getMajorOsUpdates");
+jest.mock("../../../services/subscribeToStatus");
 
-const axiosGetMock = axios.get as jest.Mock;
 const getAvailableSpaceMock = getAvailableSpace as jest.Mock;
 const restartWebPortalServiceMock = restartWebPortalService as jest.Mock;
 const getMajorOsUpdatesMock = getMajorOsUpdates as jest.Mock;
+const subscribeToStatusMock = subscribeToStatus as jest.Mock;
+const unsubscribeMock = jest.fn();
+
+// the server pushes its status once the status stream connects
+const pushStatusOnSubscribe = (status: Status) => (
+  onStatus: (status: Status) => void
+) => {
+  Promise.resolve().then(() => onStatus(status));
+  return unsubscribeMock;
+};
 
 type ExtendedRenderResult = RenderResult & {
   waitForPreparation: () => Promise<HTMLElement>;
@@ -79,7 +88,7 @@ describe("UpgradePageContainer", () => {
       update: false,
     };
 
-    axiosGetMock.mockResolvedValue("OK");
+    subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
     restartWebPortalServiceMock.mockResolvedValue("OK");
     getMajorOsUpdatesMock.mockResolvedValue(osUpdatesResponse);
 
@@ -154,7 +163,7 @@ describe("UpgradePageContainer", () => {
   afterEach(() => {
     jest.useRealTimers();
     getAvailableSpaceMock.mockRestore();
-    axiosGetMock.mockResolvedValue("OK");
+    subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
     restartWebPortalServiceMock.mockRestore();
   });
 
@@ -816,7 +825,7 @@ describe("UpgradePageContainer", () => {
       restartWebPortalServiceMock.mockRejectedValue(
         new Error("backend server restarted")
       );
-      axiosGetMock.mockResolvedValue("OK");
+      subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
 
       server = createServer();
       server.on("connection", (socket) => {
@@ -873,6 +882,33 @@ describe("UpgradePageContainer", () => {
 
       await wait(() => expect(window.location.replace).toHaveBeenCalled());
     });
+
+    it("waits for the restarted server before reloading the page", async () => {
+      let onStatus: ((status: Status) => void) | undefined;
+      subscribeToStatusMock.mockImplementation((callback) => {
+        onStatus = callback;
+        return unsubscribeMock;
+      });
+      (window.location.replace as jest.Mock).mockClear();
+      unsubscribeMock.mockClear();
+
+      const { getByText } = mount();
+      await waitForElement(() =>
+        getByText(UpgradePageExplanation.WaitingForServer)
+      );
+      await wait(() => expect(onStatus).toBeDefined());
+
+      // the server that is going down
+      onStatus!({ restartingWebPortal: true });
+      expect(window.location.replace).not.toHaveBeenCalled();
+
+      // the restarted server
+      onStatus!({});
+      expect(window.location.replace).toHaveBeenCalledWith(
+        window.location.pathname + "?all"
+      );
+      expect(unsubscribeMock).toHaveBeenCalled();
+    });
   });
 
   describe("when updating web-portal fails", () => {
@@ -1211,6 +1247,55 @@ describe("UpgradePageContainer", () => {
     });
   });
 
+  describe("while waiting for the user to start the system upgrade", () => {
+    let received: string[];
+
+    beforeEach(async () => {
+      window.location.search = "?all";
+      received = [];
+
+      server = createServer();
+      server.on("connection", (socket) => {
+        socket.on("message", (data) => {
+          received.push(data as string);
+          if (data === "state") {
+            socket.send(JSON.stringify(Messages.StateNotBusy));
+          }
+          if (data === "update_sources") {
+            socket.send(JSON.stringify(Messages.UpdateSourcesStart));
+            socket.send(JSON.stringify(Messages.UpdateSourcesFinish));
+          }
+          if (data === "prepare") {
+            socket.send(JSON.stringify(Messages.PrepareStart));
+            socket.send(JSON.stringify(Messages.PrepareFinish));
+          }
+          if (data === "size") {
+            socket.send(JSON.stringify(Messages.Size));
+          }
+        });
+      });
+    });
+
+    it("downloads the packages in the background", async () => {
+      const { waitForPreparation } = mount();
+      await waitForPreparation();
+
+      await waitFor(() => expect(received).toContain("download"));
+      expect(received).not.toContain("start");
+    });
+
+    it("only starts the upgrade when the Update button is pressed", async () => {
+      const { getByText, waitForPreparation } = mount();
+      await waitForPreparation();
+      await waitFor(() => expect(received).toContain("download"));
+
+      fireEvent.click(getByText("Update"));
+
+      await waitFor(() => expect(received).toContain("start"));
+      expect(received.filter((data) => data === "download")).toHaveLength(1);
+    });
+  });
+
   describe("when the system is being updated", () => {
     beforeEach(async () => {
       window.location.search = "?all";
@@ -1560,7 +1645,7 @@ describe("UpgradePageContainer", () => {
     afterEach(() => {
       jest.useRealTimers();
       restartWebPortalServiceMock.mockRestore();
-      axiosGetMock.mockResolvedValue("OK");
+      subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
     });
 
     it("renders prompt correctly", async () => {
@@ -1903,7 +1988,7 @@ describe("UpgradePageContainer", () => {
         latestOSVersion: "",
         update: false,
       };
-      axiosGetMock.mockResolvedValue("OK");
+      subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
       restartWebPortalServiceMock.mockResolvedValue("OK");
       getMajorOsUpdatesMock.mockResolvedValue(osUpdatesResponse);
     });
@@ -1975,7 +2060,7 @@ describe("UpgradePageContainer", () => {
         latestOSVersion: "",
         update: false,
       };
-      axiosGetMock.mockResolvedValue("OK");
+      subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
       restartWebPortalServiceMock.mockResolvedValue("OK");
       getMajorOsUpdatesMock.mockResolvedValue(osUpdatesResponse);
     });
@@ -2036,7 +2121,7 @@ describe("UpgradePageContainer", () => {
           }
         });
       });
-      axiosGetMock.mockResolvedValue("OK");
+      subscribeToStatusMock.mockImplementation(pushStatusOnSubscribe({}));
       restartWebPortalServiceMock.mockResolvedValue("OK");
       getMajorOsUpdatesMock.mockRejectedValue(new Error("couldn't restart"));
     });
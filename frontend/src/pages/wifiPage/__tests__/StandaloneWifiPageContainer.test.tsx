@@ -20,14 +20,13 @@ import { KeyCode } from "../../../../test/types/Keys";
 import { server } from "../../../msw/server";
 import networks from "../../../msw/data/networks.json";
 import textContentMatcher from "../../../../test/helpers/textContentMatcher";
-import { act } from "react-dom/test-utils";
+import { Server } from "mock-socket";
+import createStatusServer from "../../../../test/helpers/createStatusServer";
 
-import serverStatus from "../../../services/serverStatus";
 import isConnectedThroughAp from "../../../services/isConnectedThroughAp";
+import wifiConnectionInformation from "../../../services/wifiConnectionInformation";
 import { waitFor } from "../../../../test/helpers/waitFor";
-jest.mock("../../../services/serverStatus");
 jest.mock("../../../services/isConnectedThroughAp");
-const serverStatusMock = serverStatus as jest.Mock;
 const isConnectedThroughApMock = isConnectedThroughAp as jest.Mock;
 
 let mockUserAgent = "not-web-renderer";
@@ -52,16 +51,23 @@ type ExtendedRenderResult = RenderResult & {
 
 describe("StandaloneWifiPageContainer", () => {
   let mount: () => ExtendedRenderResult;
+  let statusServer: Server;
+  let wifiConnectionStatusServer: Server;
 
   beforeEach(async () => {
     setRunningOnWebRenderer(false);
     isConnectedThroughApMock.mockResolvedValue({ isUsingAp: false });
-    serverStatusMock.mockResolvedValue("OK");
+    statusServer = createStatusServer();
+    wifiConnectionStatusServer = createStatusServer({
+      wifiConnection: () => wifiConnectionInformation(),
+    });
     mount = () => render(<StandaloneWifiPageContainer />);
   });
 
   afterEach(() => {
     jest.useRealTimers();
+    statusServer.close();
+    wifiConnectionStatusServer.close();
   });
 
   it("renders spinner while loading", async () => {
@@ -552,31 +558,23 @@ describe("StandaloneWifiPageContainer", () => {
   });
 
   it("when using AP mode, displays reconnect to AP dialog", async () => {
-    jest.useFakeTimers();
-    jest.setTimeout(10_000);
+    jest.setTimeout(20_000);
     isConnectedThroughApMock.mockResolvedValue({ isUsingAp: true });
 
     const { getByTestId } = mount();
-
-    await act(async () => {
-      expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
-
-      serverStatusMock.mockRejectedValue("Error");
-      // Advance time to wait for 5 failed requests for dialog to appear
-      jest.advanceTimersByTime(6_000);
-      jest.useRealTimers();
-      await waitFor(() =>
-        expect(getByTestId("reconnect-ap-dialog")).not.toHaveClass("hidden")
-      , {timeout: 10_000});
-
-      serverStatusMock.mockResolvedValue("OK");
-      // Advance time and wait for dialog to dissapear
-      jest.useFakeTimers();
-      jest.advanceTimersByTime(1_000);
-      jest.useRealTimers();
-      await waitFor(() =>
-        expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden")
-      , {timeout: 10_000});
-    });
+    await waitFor(() => expect(statusServer.clients()).toHaveLength(1));
+    expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden");
+
+    // the status stream closes and fails to reconnect for the dialog to appear
+    statusServer.close();
+    await waitFor(() =>
+      expect(getByTestId("reconnect-ap-dialog")).not.toHaveClass("hidden")
+    , {timeout: 10_000});
+
+    // and the dialog disappears once it reconnects
+    statusServer = createStatusServer();
+    await waitFor(() =>
+      expect(getByTestId("reconnect-ap-dialog")).toHaveClass("hidden")
+    , {timeout: 10_000});
   });
 });
@@ -20,6 +20,9 @@ import { server } from "../../../msw/server";
 import { rest } from "msw";
 import networks from "../../../msw/data/networks.json";
 import textContentMatcher from "../../../../test/helpers/textContentMatcher";
+import { Server } from "mock-socket";
+import createStatusServer from "../../../../test/helpers/createStatusServer";
+import wifiConnectionInformation from "../../../services/wifiConnectionInformation";
 
 // increase timeout so failure messages are not timeout messages
 jest.setTimeout(10000)
@@ -33,8 +36,12 @@ type ExtendedRenderResult = RenderResult & {
 describe("WifiPageContainer", () => {
   let defaultProps: Props;
   let mount: (props?: Props) => ExtendedRenderResult;
+  let wifiConnectionStatusServer: Server;
 
   beforeEach(async () => {
+    wifiConnectionStatusServer = createStatusServer({
+      wifiConnection: () => wifiConnectionInformation(),
+    });
     defaultProps = {
       goToNextPage: jest.fn(),
       goToPreviousPage: jest.fn(),
@@ -46,6 +53,10 @@ describe("WifiPageContainer", () => {
 
   });
 
+  afterEach(() => {
+    wifiConnectionStatusServer.close();
+  });
+
   it("disables the next button while loading", async () => {
     mount();
 
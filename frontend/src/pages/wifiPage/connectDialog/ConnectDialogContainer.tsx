@@ -3,9 +3,10 @@ import React, { useState, useCallback, useEffect, useRef } from "react";
 import ConnectDialog from "./ConnectDialog";
 
 import connectToNetwork from "../../../services/connectToNetwork";
-import wifiConnectionInformation from "../../../services/wifiConnectionInformation";
+import subscribeToStatus from "../../../services/subscribeToStatus";
 
 import { Network } from "../../../types/Network";
+import { WifiConnectionInfo } from "../../../types/WifiConnectionInfo";
 
 export type Props = {
   active: boolean;
@@ -15,17 +16,25 @@ export type Props = {
   network?: Network;
 };
 
+export const connectTimeoutMs = 30_000;
+export const reconnectIntervalMs = 1000;
+
 export default ({ setConnectedNetwork, ...props }: Props) => {
   const [isConnecting, setIsConnecting] = useState(false);
   const [connectError, setConnectError] = useState(false);
   const [isConnected, setIsConnected] = useState(false);
 
-  let checkConnectionInterval = useRef<NodeJS.Timeout | undefined>(undefined);
+  let unsubscribeFromStatus = useRef<(() => void) | undefined>(undefined);
+  let connectTimeout = useRef<NodeJS.Timeout | undefined>(undefined);
 
-  const clearCheckConnectionInterval = () => {
-    if (checkConnectionInterval.current) {
-      clearInterval(checkConnectionInterval.current);
-      checkConnectionInterval.current = undefined;
+  const stopCheckingConnection = () => {
+    if (connectTimeout.current) {
+      clearTimeout(connectTimeout.current);
+      connectTimeout.current = undefined;
+    }
+    if (unsubscribeFromStatus.current) {
+      unsubscribeFromStatus.current();
+      unsubscribeFromStatus.current = undefined;
     }
   }
 
@@ -33,12 +42,10 @@ export default ({ setConnectedNetwork, ...props }: Props) => {
     setIsConnected(false);
   }, [props.network]);
 
-  const requestTimeoutMs = 2000;
-  const requestIntervalMs = 1000;
-  let elapsedWaitingTimeMs = useRef(0);
+  useEffect(() => stopCheckingConnection, []);
 
   const onConnection = useCallback((network: Network) => {
-    clearCheckConnectionInterval();
+    stopCheckingConnection();
     setIsConnected(true);
     setIsConnecting(false);
     setConnectError(false);
@@ -46,33 +53,35 @@ export default ({ setConnectedNetwork, ...props }: Props) => {
   }, [setConnectError, setConnectedNetwork, setIsConnecting]);
 
   const checkConnection = useCallback((network: Network) => {
-    if (checkConnectionInterval.current) {
+    if (unsubscribeFromStatus.current) {
       return ;
     }
-    elapsedWaitingTimeMs.current = 0;
-    checkConnectionInterval.current = setInterval(async () => {
-      if (elapsedWaitingTimeMs.current > 30_000) {
-        // failed to connect, display dialog with error message
-        setConnectError(true);
-        setIsConnecting(false);
-      } else {
-        elapsedWaitingTimeMs.current += requestIntervalMs;
-      }
-
-      await wifiConnectionInformation(requestTimeoutMs)
-        .then(({ssid, bssid, bssidsForSsid }) => {
-          if (ssid === network.ssid || bssid === network.bssid || bssidsForSsid.includes(network.bssid)) {
-            onConnection(network);
-          }
-        })
-        .catch ((_) => {})
-
-    }, requestIntervalMs);
+    connectTimeout.current = setTimeout(() => {
+      // failed to connect, display dialog with error message; keep checking
+      // in case it connects later
+      setConnectError(true);
+      setIsConnecting(false);
+    }, connectTimeoutMs);
+
+    // the connection is pushed by the server; the websocket is reopened when
+    // it closes, e.g. when the pi-top hotspot goes down while connecting
+    unsubscribeFromStatus.current = subscribeToStatus(
+      ({ wifiConnection }) => {
+        if (!wifiConnection) {
+          return;
+        }
+        const { ssid, bssid, bssidsForSsid }: WifiConnectionInfo = wifiConnection;
+        if (ssid === network.ssid || bssid === network.bssid || bssidsForSsid.includes(network.bssid)) {
+          onConnection(network);
+        }
+      },
+      { probes: ["wifiConnection"], reconnectIntervalMs }
+    );
   }, [setConnectError, setIsConnecting, onConnection]);
 
   const connect = useCallback(
     (network: Network, password: string) => {
-      clearCheckConnectionInterval();
+      stopCheckingConnection();
       setIsConnecting(true);
       setIsConnected(false);
       setConnectError(false);
@@ -96,12 +105,12 @@ export default ({ setConnectedNetwork, ...props }: Props) => {
       onCancel={() => {
         setConnectError(false);
         props.onCancel();
-        clearCheckConnectionInterval();
+        stopCheckingConnection();
       }}
       onDone={() => {
         setConnectError(false);
         props.onDone();
-        clearCheckConnectionInterval();
+        stopCheckingConnection();
       }}
     />
   );
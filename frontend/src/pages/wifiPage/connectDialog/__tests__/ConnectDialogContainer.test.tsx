@@ -19,17 +19,18 @@ import { NetworkCredentials } from "../../../../types/Network";
 import querySpinner from "../../../../../test/helpers/querySpinner";
 import connectToNetwork from "../../../../services/connectToNetwork";
 import isConnectedThroughAp from "../../../../services/isConnectedThroughAp";
-import wifiConnectionInformation from "../../../../services/wifiConnectionInformation";
+import subscribeToStatus, { Status } from "../../../../services/subscribeToStatus";
 import { waitFor } from "../../../../../test/helpers/waitFor";
 import { WifiConnectionInfo } from "../../../../types/WifiConnectionInfo";
 
 jest.mock("../../../../services/connectToNetwork");
 jest.mock("../../../../services/isConnectedThroughAp");
-jest.mock("../../../../services/wifiConnectionInformation");
+jest.mock("../../../../services/subscribeToStatus");
 
 const connectToNetworkMock = connectToNetwork as jest.Mock;
 const isConnectedThroughApMock = isConnectedThroughAp as jest.Mock;
-const wifiConnectionInformationMock = wifiConnectionInformation as jest.Mock;
+const subscribeToStatusMock = subscribeToStatus as jest.Mock;
+const unsubscribeMock = jest.fn();
 const originalCreatePortal = ReactDom.createPortal;
 
 describe("ConnectDialogContainer", () => {
@@ -44,17 +45,25 @@ describe("ConnectDialogContainer", () => {
     bssid: "",
     bssidsForSsid: [],
   };
+  let onStatus: ((status: Status) => void) | undefined;
+  // the server pushes the wifi connection to subscribed clients when it changes
   const setWifiInfo = (ssid: string, bssid: string, bssidsForSsid: string[]) => {
-    wifiInfo.ssid = ssid;
-    wifiInfo.bssid = bssid;
-    wifiInfo.bssidsForSsid = bssidsForSsid;
+    wifiInfo = { ssid, bssid, bssidsForSsid };
+    onStatus && onStatus({ wifiConnection: wifiInfo });
   }
 
   beforeEach(async () => {
     isConnectedThroughApMock.mockResolvedValue({ isUsingAp: false })
 
-    wifiConnectionInformationMock.mockImplementation(() => {
-      return Promise.resolve(wifiInfo);
+    onStatus = undefined;
+    subscribeToStatusMock.mockImplementation((callback) => {
+      onStatus = callback;
+      // the whole status is pushed when connecting
+      Promise.resolve().then(() => callback({ wifiConnection: wifiInfo }));
+      return () => {
+        unsubscribeMock();
+        onStatus = undefined;
+      };
     });
 
     connectToNetworkMock.mockImplementation(
@@ -99,6 +108,8 @@ describe("ConnectDialogContainer", () => {
 
   afterEach(() => {
     connectToNetworkMock.mockRestore();
+    subscribeToStatusMock.mockReset();
+    unsubscribeMock.mockClear();
     ReactDom.createPortal = originalCreatePortal;
   });
 
@@ -124,6 +135,22 @@ describe("ConnectDialogContainer", () => {
     });
   });
 
+  it("asks the server to push the wifi connection while joining", async () => {
+    fireEvent.click(getByText("Join"));
+
+    expect(subscribeToStatusMock).toHaveBeenCalledWith(
+      expect.any(Function),
+      expect.objectContaining({ probes: ["wifiConnection"] })
+    );
+    await wait();
+  });
+
+  it("stops following the wifi connection after joining successfully", async () => {
+    fireEvent.click(getByText("Join"));
+
+    await waitFor(() => expect(unsubscribeMock).toHaveBeenCalled());
+  });
+
   describe("when there's an error connecting to a network", ()  => {
     beforeEach(async () => {
 
@@ -271,9 +298,9 @@ describe("ConnectDialogContainer", () => {
       });
 
       it("keeps checking if connected to network", () => {
-        let callCount = wifiConnectionInformationMock.mock.calls.length;
         jest.advanceTimersByTime(3_000);
-        expect(wifiConnectionInformationMock.mock.calls.length).toBeGreaterThan(callCount);
+        expect(onStatus).toBeDefined();
+        expect(unsubscribeMock).not.toHaveBeenCalled();
       });
 
       it("updates message if consecuential checks determine that connection was successful", async () => {
@@ -0,0 +1,25 @@
+import api from "../api";
+
+import finalise from "../finalise";
+
+jest.mock("../api");
+
+const apiMock = api as jest.Mocked<typeof api>;
+
+describe("finalise", () => {
+  beforeEach(() => {
+    apiMock.post.mockResolvedValue({ data: { jobId: "finalise-job" } });
+  });
+
+  it("posts the steps to route correctly", async () => {
+    await finalise(["restore_files", "update_eeprom"]);
+
+    expect(api.post).toHaveBeenCalledWith("/finalise", {
+      steps: ["restore_files", "update_eeprom"],
+    });
+  });
+
+  it("returns the id of the job running the steps", async () => {
+    expect(await finalise(["restore_files"])).toEqual("finalise-job");
+  });
+});
@@ -0,0 +1,30 @@
+import api from "../api";
+
+import getJob from "../getJob";
+
+jest.mock("../api");
+
+const apiMock = api as jest.Mocked<typeof api>;
+
+const job = {
+  id: "finalise-job",
+  resource: "finalise",
+  status: "RUNNING",
+  error: "",
+};
+
+describe("getJob", () => {
+  beforeEach(() => {
+    apiMock.get.mockResolvedValue({ data: job });
+  });
+
+  it("gets the job from the correct route", async () => {
+    await getJob("finalise-job");
+
+    expect(api.get).toHaveBeenCalledWith("/jobs/finalise-job");
+  });
+
+  it("returns the job", async () => {
+    expect(await getJob("finalise-job")).toEqual(job);
+  });
+});
@@ -0,0 +1,100 @@
+import { Server } from "mock-socket";
+
+import subscribeToStatus from "../subscribeToStatus";
+import wsBaseUrl from "../wsBaseUrl";
+import { waitFor } from "../../../test/helpers/waitFor";
+
+describe("subscribeToStatus", () => {
+  let server: Server;
+  let unsubscribe: () => void;
+
+  const createServer = (url = `${wsBaseUrl}/events`) => {
+    server = new Server(url);
+    server.on("connection", (socket) => {
+      socket.send(
+        JSON.stringify({
+          type: "STATUS",
+          payload: { connected: false, jobs: { finalise: "RUNNING" } },
+        })
+      );
+      socket.send(
+        JSON.stringify({
+          type: "STATUS_DELTA",
+          payload: { jobs: { upgrade: "QUEUED" } },
+        })
+      );
+    });
+  };
+
+  afterEach(() => {
+    unsubscribe && unsubscribe();
+    server.close();
+  });
+
+  it("calls onStatus with the status merged with its changes", async () => {
+    createServer();
+    const onStatus = jest.fn();
+
+    unsubscribe = subscribeToStatus(onStatus);
+
+    await waitFor(() =>
+      expect(onStatus).toHaveBeenLastCalledWith({
+        connected: false,
+        jobs: { finalise: "RUNNING", upgrade: "QUEUED" },
+      })
+    );
+  });
+
+  it("asks the server for the values it needs probed", async () => {
+    createServer(`${wsBaseUrl}/events?probe=roverController&probe=wifiConnection`);
+    const onStatus = jest.fn();
+
+    unsubscribe = subscribeToStatus(onStatus, {
+      probes: ["roverController", "wifiConnection"],
+    });
+
+    await waitFor(() => expect(onStatus).toHaveBeenCalled());
+  });
+
+  it("calls onDisconnect when the websocket closes", async () => {
+    createServer();
+    const onDisconnect = jest.fn();
+
+    unsubscribe = subscribeToStatus(jest.fn(), { onDisconnect });
+    await waitFor(() => expect(server.clients()).toHaveLength(1));
+    server.close();
+
+    await waitFor(() => expect(onDisconnect).toHaveBeenCalled());
+  });
+
+  it("doesn't call onDisconnect after unsubscribing", async () => {
+    createServer();
+    const onDisconnect = jest.fn();
+
+    unsubscribe = subscribeToStatus(jest.fn(), { onDisconnect });
+    await waitFor(() => expect(server.clients()).toHaveLength(1));
+    unsubscribe();
+
+    await waitFor(() => expect(server.clients()).toHaveLength(0));
+    expect(onDisconnect).not.toHaveBeenCalled();
+  });
+
+  it("reconnects when reconnectIntervalMs is set", async () => {
+    createServer();
+    const onStatus = jest.fn();
+    const onDisconnect = jest.fn();
+
+    unsubscribe = subscribeToStatus(onStatus, {
+      onDisconnect,
+      reconnectIntervalMs: 100,
+    });
+    await waitFor(() => expect(server.clients()).toHaveLength(1));
+    server.close();
+    await waitFor(() => expect(onDisconnect).toHaveBeenCalled());
+
+    onStatus.mockClear();
+    createServer();
+
+    await waitFor(() => expect(onStatus).toHaveBeenCalled());
+  });
+});
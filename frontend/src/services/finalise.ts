@@ -0,0 +1,9 @@
+import api from "./api";
+
+// starts running the finalise steps in the background and returns the id of
+// the job running them. Each step's progress is pushed by the '/events'
+// websocket under 'finalise'.
+export default async function finalise(steps: string[]) {
+  const { data } = await api.post<{ jobId: string }>(`/finalise`, { steps });
+  return data.jobId;
+}
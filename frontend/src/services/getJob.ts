@@ -0,0 +1,13 @@
+import api from "./api";
+
+export type Job = {
+  id: string;
+  resource: string;
+  status: "QUEUED" | "RUNNING" | "SUCCESS" | "FAILED" | "SUPERSEDED";
+  error: string;
+};
+
+export default async function getJob(jobId: string) {
+  const { data } = await api.get<Job>(`/jobs/${jobId}`);
+  return data;
+}
@@ -0,0 +1,85 @@
+import wsBaseUrl from "./wsBaseUrl";
+
+export type Status = { [key: string]: any };
+
+type StatusMessage = {
+  type: "STATUS" | "STATUS_DELTA";
+  payload: Status;
+};
+
+const mergeDelta = (status: Status, delta: Status) =>
+  Object.entries(delta).reduce(
+    (merged, [key, value]) => ({
+      ...merged,
+      // nested values are sent as partial objects
+      [key]:
+        value && typeof value === "object" && !Array.isArray(value)
+          ? { ...merged[key], ...value }
+          : value,
+    }),
+    status
+  );
+
+export type SubscribeOptions = {
+  // called when the websocket fails to connect or closes before unsubscribing
+  onDisconnect?: () => void;
+  // values that are only probed while a client asks for them, e.g.
+  // 'roverController' and 'wifiConnection'
+  probes?: string[];
+  // reconnects this long after the websocket fails to connect or closes
+  reconnectIntervalMs?: number;
+};
+
+// calls onStatus with the status pushed by the '/events' websocket: the whole
+// status when connecting and then every time it changes. Returns a function
+// that unsubscribes.
+export default function subscribeToStatus(
+  onStatus: (status: Status) => void,
+  { onDisconnect, probes = [], reconnectIntervalMs }: SubscribeOptions = {}
+) {
+  const query = probes
+    .map((probe) => `probe=${encodeURIComponent(probe)}`)
+    .join("&");
+  let socket: WebSocket;
+  let status: Status | undefined;
+  let isSubscribed = true;
+  let reconnectTimeout: number | undefined;
+
+  const connect = () => {
+    socket = new WebSocket(`${wsBaseUrl}/events${query && `?${query}`}`);
+    // a new connection starts with the whole status
+    status = undefined;
+
+    socket.onmessage = (e: MessageEvent) => {
+      try {
+        const { type, payload }: StatusMessage = JSON.parse(e.data);
+        if (type === "STATUS") {
+          status = payload;
+        } else if (type === "STATUS_DELTA" && status) {
+          status = mergeDelta(status, payload);
+        } else {
+          return;
+        }
+        onStatus(status);
+      } catch (_) {}
+    };
+
+    socket.onclose = () => {
+      if (!isSubscribed) {
+        return;
+      }
+      onDisconnect && onDisconnect();
+      if (reconnectIntervalMs !== undefined) {
+        reconnectTimeout = window.setTimeout(connect, reconnectIntervalMs);
+      }
+    };
+  };
+
+  connect();
+
+  return () => {
+    isSubscribed = false;
+    window.clearTimeout(reconnectTimeout);
+    socket.close();
+  };
+}
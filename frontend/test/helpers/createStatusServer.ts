@@ -0,0 +1,50 @@
+import { Server } from "mock-socket";
+
+import wsBaseUrl from "../../src/services/wsBaseUrl";
+
+type Probes = { [key: string]: () => Promise<any> };
+
+export const probeIntervalMs = 1000;
+
+// mocks the '/events' websocket for clients that ask for 'probes'. Like the
+// web portal, the values are probed while a client is connected, e.g. from
+// the routes mocked by msw, and pushed to it when they change
+export default function createStatusServer(probes: Probes = {}) {
+  const query = Object.keys(probes)
+    .map((key) => `probe=${key}`)
+    .join("&");
+  const server = new Server(`${wsBaseUrl}/events${query && `?${query}`}`);
+
+  server.on("connection", (socket) => {
+    const status: { [key: string]: any } = {};
+    let isClosed = false;
+
+    const probe = () =>
+      Object.entries(probes).forEach(([key, probeValue]) =>
+        probeValue()
+          .then((value) => {
+            if (
+              isClosed ||
+              JSON.stringify(value) === JSON.stringify(status[key])
+            ) {
+              return;
+            }
+            status[key] = value;
+            socket.send(
+              JSON.stringify({ type: "STATUS_DELTA", payload: { [key]: value } })
+            );
+          })
+          .catch(() => null)
+      );
+
+    socket.send(JSON.stringify({ type: "STATUS", payload: status }));
+    probe();
+    const interval = setInterval(probe, probeIntervalMs);
+    socket.on("close", () => {
+      isClosed = true;
+      clearInterval(interval);
+    });
+  });
+
+  return server;
+}
@@ -9,12 +9,18 @@ from pitop.common.common_names import DeviceName
 from pitop.common.pt_os import is_pi_top_os
 from pitop.system import device_type
 
+from pt_os_web_portal.backend.helpers.build import setup_build_info_event_handlers
 from pt_os_web_portal.backend.helpers.finalise import disable_ap_mode
+from pt_os_web_portal.backend.helpers.status_stream import (
+    setup_status_stream_event_handlers,
+)
 
 from . import state
 from .backend import create_app
 from .connection_manager import ConnectionManager
+from .connectivity import connectivity
 from .device_registration.listener import setup_device_registration_event_handlers
+from .event import start_async_dispatch, stop_async_dispatch
 from .miniscreen_onboarding_assistant.onboarding_assistant_app import (
     OnboardingAssistantApp,
 )
@@ -56,6 +62,7 @@ class App:
             self.connection_manager = ConnectionManager()
 
     def start(self):
+        start_async_dispatch()
         self.os_updater.start()
 
         is_onboarding = (
@@ -85,8 +92,16 @@ class App:
                 self.miniscreen_onboarding.start()
 
         setup_device_registration_event_handlers()
+        setup_build_info_event_handlers()
+        # Connectivity is probed in the background only on a pi-top[4], like
+        # the connection manager; elsewhere the status stream probes it while
+        # there are clients
+        setup_status_stream_event_handlers(
+            probe_connectivity=self.connection_manager is None
+        )
 
         if self.connection_manager:
+            connectivity.start()
             self.connection_manager.start()
 
         self.wsgi_server_https.start()
@@ -107,6 +122,9 @@ class App:
                 lambda: self.miniscreen_onboarding
                 and self.miniscreen_onboarding.stop(),
                 lambda: self.connection_manager and self.connection_manager.stop(),
+                connectivity.stop,
                 stop_wsgi_server,
             ]:
                 executor.submit(stop_func)
+
+        stop_async_dispatch()
@@ -4,7 +4,9 @@ from pitop.common.common_names import DeviceName
 from pitop.common.pt_os import get_pitopOS_info
 from pitop.system import device_type
 
+from .cache import cached
 from .device import serial_number
+from .paths import pt_issue
 
 
 @dataclass
@@ -27,6 +29,7 @@ class OSInfo:
         return response
 
 
+@cached(ttl=60, source_files=(pt_issue,))
 def about_device():
     data = OSInfo()
     try:
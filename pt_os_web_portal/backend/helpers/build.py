@@ -7,18 +7,15 @@ from pitop.common.firmware_device import FirmwareDevice
 from pitop.common.pt_os import get_pitopOS_info
 from pitop.system import device_type
 
-logger = logging.getLogger(__name__)
-
+from ...dpkg_status import DPKG_STATUS_FILE, installed_version
+from ...event import AppEvents, subscribe
+from .cache import cached
+from .paths import pt_issue
 
-def get_package_information(package_name: str):
-    try:
-        from apt import Cache
-    except ModuleNotFoundError:
-        return None
-    apt_cache = Cache()
-    return apt_cache.get(package_name)
+logger = logging.getLogger(__name__)
 
 
+@cached(ttl=60, source_files=(pt_issue, lambda: DPKG_STATUS_FILE))
 def os_build_info():
     logger.info("Function: os_build_info()")
     build = {}
@@ -37,15 +34,9 @@ def os_build_info():
             "finalRepo": build_info.final_repo,
         }
 
-    pt_os_web_portal_version = get_package_information("pt-os-web-portal")
-    if (
-        pt_os_web_portal_version
-        and hasattr(pt_os_web_portal_version, "installed")
-        and hasattr(pt_os_web_portal_version.installed, "version")
-    ):
-        build.update(
-            {"ptOsWebPortalVersion": pt_os_web_portal_version.installed.version}
-        )
+    pt_os_web_portal_version = installed_version("pt-os-web-portal")
+    if pt_os_web_portal_version:
+        build.update({"ptOsWebPortalVersion": pt_os_web_portal_version})
 
     if device_type() == DeviceName.pi_top_4.value:
         try:
@@ -56,3 +47,13 @@ def os_build_info():
 
     logger.info("OS build information: " + dumps(build))
     return build
+
+
+def handle_os_upgrade_event(status):
+    if status in ("success", "failed"):
+        logger.info("OS upgrade finished - clearing build information cache")
+        os_build_info.cache_clear()
+
+
+def setup_build_info_event_handlers():
+    subscribe(AppEvents.OS_UPDATER_UPGRADE, handle_os_upgrade_event)
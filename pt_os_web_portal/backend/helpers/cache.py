@@ -0,0 +1,146 @@
+import logging
+from concurrent.futures import Future
+from functools import wraps
+from os import stat
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+cached_functions: Dict[str, Callable] = dict()
+
+
+class _Interrupted(Exception):
+    """Set on an in-flight computation whose caller was interrupted, such as
+    by a gevent.Timeout or a killed greenlet, so that the callers waiting for
+    it compute the value themselves."""
+
+
+def stat_key(file_path: str) -> Optional[Tuple]:
+    """Path, inode, modification time and size of a file, which change when
+    the file is modified or replaced; None if the file doesn't exist."""
+    try:
+        file_stat = stat(file_path)
+    except OSError:
+        return None
+    return (file_path, file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def cached(
+    ttl: Optional[float] = None,
+    source_files: Iterable[Callable] = (),
+    file_key: Optional[Callable[..., Hashable]] = None,
+    cache_if: Optional[Callable[[Any], bool]] = None,
+):
+    """Caches the return value of a function, by arguments.
+
+    A cached value is recomputed after 'ttl' seconds, or when any of the
+    'source_files' changes. 'source_files' are functions that return a path,
+    such as the ones in the 'paths' module, so that paths are resolved on each
+    call. When the files depend on the arguments, 'file_key' is called with
+    them instead and the value is recomputed when its result changes, eg: the
+    'stat_key' of a path argument.
+
+    When 'cache_if' is given, values are only cached when it returns True for
+    them, so that a failed read (eg: an empty result) is retried next call.
+
+    Concurrent callers with the same arguments share a single computation
+    instead of each computing the value: the first caller computes it and the
+    rest wait for its result.
+
+    Cached values are shared between callers, so they must not be mutated.
+    """
+
+    def decorator(fn: Callable):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        lock = Lock()
+        entries: Dict[Tuple, Tuple] = dict()
+        in_flight: Dict[Tuple, Future] = dict()
+        stats = {"hits": 0, "misses": 0, "shared": 0}
+        # Incremented on clear, so that computations started before don't
+        # store a value that might be stale
+        generation = [0]
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            file_keys = (
+                tuple(stat_key(get_path()) for get_path in source_files),
+                file_key(*args, **kwargs) if file_key is not None else None,
+            )
+
+            with lock:
+                entry = entries.get(key)
+                if entry is not None:
+                    value, expires_at, cached_file_keys = entry
+                    is_expired = expires_at is not None and monotonic() > expires_at
+                    if not is_expired and cached_file_keys == file_keys:
+                        stats["hits"] += 1
+                        return value
+
+                future = in_flight.get(key)
+                is_owner = future is None
+                if is_owner:
+                    stats["misses"] += 1
+                    future = Future()
+                    in_flight[key] = future
+                    started_generation = generation[0]
+                else:
+                    stats["shared"] += 1
+
+            if not is_owner:
+                logger.debug(f"Waiting for in-flight computation of '{name}'")
+                try:
+                    return future.result()
+                except _Interrupted:
+                    return wrapper(*args, **kwargs)
+
+            logger.debug(f"Cache miss for '{name}', computing value")
+            try:
+                value = fn(*args, **kwargs)
+            except BaseException as e:
+                # Waiters must always be released, so this also handles
+                # exceptions that aren't errors of the function
+                with lock:
+                    if in_flight.get(key) is future:
+                        in_flight.pop(key)
+                future.set_exception(e if isinstance(e, Exception) else _Interrupted())
+                raise
+
+            expires_at = monotonic() + ttl if ttl is not None else None
+            should_cache = cache_if is None or cache_if(value)
+            with lock:
+                if in_flight.get(key) is future:
+                    in_flight.pop(key)
+                if should_cache and started_generation == generation[0]:
+                    entries[key] = (value, expires_at, file_keys)
+            future.set_result(value)
+            return value
+
+        def cache_clear():
+            logger.debug(f"Clearing cache for '{name}'")
+            with lock:
+                generation[0] += 1
+                entries.clear()
+                in_flight.clear()
+
+        def cache_info():
+            with lock:
+                return {**stats, "entries": len(entries), "ttl": ttl}
+
+        wrapper.cache_clear = cache_clear  # type: ignore
+        wrapper.cache_info = cache_info  # type: ignore
+        cached_functions[name] = wrapper
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> Dict:
+    return {name: fn.cache_info() for name, fn in cached_functions.items()}
+
+
+def clear_caches() -> None:
+    for fn in cached_functions.values():
+        fn.cache_clear()
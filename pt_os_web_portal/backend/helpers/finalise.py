@@ -1,7 +1,10 @@
 import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
 from ipaddress import ip_address
 from os import path, remove
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Tuple
 
 from pitop.common.command_runner import run_command, run_command_background
 from pitop.common.common_names import DeviceName
@@ -18,6 +21,8 @@ from pt_fw_updater.core.firmware_updater import PTInvalidFirmwareFile
 from pt_fw_updater.update import main as update_firmware
 
 from ... import state
+from ...event import AppEvents, post_event
+from .jobs import JobStatus, job_queue
 from .landing import disable_first_boot_app
 from .paths import use_test_path
 
@@ -62,7 +67,7 @@ def deprioritise_openbox_session() -> None:
     )
 
 
-def configure_landing() -> None:
+def configure_landing(raise_errors: bool = False) -> None:
     logger.debug("Function: configure_landing()")
 
     try:
@@ -73,9 +78,14 @@ def configure_landing() -> None:
         )
     except Exception as e:
         logger.error(f"configure_landing: {e}")
+        # 'ln' also fails when the link is already there
+        if raise_errors and not path.lexists(
+            "/etc/xdg/autostart/pt-first-boot-app.desktop"
+        ):
+            raise
 
 
-def stop_onboarding_autostart() -> None:
+def stop_onboarding_autostart(raise_errors: bool = False) -> None:
     logger.debug("Function: stop_onboarding_autostart()")
     try:
         state.set("app", "onboarded", "true")
@@ -85,6 +95,8 @@ def stop_onboarding_autostart() -> None:
         logger.debug("stop_onboarding_autostart: Onboarding already disabled")
     except Exception as e:
         logger.error(f"stop_onboarding_autostart: {e}")
+        if raise_errors:
+            raise
 
 
 def stop_first_boot_app_autostart() -> None:
@@ -119,6 +131,10 @@ def fw_update_is_due():
 
 def reboot() -> None:
     logger.debug("Function: reboot()")
+    # Let system configuration changes requested during onboarding finish
+    if not job_queue.wait(timeout=60):
+        logger.warning("reboot: timed out waiting for background jobs")
+
     if fw_update_is_due():
         # Do shutdown, let hub start back up
         run_command_background("shutdown -h now")
@@ -134,12 +150,17 @@ def enable_pt_miniscreen():
     )
 
 
-def restore_files():
+def restore_files(raise_errors: bool = False):
     logger.debug("Function: restore_files()")
-    for cmd in (
-        "rsync -av /usr/lib/pt-os-web-portal/bak/ /",
-        "rm -r /usr/lib/pt-os-web-portal/bak",
-        "rm -r /lib/systemd/system/lightdm.service.d/99-openbox-for-onboarding.conf",
+    errors = []
+    # Commands, with the path that is left behind when they fail
+    for cmd, leftover in (
+        ("rsync -av /usr/lib/pt-os-web-portal/bak/ /", "/usr/lib/pt-os-web-portal/bak"),
+        ("rm -r /usr/lib/pt-os-web-portal/bak", "/usr/lib/pt-os-web-portal/bak"),
+        (
+            "rm -r /lib/systemd/system/lightdm.service.d/99-openbox-for-onboarding.conf",
+            "/lib/systemd/system/lightdm.service.d/99-openbox-for-onboarding.conf",
+        ),
     ):
         try:
             run_command(cmd, timeout=30, lower_priority=True)
@@ -147,20 +168,30 @@ def restore_files():
             logger.debug("restore_files: Files already restored")
         except Exception as e:
             logger.error(f"restore_files: {e}")
+            # Commands also fail when the files were already restored
+            if path.lexists(leftover):
+                errors.append(f"{e}")
+
+    if raise_errors and errors:
+        raise Exception("; ".join(errors))
 
 
 def onboarding_completed():
     return state.get("app", "onboarded", fallback="false") == "true"
 
 
-def update_eeprom():
+def update_eeprom(raise_errors: bool = False):
     logger.debug("Function: update_eeprom()")
     try:
         run_command(
-            "/usr/lib/pt-os-notify-services/pt-eeprom -f", timeout=10, check=False
+            "/usr/lib/pt-os-notify-services/pt-eeprom -f",
+            timeout=10,
+            check=raise_errors,
         )
     except Exception as e:
         logger.error(f"update_eeprom: {e}")
+        if raise_errors:
+            raise
 
 
 def do_firmware_update():
@@ -188,12 +219,14 @@ def do_firmware_update():
     )
 
 
-def disable_ap_mode() -> None:
+def disable_ap_mode(raise_errors: bool = False) -> None:
     logger.info("Function disable_ap_mode()")
     try:
-        run_command("/usr/bin/wifi-ap-sta disable", check=False, timeout=20)
+        run_command("/usr/bin/wifi-ap-sta disable", check=raise_errors, timeout=20)
     except Exception as e:
         logger.error(f"disable_ap_mode(): {e}")
+        if raise_errors:
+            raise
 
 
 def should_switch_network(request) -> Dict:
@@ -238,3 +271,129 @@ def should_switch_network(request) -> Dict:
     }
     logger.info(f"should_switch_network: {response}")
     return response
+
+
+@dataclass
+class FinaliseStep:
+    name: str
+    fn: Callable = field(repr=False)
+    # Steps that must be done before this one starts, if they're run too
+    after: Tuple[str, ...] = ()
+
+
+# Steps that log errors instead of raising them when run on their own are
+# run with 'raise_errors', so that their failures are reported
+FINALISE_STEPS: Dict[str, FinaliseStep] = {
+    step.name: step
+    for step in (
+        FinaliseStep(
+            "enable_firmware_updater_service", enable_firmware_updater_service
+        ),
+        FinaliseStep("enable_further_link_service", enable_further_link_service),
+        FinaliseStep("enable_pt_miniscreen", enable_pt_miniscreen),
+        FinaliseStep("update_eeprom", partial(update_eeprom, raise_errors=True)),
+        FinaliseStep("update_hub_firmware", do_firmware_update),
+        FinaliseStep("restore_files", partial(restore_files, raise_errors=True)),
+        # These change files that restoring the backup can overwrite
+        FinaliseStep(
+            "deprioritise_openbox_session",
+            deprioritise_openbox_session,
+            after=("restore_files",),
+        ),
+        FinaliseStep(
+            "configure_landing",
+            partial(configure_landing, raise_errors=True),
+            after=("restore_files",),
+        ),
+        FinaliseStep(
+            "stop_onboarding_autostart",
+            partial(stop_onboarding_autostart, raise_errors=True),
+            after=("restore_files",),
+        ),
+    )
+}
+# Disabling the access point can disconnect the client, so it's done last
+FINALISE_STEPS["disable_ap_mode"] = FinaliseStep(
+    "disable_ap_mode",
+    partial(disable_ap_mode, raise_errors=True),
+    after=tuple(FINALISE_STEPS),
+)
+
+# The steps run by the frontend at the end of onboarding
+DEFAULT_FINALISE_STEPS = [
+    "enable_firmware_updater_service",
+    "enable_further_link_service",
+    "deprioritise_openbox_session",
+    "restore_files",
+    "configure_landing",
+    "stop_onboarding_autostart",
+    "update_eeprom",
+    "enable_pt_miniscreen",
+]
+
+
+def run_finalise_steps(
+    names: List[str], max_workers: Optional[int] = None
+) -> Dict[str, JobStatus]:
+    """Runs the finalise steps called 'names', each one as soon as the steps
+    it comes after are done, so that finalising takes as long as the longest
+    chain of steps.
+
+    A step runs even if a step before it failed, as when the frontend ran
+    them one by one. The status of each step is posted as a FINALISE_STEP
+    event; an exception listing the failed steps is raised at the end."""
+    logger.debug(f"Function: run_finalise_steps({names})")
+    steps = [FINALISE_STEPS[name] for name in dict.fromkeys(names)]
+    waiting_for = {
+        step.name: {name for name in step.after if name in names} for step in steps
+    }
+    statuses: Dict[str, JobStatus] = dict()
+
+    def post(name: str, status: JobStatus, error: str = "") -> None:
+        statuses[name] = status
+        post_event(
+            AppEvents.FINALISE_STEP,
+            {"name": name, "status": status.name, "error": error},
+        )
+
+    for step in steps:
+        post(step.name, JobStatus.QUEUED)
+
+    running: Dict[Future, str] = dict()
+    with ThreadPoolExecutor(
+        max_workers=max_workers or max(len(steps), 1),
+        thread_name_prefix="finalise",
+    ) as executor:
+        while waiting_for or running:
+            for name in [name for name, after in waiting_for.items() if not after]:
+                del waiting_for[name]
+                post(name, JobStatus.RUNNING)
+                running[executor.submit(FINALISE_STEPS[name].fn)] = name
+
+            if not running:
+                raise RuntimeError(
+                    f"Finalise steps depend on each other: {sorted(waiting_for)}"
+                )
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    post(name, JobStatus.SUCCESS)
+                else:
+                    logger.error(f"run_finalise_steps: '{name}' failed: {error}")
+                    post(name, JobStatus.FAILED, f"{error}")
+                for after in waiting_for.values():
+                    after.discard(name)
+
+    failed = [name for name, status in statuses.items() if status == JobStatus.FAILED]
+    if failed:
+        raise Exception(f"Finalise steps failed: {', '.join(failed)}")
+    return statuses
+
+
+def finalise(names: List[str]):
+    """Runs the finalise steps called 'names' in the background; returns
+    the job that runs them."""
+    return job_queue.submit("finalise", run_finalise_steps, names)
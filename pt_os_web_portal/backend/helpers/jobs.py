@@ -0,0 +1,154 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from threading import Event, Lock, Thread, current_thread
+from time import monotonic
+from typing import Callable, Dict, Optional, Tuple
+from uuid import uuid4
+
+from ...event import AppEvents, post_event
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(Enum):
+    QUEUED = auto()
+    RUNNING = auto()
+    SUCCESS = auto()
+    FAILED = auto()
+    SUPERSEDED = auto()
+
+
+@dataclass
+class Job:
+    resource: str
+    fn: Callable = field(repr=False)
+    args: Tuple = field(default=(), repr=False)
+    id: str = field(default_factory=lambda: uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    error: str = ""
+    superseded_by: str = ""
+    done: Event = field(default_factory=Event, repr=False)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "resource": self.resource,
+            "status": self.status.name,
+            "error": self.error,
+            "supersededBy": self.superseded_by,
+        }
+
+
+class JobQueue:
+    """Runs slow system changes in the background, so that requests can
+    return straight away with a job id that can be polled.
+
+    Jobs for the same resource run one at a time, in order; jobs for different
+    resources run concurrently. A job still waiting to run is superseded by
+    a newer job for the same resource, so only the last write is applied."""
+
+    def __init__(self, max_finished_jobs: int = 50) -> None:
+        self._max_finished_jobs = max_finished_jobs
+        self._lock = Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: Dict[str, Job] = dict()
+        self._workers: Dict[str, Thread] = dict()
+
+    def submit(self, resource: str, fn: Callable, *args) -> Job:
+        job = Job(resource=resource, fn=fn, args=args)
+        logger.info(f"JobQueue: queueing job {job.id} for '{resource}'")
+
+        worker = None
+        with self._lock:
+            previous = self._pending.get(resource)
+            if previous is not None:
+                logger.info(f"JobQueue: job {previous.id} superseded by {job.id}")
+                previous.status = JobStatus.SUPERSEDED
+                previous.superseded_by = job.id
+                previous.done.set()
+
+            self._pending[resource] = job
+            self._jobs[job.id] = job
+            self._prune()
+
+            if resource not in self._workers:
+                worker = Thread(target=self._run, args=(resource,), daemon=True)
+                self._workers[resource] = worker
+
+        if previous is not None:
+            self._post(previous)
+        self._post(job)
+        # Started after posting, so that job updates are posted in order
+        if worker is not None:
+            worker.start()
+        return job
+
+    def _post(self, job: Job) -> None:
+        post_event(AppEvents.BACKGROUND_JOB, job.to_dict())
+
+    def _run(self, resource: str) -> None:
+        while True:
+            with self._lock:
+                job = self._pending.pop(resource, None)
+                if job is None:
+                    del self._workers[resource]
+                    return
+                job.status = JobStatus.RUNNING
+            self._post(job)
+
+            logger.info(f"JobQueue: running job {job.id} for '{resource}'")
+            try:
+                job.fn(*job.args)
+                status, error = JobStatus.SUCCESS, ""
+            except Exception as e:
+                logger.error(f"JobQueue: job {job.id} for '{resource}' failed: {e}")
+                status, error = JobStatus.FAILED, f"{e}"
+
+            with self._lock:
+                job.status = status
+                job.error = error
+            job.done.set()
+            self._post(job)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[: max(0, len(finished) - self._max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self, resource: str) -> Optional[Job]:
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.resource == resource:
+                    return job
+        return None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits until all queued jobs are done. Returns False on timeout.
+
+        When called from a job, the jobs for its resource aren't waited for,
+        since they can't run until it's done."""
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            with self._lock:
+                unfinished = [
+                    job
+                    for job in self._jobs.values()
+                    if not job.done.is_set()
+                    and self._workers.get(job.resource) is not current_thread()
+                ]
+            if not unfinished:
+                return True
+
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            unfinished[0].done.wait(remaining)
+
+
+job_queue = JobQueue()
@@ -1,31 +1,73 @@
 import logging
 from re import search
-from typing import List
+from typing import Callable, Dict, List, Optional
 
 from pitop.common.command_runner import run_command
 
+from .cache import cached, stat_key
 from .paths import default_locale, locales_gen, supported_locales
 
 logger = logging.getLogger(__name__)
 
 
-def list_locales_supported() -> list:
-    logger.info("Function: list_locales_supported()")
+def parse_supported_locale(line: str) -> Optional[str]:
+    # keep lines NOT starting with @ and containing .UTF-8, take before .UTF-8
+    if line and line[0] != "@" and ".UTF-8" in line:
+        return line.split(".UTF-8")[0]
+    return None
+
+
+def parse_available_locale(line: str) -> Optional[str]:
+    # get just locale code from lines matching utf-8 locale regex
+    matches = search(r"(\w+_\w\w)\.UTF-8", line)
+    return matches.group(1) if matches is not None else None
+
+
+# Not cached when empty, eg: when the file can't be read
+@cached(file_key=lambda file_path, parse_line: stat_key(file_path), cache_if=bool)
+def read_locales(
+    file_path: str, parse_line: Callable[[str], Optional[str]]
+) -> Dict[str, None]:
+    logger.info(f"LocaleCatalogue: parsing '{file_path}'")
+    with open(file_path) as file:
+        # dict keys keep insertion order, removing repeats
+        return dict.fromkeys(
+            locale
+            for locale in (parse_line(line.rstrip()) for line in file)
+            if locale is not None
+        )
+
+
+class LocaleCatalogue:
+    """Locale codes read from a file, without repeats and in file order.
+    The file is parsed on first use and only parsed again when it changes."""
+
+    def __init__(
+        self, get_path: Callable[[], str], parse_line: Callable[[str], Optional[str]]
+    ) -> None:
+        self._get_path = get_path
+        self._parse_line = parse_line
 
-    with open(supported_locales()) as file:
-        lines = [line.rstrip() for line in file]
-        utf8_locales: List[str] = list()
+    def _load(self) -> Dict[str, None]:
+        return read_locales(self._get_path(), self._parse_line)
 
-        for line in lines:
-            # keep lines NOT starting with @ and containing .UTF-8
-            if line[0] != "@" and ".UTF-8" in line:
-                # take before .UTF-8
-                locale_code = line.split(".UTF-8")[0]
-                # remove repeats
-                if not any(locale == locale_code for locale in utf8_locales):
-                    utf8_locales.append(locale_code)
+    def clear(self) -> None:
+        read_locales.cache_clear()
 
-        return utf8_locales
+    def locales(self) -> List[str]:
+        return list(self._load())
+
+    def __contains__(self, locale_code: str) -> bool:
+        return locale_code in self._load()
+
+
+supported_locales_catalogue = LocaleCatalogue(supported_locales, parse_supported_locale)
+available_locales_catalogue = LocaleCatalogue(locales_gen, parse_available_locale)
+
+
+def list_locales_supported() -> list:
+    logger.info("Function: list_locales_supported()")
+    return supported_locales_catalogue.locales()
 
 
 def current_locale() -> str:
@@ -44,32 +86,22 @@ def current_locale() -> str:
 
 def list_locales_available() -> list:
     logger.info("Function: list_locales_available()")
+    return available_locales_catalogue.locales()
 
-    with open(locales_gen()) as file:
-        lines = [line.rstrip() for line in file]
-        utf8_locales: List[str] = list()
-
-        for line in lines:
-            # get just locale code from lines matching utf-8 locale regex
-            matches = search(r"(\w+_\w\w)\.UTF-8", line)
-            if matches is not None:
-                locale_code = matches.group(1)
-                # remove repeats
-                if not any(locale == locale_code for locale in utf8_locales):
-                    utf8_locales.append(locale_code)
 
-        return utf8_locales
+def locale_is_available(locale_code) -> bool:
+    return locale_code in available_locales_catalogue
 
 
 def set_locale(locale_code):
     logger.info("Function: set_locale(locale_code='%s')" % locale_code)
 
-    available_locales = list_locales_available()
-    if locale_code not in available_locales:
-        logger.error("Unable to set locale - Not available: %s" % locale_code)
-        return None
+    if not locale_is_available(locale_code):
+        raise ValueError(f"Unable to set locale - Not available: {locale_code}")
 
     command = f"raspi-config nonint do_change_locale {locale_code}.UTF-8"
     run_command(command, timeout=30, capture_output=False)
+    # raspi-config updates the list of generated locales
+    available_locales_catalogue.clear()
 
     return True
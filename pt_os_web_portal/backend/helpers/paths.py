@@ -25,6 +25,13 @@ def zone_tab():
     return "/usr/share/zoneinfo/zone.tab"
 
 
+def etc_localtime():
+    if use_test_path():
+        return get_test_file_path("localtime")
+
+    return "/etc/localtime"
+
+
 def default_locale():
     if use_test_path():
         return get_test_file_path("locale")
@@ -0,0 +1,213 @@
+import logging
+from copy import deepcopy
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from ...connectivity import connectivity
+from ...event import AppEvents, subscribe
+from ...os_updater.message_handler import BufferedClient
+from .system import rover_controller_status
+from .wifi import wifi_connection_info
+
+logger = logging.getLogger(__name__)
+
+
+class StatusStream:
+    """Pushes status changes to the clients of the '/events' websocket.
+
+    A new client gets a 'STATUS' message with the whole status, followed by
+    'STATUS_DELTA' messages with only the values that changed. Nested values
+    ('updater', 'jobs' and 'finalise') are sent as partial dictionaries, to be
+    merged into the existing ones.
+
+    Status is updated by app events and by a single probe loop that runs while
+    there are clients connected, so the number of open pages doesn't change
+    how often the system is probed. Internet connectivity is updated by the
+    events of the connectivity probe, and probed by the loop when
+    'probe_connectivity' is set, since the probe doesn't run in the background
+    on every device.
+
+    Values that are costly to probe and only needed by some pages, listed in
+    'REQUESTED_PROBES', are only probed while a client that asked for them
+    when connecting is connected. They are left out of the status when no
+    client asks for them, so that clients never get a stale value.
+
+    Messages are queued under the lock, which keeps their order, and sent by
+    each client's BufferedClient, so that a slow client never blocks the
+    thread that updates the status."""
+
+    PROBE_INTERVAL = 2
+    REQUESTED_PROBES: Dict[str, Callable] = {
+        "roverController": rover_controller_status,
+        "wifiConnection": wifi_connection_info,
+    }
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._clients: Dict[Any, BufferedClient] = dict()
+        # Requested probes of each client
+        self._requested: Dict[Any, Set[str]] = dict()
+        self._status: Dict[str, Any] = {
+            "connected": False,
+            "hasConnectedDevice": False,
+            "updater": {},
+            "jobs": {},
+            "finalise": {},
+        }
+        self._probe_thread: Optional[Thread] = None
+        self._wake = Event()
+        self.probe_connectivity = False
+
+    def probes(self) -> Dict[str, Callable]:
+        with self._lock:
+            requested = self._requested_probes()
+        probes: Dict[str, Callable] = {
+            key: probe
+            for key, probe in self.REQUESTED_PROBES.items()
+            if key in requested
+        }
+        if self.probe_connectivity:
+            probes["connected"] = lambda: connectivity.is_connected(
+                max_age=self.PROBE_INTERVAL
+            )
+        return probes
+
+    def status(self) -> Dict:
+        with self._lock:
+            return deepcopy(self._status)
+
+    def add_client(self, ws, probes: Iterable[str] = ()) -> None:
+        """Adds a client, that needs the values in 'probes' of
+        'REQUESTED_PROBES' to be probed."""
+        requested = set(probes) & set(self.REQUESTED_PROBES)
+        with self._lock:
+            client = BufferedClient(ws, on_error=self.remove_client)
+            is_probed = self._requested_probes()
+            self._clients[ws] = client
+            self._requested[ws] = requested
+            logger.info(f"StatusStream: new client - {len(self._clients)} connected")
+            self._send(client, "STATUS", self._status)
+
+            if self._probe_thread is None:
+                self._wake.clear()
+                self._probe_thread = Thread(target=self._probe, daemon=True)
+                self._probe_thread.start()
+            elif not requested <= is_probed:
+                # Probe the new values now, rather than after the interval
+                self._wake.set()
+
+    def remove_client(self, ws) -> None:
+        with self._lock:
+            client = self._clients.pop(ws, None)
+            if client is None:
+                return
+            self._forget_requested_probes(ws)
+            client.close()
+            logger.info(f"StatusStream: client left - {len(self._clients)} connected")
+            if not self._clients:
+                self._wake.set()
+
+    def update(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._update(key, value)
+
+    def update_item(self, key: str, item: str, value: Any) -> None:
+        with self._lock:
+            if self._status[key].get(item) == value:
+                return
+            self._status[key][item] = value
+            self._broadcast({key: {item: value}})
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the queued messages are sent to all clients."""
+        with self._lock:
+            clients = list(self._clients.values())
+        deadline = None if timeout is None else monotonic() + timeout
+        for client in clients:
+            remaining = None if deadline is None else max(0, deadline - monotonic())
+            if not client.wait_until_sent(remaining):
+                return False
+        return True
+
+    def _update(self, key: str, value: Any) -> None:
+        # Called with '_lock' held
+        if self._status.get(key) == value:
+            return
+        self._status[key] = value
+        self._broadcast({key: value})
+
+    def _requested_probes(self) -> Set[str]:
+        # Called with '_lock' held
+        return set().union(*self._requested.values())
+
+    def _forget_requested_probes(self, ws) -> None:
+        # Called with '_lock' held
+        requested = self._requested.pop(ws, set())
+        for key in requested - self._requested_probes():
+            self._status.pop(key, None)
+
+    def _broadcast(self, delta: Dict) -> None:
+        for ws, client in list(self._clients.items()):
+            if ws.closed or client.closed:
+                client.close()
+                del self._clients[ws]
+                self._forget_requested_probes(ws)
+                continue
+            self._send(client, "STATUS_DELTA", delta)
+
+    def _send(self, client: BufferedClient, message_type: str, payload: Dict) -> None:
+        # Copied, since the status keeps changing while the message is queued
+        client.put({"type": message_type, "payload": deepcopy(payload)})
+
+    def _probe(self) -> None:
+        while True:
+            with self._lock:
+                if not self._clients:
+                    self._probe_thread = None
+                    return
+
+            for key, probe in self.probes().items():
+                try:
+                    value = probe()
+                except Exception as e:
+                    logger.error(f"StatusStream: error probing '{key}': {e}")
+                    continue
+                with self._lock:
+                    # Dropped if the clients that asked for it left meanwhile
+                    if (
+                        key not in self.REQUESTED_PROBES
+                        or key in self._requested_probes()
+                    ):
+                        self._update(key, value)
+
+            self._wake.wait(self.PROBE_INTERVAL)
+            self._wake.clear()
+
+
+status_stream = StatusStream()
+
+
+def setup_status_stream_event_handlers(probe_connectivity: bool = False) -> None:
+    status_stream.probe_connectivity = probe_connectivity
+
+    def update(key: str) -> Callable:
+        return lambda data: status_stream.update(key, data)
+
+    def update_updater(stage: str) -> Callable:
+        return lambda data: status_stream.update_item("updater", stage, data)
+
+    subscribe(AppEvents.IS_CONNECTED_TO_INTERNET, update("connected"))
+    subscribe(AppEvents.HAS_CONNECTED_DEVICE, update("hasConnectedDevice"))
+    subscribe(AppEvents.RESTARTING_WEB_PORTAL, update("restartingWebPortal"))
+    subscribe(AppEvents.OS_UPDATE_SOURCES, update_updater("updateSources"))
+    subscribe(AppEvents.OS_UPDATER_PREPARE, update_updater("prepare"))
+    subscribe(AppEvents.OS_UPDATER_UPGRADE, update_updater("upgrade"))
+    subscribe(
+        AppEvents.BACKGROUND_JOB,
+        lambda job: status_stream.update_item("jobs", job["resource"], job),
+    )
+    subscribe(
+        AppEvents.FINALISE_STEP,
+        lambda step: status_stream.update_item("finalise", step["name"], step),
+    )
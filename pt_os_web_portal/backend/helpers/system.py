@@ -3,6 +3,7 @@ import logging
 from enum import Enum
 from typing import Optional
 
+import requests
 from pitop.common.command_runner import run_command
 
 logger = logging.getLogger(__name__)
@@ -38,3 +39,27 @@ service_enable = functools.partial(systemctl, "enable")
 service_disable = functools.partial(systemctl, "disable")
 service_status = functools.partial(systemctl, "status")
 service_is_active = functools.partial(systemctl, "is-active")
+
+
+def rover_controller_status(secure: bool = False) -> str:
+    status = service_is_active(SystemService.RoverController, timeout=1)
+    if status != "active":
+        return status
+
+    # The service is active before the controller server is ready
+    protocol = "https" if secure else "http"
+    port = 8071 if secure else 8070
+    try:
+        response = requests.get(
+            f"{protocol}://localhost:{port}",
+            timeout=2,
+            verify=False,  # Skip SSL verification for localhost
+            allow_redirects=False,
+        )
+        if response.status_code != 200:
+            status = "inactive"
+    except Exception as e:
+        logger.debug(f"Rover controller check failed: {e}")
+        status = "inactive"
+
+    return status
@@ -1,31 +1,71 @@
 import logging
+from os import path
+from typing import Dict, List, NamedTuple, Optional, Set
 
 from pitop.common.command_runner import run_command
 
-from .paths import use_test_path, zone_tab
+from .cache import cached
+from .paths import etc_localtime, use_test_path, zone_tab
 
 logger = logging.getLogger(__name__)
 
 
-def get_all_timezones() -> list:
-    logger.info("Function: get_all_timezones()")
+class TimezoneIndex(NamedTuple):
+    timezones: List[Dict]
+    names: Set[str]
+
+
+def available_timezones() -> Optional[Set[str]]:
+    if use_test_path():
+        return None
+
+    command = "timedatectl list-timezones"
+    return set(run_command(command, timeout=10).split("\n"))
+
+
+# Not cached when empty, eg: when timedatectl fails
+@cached(
+    source_files=(lambda: zone_tab(),),
+    cache_if=lambda index: len(index.timezones) > 0,
+)
+def load_timezone_index() -> TimezoneIndex:
+    logger.info("TimezoneCatalogue: parsing timezones")
     with open(zone_tab()) as file:
-        timezone_rows = [
-            line.rstrip().split() for line in file if not line.startswith("#")
+        timezones = [
+            {"countryCode": row[0], "timezone": row[2]}
+            for row in (
+                line.rstrip().split() for line in file if not line.startswith("#")
+            )
         ]
 
-        timezones = list()
-        for timezone_row in timezone_rows:
-            timezones.append(
-                {"countryCode": timezone_row[0], "timezone": timezone_row[2]}
-            )
+    available = available_timezones()
+    if available is not None:
+        timezones = [t for t in timezones if t["timezone"] in available]
+
+    return TimezoneIndex(
+        timezones=timezones,
+        names={t["timezone"] for t in timezones},
+    )
 
-        if not use_test_path():
-            command = "timedatectl list-timezones"
-            available_timezones = run_command(command, timeout=10).split("\n")
-            timezones = [t for t in timezones if t["timezone"] in available_timezones]
 
-        return timezones
+class TimezoneCatalogue:
+    """Timezones from 'zone.tab' that are supported by the system, indexed by
+    name. The catalogue is parsed on first use and only parsed again when
+    'zone.tab' changes, eg: on a 'tzdata' upgrade."""
+
+    def timezones(self) -> List[Dict]:
+        return load_timezone_index().timezones
+
+    def is_available(self, timezone: str) -> bool:
+        return timezone in load_timezone_index().names
+
+
+timezone_catalogue = TimezoneCatalogue()
+
+
+def get_all_timezones() -> list:
+    logger.info("Function: get_all_timezones()")
+    return timezone_catalogue.timezones()
 
 
 def get_current_timezone() -> str:
@@ -35,22 +75,31 @@ def get_current_timezone() -> str:
     if use_test_path():
         return "Europe/London"
 
-    for line in run_command("timedatectl", timeout=10).split("\n"):
-        if "Time zone:" in line:
-            tz_string = line.split(":")[1].split("(")[0].strip()
-            break
+    # '/etc/localtime' links to the zoneinfo file of the current timezone
+    localtime = path.realpath(etc_localtime())
+    if "zoneinfo/" in localtime:
+        tz_string = localtime.split("zoneinfo/", 1)[1]
+
+    if not timezone_catalogue.is_available(tz_string):
+        tz_string = ""
+        for line in run_command("timedatectl", timeout=10).split("\n"):
+            if "Time zone:" in line:
+                tz_string = line.split(":")[1].split("(")[0].strip()
+                break
 
     logger.info("Current timezone: '%s'" % tz_string)
     return tz_string
 
 
+def timezone_is_available(tz_string) -> bool:
+    return timezone_catalogue.is_available(tz_string)
+
+
 def set_timezone(tz_string):
     logger.info("Function: set_timezone(tz_string='%s')" % tz_string)
 
-    timezones = get_all_timezones()
-    if not any(tz_string == timezone["timezone"] for timezone in timezones):
-        logger.error("Unable to set timezone - Not available: %s" % tz_string)
-        return None
+    if not timezone_is_available(tz_string):
+        raise ValueError(f"Unable to set timezone - Not available: {tz_string}")
 
     command = f"raspi-config nonint do_change_timezone {tz_string}"
     return run_command(command, timeout=10)
@@ -2,11 +2,13 @@ import logging
 
 from pitop.common.command_runner import run_command
 
+from .cache import cached
 from .paths import iso_countries
 
 logger = logging.getLogger(__name__)
 
 
+@cached(ttl=3600, source_files=(iso_countries,))
 def list_wifi_countries() -> dict:
     logger.info("Function: list_wifi_countries()")
     with open(iso_countries()) as file:
@@ -32,14 +34,16 @@ def current_wifi_country() -> str:
     return wifi_country
 
 
+def wifi_country_is_available(wifi_country_code) -> bool:
+    return wifi_country_code.upper() in list_wifi_countries()
+
+
 def set_wifi_country(wifi_country_code):
     logger.info(
         "Function: set_wifi_country(wifi_country_code='%s')" % wifi_country_code
     )
     code = wifi_country_code.upper()
-    country_codes = list_wifi_countries().keys()
-    if code not in country_codes:
-        logger.error("Unable to set Wi-Fi country - Not available: %s" % code)
-        return None
+    if not wifi_country_is_available(code):
+        raise ValueError(f"Unable to set Wi-Fi country - Not available: {code}")
 
     return run_command("raspi-config nonint do_wifi_country %s" % code, timeout=15)
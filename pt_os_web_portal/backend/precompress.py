@@ -0,0 +1,115 @@
+"""Generates compressed siblings ('.gz' and '.br') of the web app build files.
+
+This module is run at package build time, before the backend dependencies are
+available, so it must only import modules from the standard library:
+
+    python3 pt_os_web_portal/backend/precompress.py pt_os_web_portal/backend/build
+"""
+
+import gzip
+import logging
+from argparse import ArgumentParser
+from os import path, walk
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (
+    ".css",
+    ".html",
+    ".ico",
+    ".js",
+    ".json",
+    ".map",
+    ".svg",
+    ".txt",
+)
+
+# Files smaller than this don't benefit from compression
+MIN_SIZE = 1024
+
+# Extension used for the compressed sibling of a file, by 'Content-Encoding'
+ENCODING_EXTENSIONS = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+
+def gzip_compress(data: bytes) -> bytes:
+    # mtime=0 makes the output reproducible between builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data: bytes) -> bytes:
+    import brotli
+
+    return brotli.compress(data, quality=11)
+
+
+def _available_encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    available = dict()
+    try:
+        import brotli  # noqa: F401
+
+        available["br"] = brotli_compress
+    except ModuleNotFoundError:
+        pass
+    available["gzip"] = gzip_compress
+    return available
+
+
+# Looked up once, since a missing module would be looked up on every call
+ENCODERS = _available_encoders()
+
+
+def encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    """Available compression functions, ordered by preference."""
+    return ENCODERS
+
+
+def is_compressible(filename: str) -> bool:
+    return filename.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def precompress_file(file_path: str) -> List[str]:
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    if len(data) < MIN_SIZE:
+        return []
+
+    created = []
+    for encoding, compress in encoders().items():
+        compressed = compress(data)
+        # Not worth serving if compression doesn't save anything
+        if len(compressed) >= len(data):
+            continue
+
+        compressed_path = file_path + ENCODING_EXTENSIONS[encoding]
+        with open(compressed_path, "wb") as f:
+            f.write(compressed)
+        created.append(compressed_path)
+
+    return created
+
+
+def precompress_directory(directory: str) -> List[str]:
+    created = []
+    for root, _, files in walk(directory):
+        for filename in files:
+            if is_compressible(filename):
+                created += precompress_file(path.join(root, filename))
+    return created
+
+
+def main():
+    parser = ArgumentParser(description="Precompress web app build files")
+    parser.add_argument("directory", help="directory with the web app build")
+    args = parser.parse_args()
+
+    created = precompress_directory(args.directory)
+    print(f"Created {len(created)} precompressed files in '{args.directory}'")
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -1,9 +1,7 @@
 import logging
 from ipaddress import ip_address
 from json import dumps as jdumps
-from threading import Lock, Thread
 
-import requests
 from flask import abort
 from flask import current_app as app
 from flask import request, send_from_directory
@@ -13,18 +11,21 @@ from pitop.common.sys_info import (
     InterfaceNetworkData,
     NetworkInterface,
     interface_is_up,
-    is_connected_to_internet,
 )
 from pt_web_vnc.vnc import clients as vnc_clients
 from pt_web_vnc.vnc import connection_details as vnc_connection_details
 
 from ..app_window import LandingAppWindow, OnboardingAppWindow
-from ..event import AppEvents, post_event
+from ..connectivity import connectivity
+from ..event import AppEvents, dispatch_stats, post_event
 from ..pt_os_version_check import check_relevant_pi_top_os_version_updates
 from . import sockets
 from .helpers.about import about_device
 from .helpers.build import os_build_info
+from .helpers.cache import cache_stats
 from .helpers.finalise import (
+    DEFAULT_FINALISE_STEPS,
+    FINALISE_STEPS,
     available_space,
     configure_landing,
     deprioritise_openbox_session,
@@ -33,6 +34,7 @@ from .helpers.finalise import (
     enable_firmware_updater_service,
     enable_further_link_service,
     enable_pt_miniscreen,
+    finalise,
     fw_update_is_due,
     is_on_openbox_session,
     reboot,
@@ -42,10 +44,12 @@ from .helpers.finalise import (
     stop_onboarding_autostart,
     update_eeprom,
 )
+from .helpers.jobs import job_queue
 from .helpers.keyboard import (
     current_keyboard_layout,
-    list_keyboard_layout_codes,
-    list_keyboard_layout_variants,
+    keyboard_layout_codes_json,
+    keyboard_layout_variants_json,
+    keyboard_state,
     set_keyboard_layout,
 )
 from .helpers.landing import (
@@ -58,16 +62,28 @@ from .helpers.landing import (
     open_wifi,
     python_sdk_docs_url,
 )
-from .helpers.language import current_locale, list_locales_supported, set_locale
+from .helpers.language import (
+    current_locale,
+    list_locales_supported,
+    locale_is_available,
+    set_locale,
+)
 from .helpers.registration import set_registration_email
+from .helpers.status_stream import status_stream
 from .helpers.system import (
     SystemService,
+    rover_controller_status,
     service_is_active,
     service_restart,
     service_start,
     service_stop,
 )
-from .helpers.timezone import get_all_timezones, get_current_timezone, set_timezone
+from .helpers.timezone import (
+    get_all_timezones,
+    get_current_timezone,
+    set_timezone,
+    timezone_is_available,
+)
 from .helpers.vnc import PtWebVncDisplayId
 from .helpers.vnc_advanced_wifi_gui import get_advanced_wifi_gui_url
 from .helpers.wifi import attempt_connection, get_ssids, wifi_connection_info
@@ -75,13 +91,11 @@ from .helpers.wifi_country import (
     current_wifi_country,
     list_wifi_countries,
     set_wifi_country,
+    wifi_country_is_available,
 )
 
 logger = logging.getLogger(__name__)
 
-# Create a lock for the build info route
-build_info_lock = Lock()
-
 
 def get_os_updater():
     return app.config["OS_UPDATER"]
@@ -120,9 +134,8 @@ def roboto(filename):
 @app.route("/build-info", methods=["GET"])
 def get_build_info():
     logger.debug("Route '/build-info'")
-    # Try to acquire the lock, will block if another request is processing
-    with build_info_lock:
-        return abort_on_no_data(os_build_info())
+    # Concurrent requests share a single computation of the build info
+    return abort_on_no_data(os_build_info())
 
 
 # Language
@@ -145,10 +158,11 @@ def post_locale():
     if not isinstance(locale_code, str):
         return abort(422)
 
-    if set_locale(locale_code) is None:
+    if not locale_is_available(locale_code):
         return abort(400)
 
-    return "OK"
+    job = job_queue.submit("locale", set_locale, locale_code)
+    return jdumps({"jobId": job.id})
 
 
 # Wifi Country
@@ -171,10 +185,11 @@ def post_country():
     if not isinstance(country, str):
         return abort(422)
 
-    if set_wifi_country(country) is None:
+    if not wifi_country_is_available(country):
         return abort(400)
 
-    return "OK"
+    job = job_queue.submit("wifi_country", set_wifi_country, country)
+    return jdumps({"jobId": job.id})
 
 
 # Timezones
@@ -195,23 +210,24 @@ def post_timezone():
     if not isinstance(timezone, str):
         return abort(422)
 
-    if set_timezone(timezone) is None:
+    if not timezone_is_available(timezone):
         return abort(400)
 
-    return "OK"
+    job = job_queue.submit("timezone", set_timezone, timezone)
+    return jdumps({"jobId": job.id})
 
 
 # Keyboard
 @app.route("/list-keyboard-layout-codes", methods=["GET"])
 def get_keyboard_layout_codes():
     logger.debug("Route '/list-keyboard-layout-codes'")
-    return abort_on_no_data(list_keyboard_layout_codes())
+    return keyboard_layout_codes_json()
 
 
 @app.route("/list-keyboard-layout-variants", methods=["GET"])
 def get_keyboard_layout_variants():
     logger.debug("Route '/list-keyboard-layout-variants'")
-    return abort_on_no_data(list_keyboard_layout_variants())
+    return keyboard_layout_variants_json()
 
 
 @app.route("/current-keyboard-layout", methods=["GET"])
@@ -223,6 +239,12 @@ def get_current_keyboard_layout():
     return jdumps({"layout": layout, "variant": variant})
 
 
+@app.route("/keyboard-layout-status", methods=["GET"])
+def get_keyboard_layout_status():
+    logger.debug("Route '/keyboard-layout-status'")
+    return jdumps(keyboard_state.status())
+
+
 @app.route("/set-keyboard-layout", methods=["POST"])
 def post_keyboard_layout():
     logger.debug("Route '/set-keyboard-layout'")
@@ -232,8 +254,18 @@ def post_keyboard_layout():
 
     variant = request.get_json().get("variant")
 
-    set_keyboard_layout(layout, variant)
-    return "OK"
+    job = set_keyboard_layout(layout, variant)
+    return jdumps({"jobId": job.id})
+
+
+# Background jobs
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    logger.debug(f"Route '/jobs/{job_id}'")
+    job = job_queue.get(job_id)
+    if job is None:
+        return jdumps({"error": "Job not found"}), 404
+    return jdumps(job.to_dict())
 
 
 # Wifi connection
@@ -264,7 +296,7 @@ def post_wifi_credentials():
 @app.route("/is-connected", methods=["GET"])
 def get_is_connected():
     logger.debug("Route '/is-connected'")
-    is_connected = is_connected_to_internet()
+    is_connected = connectivity.is_connected(max_age=1)
     return jdumps({"connected": is_connected})
 
 
@@ -299,40 +331,32 @@ def get_is_connected_through_ap():
 # OS Upgrade
 @sockets.route("/os-upgrade")
 def os_upgrade(ws):
-    thread_arr = list()
-
-    event_lookup = {
-        "update_sources": get_os_updater().update_sources,
-        "prepare": get_os_updater().stage_packages,
-        "prepare_web_portal": get_os_updater().stage_web_portal,
-        "start": get_os_updater().start_os_upgrade,
-        "size": get_os_updater().upgrade_size,
-        "state": get_os_updater().state,
-    }
-
-    while not ws.closed:
-        message = ws.receive()
-        if not message:
-            continue
-
-        if not event_lookup.get(message):
-            logger.warning(
-                f"/os_upgrade - Invalid message from websocket '{message}' - doing nothing"
-            )
-            continue
-        logger.info(f"/os_upgrade - received message: '{message}'")
-
-        t = Thread(
-            target=event_lookup.get(message),
-            args=(ws,),
-            daemon=True,
-        )
-        t.start()
-        thread_arr.append(t)
-
-    # for t in thread_arr:
-    #     if t.is_alive():
-    #         t.join()
+    os_updater = get_os_updater()
+    os_updater.message_handler.register_client(ws)
+    try:
+        while not ws.closed:
+            message = ws.receive()
+            if not message:
+                continue
+
+            os_updater.message_handler.mark_alive(ws)
+            logger.info(f"/os_upgrade - received message: '{message}'")
+            os_updater.commands.submit(ws, message)
+    finally:
+        os_updater.message_handler.unregister_client(ws)
+
+
+# Status events
+@sockets.route("/events")
+def events(ws):
+    # Clients ask for the values they need probed, e.g. '?probe=roverController'
+    status_stream.add_client(ws, probes=request.args.getlist("probe"))
+    try:
+        # Clients don't send messages; receive until the socket is closed
+        while not ws.closed and ws.receive() is not None:
+            pass
+    finally:
+        status_stream.remove_client(ws)
 
 
 # Register
@@ -354,6 +378,21 @@ def get_available_space():
     return abort_on_no_data(available_space())
 
 
+@app.route("/finalise", methods=["POST"])
+def post_finalise():
+    logger.debug("Route '/finalise'")
+    data = request.get_json(silent=True) or {}
+    steps = data.get("steps", DEFAULT_FINALISE_STEPS)
+    if not isinstance(steps, list) or not all(isinstance(s, str) for s in steps):
+        return abort(422)
+
+    if any(step not in FINALISE_STEPS for step in steps):
+        return abort(400)
+
+    job = finalise(steps)
+    return jdumps({"jobId": job.id})
+
+
 @app.route("/configure-landing", methods=["POST"])
 def post_configure_landing():
     logger.debug("Route '/configure-landing'")
@@ -399,7 +438,8 @@ def post_enable_further_link_service():
 @app.route("/reboot", methods=["POST"])
 def post_reboot():
     logger.debug("Route '/reboot'")
-    reboot()
+    # Reboots once the background jobs are done, without blocking the request
+    job_queue.submit("reboot", reboot)
     return "OK"  # no response here is also OK!
 
 
@@ -511,6 +551,18 @@ def get_status():
     return "OK"
 
 
+@app.route("/cache-stats", methods=["GET"])
+def get_cache_stats():
+    logger.debug("Route '/cache-stats'")
+    return jdumps(cache_stats())
+
+
+@app.route("/event-stats", methods=["GET"])
+def get_event_stats():
+    logger.debug("Route '/event-stats'")
+    return jdumps(dispatch_stats())
+
+
 @app.route("/update-eeprom", methods=["POST"])
 def post_update_eeprom():
     logger.debug("Route '/update-eeprom'")
@@ -537,27 +589,7 @@ def post_start_rover_controller_service():
 def get_rover_controller_status():
     logger.debug("Route '/rover-controller-status'")
 
-    status = service_is_active(SystemService.RoverController, timeout=1)
-    if status == "active":
-        try:
-
-            protocol = "https" if request.is_secure else "http"
-            port = 8070 if protocol == "http" else 8071
-            url = f"{protocol}://localhost:{port}"
-            response = requests.get(
-                url,
-                timeout=2,
-                verify=False,  # Skip SSL verification for localhost
-                allow_redirects=False,
-            )
-            if response.status_code != 200:
-                status = "inactive"
-
-        except Exception as e:
-            logger.debug(f"Rover controller check failed: {e}")
-            status = "inactive"
-
-    return jdumps({"status": status})
+    return jdumps({"status": rover_controller_status(secure=request.is_secure)})
 
 
 @app.route("/rover-controller-stop", methods=["POST"])
@@ -0,0 +1,149 @@
+import logging
+from datetime import datetime
+from functools import lru_cache
+from mimetypes import guess_type
+from os import path, stat
+from re import compile
+from typing import List, Optional
+
+from flask import Flask, Response, request, send_from_directory
+from werkzeug.security import safe_join
+
+from .precompress import ENCODING_EXTENSIONS, MIN_SIZE, encoders, is_compressible
+
+logger = logging.getLogger(__name__)
+
+# Assets emitted by 'react-scripts build' carry a content hash in their name,
+# e.g. 'static/js/main.1a2b3c4d.chunk.js' or 'static/media/logo.5d5d9eef.svg'
+FINGERPRINTED_ASSET_REGEX = compile(r"^static/.+\.[0-9a-f]{8,}(\.chunk)?\.\w+(\.map)?$")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Endpoints serving files that can be revalidated by the browser
+REVALIDATE_ENDPOINTS = ("static", "roboto")
+
+# Number of files compressed on the fly kept in memory
+COMPRESSED_CACHE_SIZE = 32
+
+
+def is_fingerprinted_asset(filename: str) -> bool:
+    return FINGERPRINTED_ASSET_REGEX.match(filename) is not None
+
+
+def set_immutable(response):
+    response.headers["Cache-Control"] = (
+        f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    )
+    return response
+
+
+def set_revalidate(response):
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def set_no_store(response):
+    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+    response.headers["Pragma"] = "no-cache"
+    response.headers["Expires"] = "0"
+    response.headers["Last-Modified"] = datetime.now()
+    response.headers.pop("Etag", None)
+    return response
+
+
+def set_cache_headers(response):
+    """Hashed build assets are cached forever, other files are revalidated
+    using their ETag/Last-Modified headers and everything else, including
+    API routes and 'index.html', is never stored."""
+    filename = (request.view_args or {}).get("filename", "")
+
+    # 'index.html' is also served for unknown routes by the 404 handler
+    if request.endpoint not in REVALIDATE_ENDPOINTS or response.mimetype == "text/html":
+        return set_no_store(response)
+
+    if response.status_code not in (200, 304):
+        return set_no_store(response)
+
+    if request.endpoint == "static" and is_fingerprinted_asset(filename):
+        return set_immutable(response)
+
+    return set_revalidate(response)
+
+
+def accepted_encodings() -> List[str]:
+    """Encodings accepted by the client, by preference. Precompressed siblings
+    can be served in any of them, even if the server can't compress files in
+    that encoding itself."""
+    return [
+        encoding
+        for encoding in ENCODING_EXTENSIONS
+        if request.accept_encodings[encoding] > 0
+    ]
+
+
+@lru_cache(maxsize=COMPRESSED_CACHE_SIZE)
+def compress_file(file_path: str, mtime: float, size: int, encoding: str) -> bytes:
+    # 'mtime' and 'size' are part of the cache key, so that changes in the
+    # file are picked up
+    logger.debug(f"Compressing '{file_path}' using '{encoding}'")
+    with open(file_path, "rb") as f:
+        return encoders()[encoding](f.read())
+
+
+def send_precompressed_file(
+    static_folder: str, filename: str, encoding: str
+) -> Optional[Response]:
+    compressed_filename = filename + ENCODING_EXTENSIONS[encoding]
+    compressed_path = safe_join(static_folder, compressed_filename)
+    if compressed_path is None or not path.isfile(compressed_path):
+        return None
+
+    response = send_from_directory(
+        static_folder, compressed_filename, mimetype=guess_type(filename)[0]
+    )
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def send_compressed_file(
+    static_folder: str, filename: str, encoding: str
+) -> Optional[Response]:
+    file_path = safe_join(static_folder, filename)
+    if file_path is None or not path.isfile(file_path):
+        return None
+
+    file_stat = stat(file_path)
+    if file_stat.st_size < MIN_SIZE:
+        return None
+
+    data = compress_file(file_path, file_stat.st_mtime, file_stat.st_size, encoding)
+
+    response = Response(data, mimetype=guess_type(filename)[0])
+    response.headers["Content-Encoding"] = encoding
+    response.last_modified = file_stat.st_mtime
+    response.set_etag(f"{file_stat.st_mtime}-{file_stat.st_size}-{encoding}")
+    return response.make_conditional(request)
+
+
+class StaticFilesFlask(Flask):
+    """Serves the web app build with the best encoding accepted by the
+    client: a precompressed sibling if there is one, or a copy compressed
+    in memory otherwise."""
+
+    def send_static_file(self, filename):
+        if not is_compressible(filename):
+            return super().send_static_file(filename)
+
+        response = None
+        for encoding in accepted_encodings():
+            response = send_precompressed_file(self.static_folder, filename, encoding)
+            if response is None and encoding in encoders():
+                response = send_compressed_file(self.static_folder, filename, encoding)
+            if response is not None:
+                break
+
+        if response is None:
+            response = super().send_static_file(filename)
+
+        response.vary.add("Accept-Encoding")
+        return response
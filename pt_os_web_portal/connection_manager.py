@@ -5,23 +5,29 @@ from time import sleep
 from pitop.common.sys_info import (
     get_address_for_connected_device,
     get_ap_mode_status,
-    is_connected_to_internet,
 )
 
 from .event import AppEvents, post_event
+from .network_monitor import NetworkChangeMonitor
 
 logger = logging.getLogger(__name__)
 
 
 class ConnectionManager:
     SLEEP_TIME = 0.5
+    # When waiting for network changes, check again after this long anyway,
+    # in case a change is missed
+    IDLE_TIMEOUT = 60
 
-    def __init__(self):
+    def __init__(self, wait_for_network_changes: bool = True):
         self.__thread = Thread(target=self._main, args=())
         self._stop = False
         self._emitted_ap_credentials = False
-        self._previous_connection_state = False
         self._previous_connected_device_ip = ""
+        self._network_monitor = (
+            NetworkChangeMonitor() if wait_for_network_changes else None
+        )
+        self.wakeups = 0
 
     def start(self):
         self.__thread = Thread(target=self._main, args=())
@@ -30,29 +36,46 @@ class ConnectionManager:
 
     def stop(self):
         self._stop = True
+        if self._network_monitor:
+            self._network_monitor.wake()
         if self.__thread and self.__thread.is_alive():
             self.__thread.join()
         logger.info("Stopped: Connection manager")
 
+    def _check(self):
+        self.wakeups += 1
+
+        if not self._emitted_ap_credentials:
+            ap_credentials = get_ap_mode_status()
+            ssid = ap_credentials.get("ssid", "")
+            passphrase = ap_credentials.get("passphrase", "")
+            if ssid != "" and passphrase != "":
+                post_event(AppEvents.AP_HAS_SSID, ssid)
+                post_event(AppEvents.AP_HAS_PASSPHRASE, passphrase)
+                self._emitted_ap_credentials = True
+
+        connected_device_ip = get_address_for_connected_device()
+        if connected_device_ip != self._previous_connected_device_ip:
+            post_event(AppEvents.HAS_CONNECTED_DEVICE, connected_device_ip != "")
+            self._previous_connected_device_ip = connected_device_ip
+
     def _main(self):
-        while not self._stop:
-            if not self._emitted_ap_credentials:
-                ap_credentials = get_ap_mode_status()
-                ssid = ap_credentials.get("ssid", "")
-                passphrase = ap_credentials.get("passphrase", "")
-                if ssid != "" and passphrase != "":
-                    post_event(AppEvents.AP_HAS_SSID, ssid)
-                    post_event(AppEvents.AP_HAS_PASSPHRASE, passphrase)
-                    self._emitted_ap_credentials = True
-
-            connected_device_ip = get_address_for_connected_device()
-            if connected_device_ip != self._previous_connected_device_ip:
-                post_event(AppEvents.HAS_CONNECTED_DEVICE, connected_device_ip != "")
-                self._previous_connected_device_ip = connected_device_ip
-
-            is_connected = is_connected_to_internet()
-            if is_connected != self._previous_connection_state:
-                post_event(AppEvents.IS_CONNECTED_TO_INTERNET, is_connected)
-            self._previous_connection_state = is_connected
-
-            sleep(self.SLEEP_TIME)
+        monitor = self._network_monitor
+        if monitor and not monitor.open():
+            logger.warning("Unable to monitor network changes, polling instead")
+            monitor = None
+
+        try:
+            while not self._stop:
+                self._check()
+                if monitor and not self._previous_connected_device_ip:
+                    monitor.wait(self.IDLE_TIMEOUT)
+                elif monitor:
+                    # A device disconnecting doesn't change links, addresses
+                    # or leases straight away, so it's polled for
+                    monitor.wait(self.SLEEP_TIME)
+                else:
+                    sleep(self.SLEEP_TIME)
+        finally:
+            if monitor:
+                monitor.close()
@@ -0,0 +1,123 @@
+import logging
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Optional
+
+from pitop.common.sys_info import is_connected_to_internet
+
+from .event import AppEvents, post_event
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectivityProbe:
+    """Single source of truth for internet connectivity.
+
+    When started, a background thread probes the connection every 'interval'
+    seconds; while the device stays connected, the interval is doubled up to
+    'max_interval', and it's reset when the result changes. While offline,
+    it's doubled only up to 'max_offline_interval', so that connecting is
+    noticed quickly. Callers read the latest result instead of probing on
+    their own, and can ask for a result that's at most 'max_age' seconds old,
+    which probes again if needed. Only one probe runs at a time; concurrent
+    callers share its result.
+
+    An 'IS_CONNECTED_TO_INTERNET' event is posted when the result changes.
+    The device is assumed to be offline before the first probe, so no event
+    is posted if it starts offline."""
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        max_interval: float = 30.0,
+        max_offline_interval: float = 0.5,
+    ) -> None:
+        self.interval = interval
+        self.max_interval = max_interval
+        self.max_offline_interval = max_offline_interval
+        self._probe_lock = Lock()
+        self._is_connected: Optional[bool] = None
+        self._checked_at: Optional[float] = None
+        self._connected = Event()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = Thread(target=self._main, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+        logger.info("Stopped: Connectivity probe")
+
+    @property
+    def checked_at(self) -> Optional[float]:
+        """'monotonic' time of the latest probe"""
+        return self._checked_at
+
+    def is_connected(self, max_age: Optional[float] = None) -> bool:
+        if self._is_fresh(max_age):
+            return bool(self._is_connected)
+
+        with self._probe_lock:
+            # Another caller might have probed while waiting for the lock
+            if not self._is_fresh(max_age):
+                self._probe()
+            return bool(self._is_connected)
+
+    def wait_until_connected(self, timeout: float) -> bool:
+        deadline = monotonic() + timeout
+        while not self.is_connected(max_age=self.interval):
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            self._connected.wait(min(self.interval, remaining))
+        return True
+
+    def _is_fresh(self, max_age: Optional[float]) -> bool:
+        if self._checked_at is None:
+            return False
+        return max_age is None or monotonic() - self._checked_at <= max_age
+
+    def _probe(self) -> bool:
+        try:
+            is_connected = bool(is_connected_to_internet())
+        except Exception as e:
+            logger.warning(f"Unable to check internet connection: {e}")
+            is_connected = False
+
+        changed = is_connected != bool(self._is_connected)
+        self._is_connected = is_connected
+        self._checked_at = monotonic()
+        if is_connected:
+            self._connected.set()
+        else:
+            self._connected.clear()
+
+        if changed:
+            logger.info(f"Internet connection changed: connected={is_connected}")
+            post_event(AppEvents.IS_CONNECTED_TO_INTERNET, is_connected)
+        return changed
+
+    def _main(self) -> None:
+        interval = self.interval
+        while not self._stop.is_set():
+            with self._probe_lock:
+                changed = self._probe()
+
+            if changed:
+                interval = self.interval
+            else:
+                max_interval = (
+                    self.max_interval
+                    if self._is_connected
+                    else self.max_offline_interval
+                )
+                interval = min(interval * 2, max_interval)
+            self._stop.wait(interval)
+
+
+connectivity = ConnectivityProbe()
@@ -0,0 +1,51 @@
+import logging
+from typing import Dict, Optional
+
+from .backend.helpers.cache import cached, stat_key
+
+logger = logging.getLogger(__name__)
+
+DPKG_STATUS_FILE = "/var/lib/dpkg/status"
+
+
+def parse_dpkg_status(content: str) -> Dict[str, str]:
+    """Returns the versions of the installed packages in the contents of a
+    dpkg status file, by package name."""
+    versions: Dict[str, str] = dict()
+    package = version = status = ""
+
+    for line in content.splitlines():
+        if not line:
+            if package and version and status.endswith(" installed"):
+                versions.setdefault(package, version)
+            package = version = status = ""
+        elif line.startswith("Package: "):
+            package = line[9:].strip()
+        elif line.startswith("Status: "):
+            status = line[8:].strip()
+        elif line.startswith("Version: "):
+            version = line[9:].strip()
+
+    if package and version and status.endswith(" installed"):
+        versions.setdefault(package, version)
+
+    return versions
+
+
+@cached(file_key=lambda status_file=DPKG_STATUS_FILE: stat_key(status_file))
+def installed_packages(status_file: str = DPKG_STATUS_FILE) -> Dict[str, str]:
+    """Installed package versions, by package name. The status file is only
+    parsed again when it changes."""
+    logger.debug(f"Parsing dpkg status file '{status_file}'")
+    try:
+        with open(status_file) as f:
+            return parse_dpkg_status(f.read())
+    except OSError as e:
+        logger.warning(f"Unable to read dpkg status file: {e}")
+        return dict()
+
+
+def installed_version(
+    package_name: str, status_file: str = DPKG_STATUS_FILE
+) -> Optional[str]:
+    return installed_packages(status_file).get(package_name)
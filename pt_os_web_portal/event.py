@@ -1,6 +1,9 @@
 import logging
+from collections import deque
 from enum import Enum, auto
-from typing import Callable, Dict, List
+from threading import Condition, Lock, Thread, current_thread
+from time import monotonic
+from typing import Callable, Deque, Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -16,25 +19,235 @@ class AppEvents(Enum):
     IS_CONNECTED_TO_INTERNET = auto()  # bool
     RESTARTING_WEB_PORTAL = auto()  # bool
     USER_SKIPPED_CONNECTION_GUIDE = auto()  # bool
+    BACKGROUND_JOB = auto()  # dict
+    FINALISE_STEP = auto()  # dict
 
 
-subscribers: Dict[AppEvents, List] = dict()
+# Events that carry the current value of some state: when dispatching
+# asynchronously, a value that is still waiting to be delivered is replaced
+# by a newer one, since subscribers only care about the latest value
+STATE_EVENTS = (
+    AppEvents.AP_HAS_SSID,
+    AppEvents.AP_HAS_PASSPHRASE,
+    AppEvents.HAS_CONNECTED_DEVICE,
+    AppEvents.IS_CONNECTED_TO_INTERNET,
+)
 
+# Events that are always delivered synchronously, after the events already
+# queued, since the process might restart or stop right after posting them
+SYNC_EVENTS = (AppEvents.RESTARTING_WEB_PORTAL,)
+# Longest time a synchronous event waits for the queued events
+SYNC_EVENT_TIMEOUT = 5
 
-def subscribe(event_type: AppEvents, fn: Callable):
+
+class Subscription:
+    """A subscriber callback for an event type."""
+
+    def __init__(self, event_type: AppEvents, fn: Callable, subscriber: str) -> None:
+        self.event_type = event_type
+        self.fn = fn
+        self.subscriber = subscriber
+
+    def __repr__(self) -> str:
+        return f"Subscription({self.event_type.name}, {self.fn})"
+
+
+class SubscriberQueue:
+    """The events waiting to be delivered to a subscriber, in the order they
+    were posted, as [subscription, data, time posted]."""
+
+    def __init__(self, subscriber: str) -> None:
+        self.subscriber = subscriber
+        self.events: Deque[List] = deque()
+        # Whether a worker is delivering one of its events
+        self.is_delivering = False
+
+
+# Workers delivering events when dispatching asynchronously. Each subscriber
+# gets its events from one worker at a time, so a slow subscriber only
+# holds up its own events
+DISPATCH_WORKERS = 4
+
+subscribers: Dict[AppEvents, List[Subscription]] = dict()
+
+lock = Lock()
+# Notified when events are queued or delivered
+queue_changed = Condition(lock)
+queues: Dict[str, SubscriberQueue] = dict()
+# Queues with events to deliver that no worker is delivering from
+ready: Deque[SubscriberQueue] = deque()
+# Events queued or being delivered
+undelivered = 0
+workers: List[Thread] = []
+is_dispatching = False
+stats: Dict[AppEvents, Dict] = dict()
+
+
+def subscribe(event_type: AppEvents, fn: Callable, subscriber: Optional[str] = None):
+    """Calls 'fn' with the data of the events of 'event_type'.
+
+    When dispatching asynchronously, each subscriber gets its events in the
+    order they were posted, also across event types. Callbacks with the same
+    'subscriber', by default the module that defines them, are one
+    subscriber: eg: the status stream always gets 'OS_UPDATER_PREPARE'
+    before the 'OS_UPDATER_UPGRADE' posted after it."""
     logger.debug(f"Subscribed to event '{event_type.name}' with {fn}")
     if not callable(fn):
         return
-    if event_type not in subscribers:
-        subscribers[event_type] = []
-    subscribers[event_type].append(fn)
+    if subscriber is None:
+        subscriber = getattr(fn, "__module__", None) or repr(fn)
+    with lock:
+        if event_type not in subscribers:
+            subscribers[event_type] = []
+        subscribers[event_type].append(Subscription(event_type, fn, subscriber))
+
+
+def start_async_dispatch() -> None:
+    """Delivers events from a pool of DISPATCH_WORKERS threads instead of the
+    thread that posts them, so that slow subscribers don't block posters or
+    other subscribers."""
+    global is_dispatching
+    with lock:
+        is_dispatching = True
+        if not workers:
+            logger.info("Dispatching events asynchronously")
+        for i in range(len(workers), DISPATCH_WORKERS):
+            worker = Thread(target=_dispatch, name=f"event-dispatch-{i}", daemon=True)
+            workers.append(worker)
+            worker.start()
+
+
+def stop_async_dispatch(wait: bool = True) -> None:
+    """Goes back to delivering events synchronously, after delivering the
+    events that are already queued if 'wait' is set."""
+    global is_dispatching
+    with lock:
+        is_dispatching = False
+        threads = list(workers)
+        queue_changed.notify_all()
+    if wait:
+        for thread in threads:
+            if thread is not current_thread():
+                thread.join()
 
 
 def post_event(event_type: AppEvents, data=None):
     logger.debug(f"Posting event '{event_type.name}' with data '{data}'")
-    if event_type not in subscribers:
+    with lock:
+        subscriptions = list(subscribers.get(event_type, []))
+        is_async = is_dispatching and event_type not in SYNC_EVENTS
+        is_worker = current_thread() in workers
+    if not subscriptions:
         logger.debug(f"Event {event_type} has no subscribers, exiting...")
         return
-    for fn in subscribers[event_type]:
-        logger.debug(f"Executing callback {fn} for event '{event_type.name}'")
-        fn(data)
+
+    posted_at = monotonic()
+    if is_async:
+        _enqueue(subscriptions, data, posted_at)
+        return
+
+    if event_type in SYNC_EVENTS and not is_worker:
+        _wait_until_delivered(SYNC_EVENT_TIMEOUT)
+    for subscription in subscriptions:
+        _deliver(subscription, data, posted_at)
+
+
+def _enqueue(subscriptions: List[Subscription], data, posted_at: float) -> None:
+    global undelivered
+    with lock:
+        for subscription in subscriptions:
+            queue = queues.get(subscription.subscriber)
+            if queue is None:
+                queue = queues[subscription.subscriber] = SubscriberQueue(
+                    subscription.subscriber
+                )
+
+            if subscription.event_type in STATE_EVENTS:
+                # The newer value replaces the older one where it is in the
+                # queue, so it's still delivered before the events posted
+                # after the older one
+                queued = next((q for q in queue.events if q[0] is subscription), None)
+                if queued is not None:
+                    queued[1:] = [data, posted_at]
+                    _stats(subscription.event_type)["coalesced"] += 1
+                    continue
+
+            queue.events.append([subscription, data, posted_at])
+            undelivered += 1
+            if not queue.is_delivering and queue not in ready:
+                ready.append(queue)
+        queue_changed.notify_all()
+
+
+def _wait_until_delivered(timeout: float) -> bool:
+    with queue_changed:
+        return queue_changed.wait_for(lambda: undelivered == 0, timeout)
+
+
+def _dispatch() -> None:
+    global undelivered
+    while True:
+        with queue_changed:
+            queue_changed.wait_for(lambda: ready or not is_dispatching)
+            if not ready:
+                workers.remove(current_thread())
+                return
+            queue = ready.popleft()
+            subscription, data, posted_at = queue.events.popleft()
+            queue.is_delivering = True
+
+        try:
+            _deliver(subscription, data, posted_at)
+        except Exception as e:
+            logger.error(f"Error executing callback {subscription}: {e}")
+        finally:
+            with queue_changed:
+                queue.is_delivering = False
+                undelivered -= 1
+                if queue.events:
+                    # After the queues that were waiting, so that a busy
+                    # subscriber doesn't keep the workers to itself
+                    ready.append(queue)
+                queue_changed.notify_all()
+
+
+def _deliver(subscription: Subscription, data, posted_at: float) -> None:
+    latency = monotonic() - posted_at
+    with lock:
+        event_stats = _stats(subscription.event_type)
+        event_stats["delivered"] += 1
+        event_stats["total_latency"] += latency
+        event_stats["max_latency"] = max(event_stats["max_latency"], latency)
+
+    logger.debug(
+        f"Executing callback {subscription.fn} for event "
+        f"'{subscription.event_type.name}'"
+    )
+    subscription.fn(data)
+
+
+def _stats(event_type: AppEvents) -> Dict:
+    if event_type not in stats:
+        stats[event_type] = {
+            "delivered": 0,
+            "coalesced": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+        }
+    return stats[event_type]
+
+
+def dispatch_stats() -> Dict:
+    """Number of deliveries, coalesced events and dispatch latency, in
+    seconds, by event name."""
+    with lock:
+        return {
+            event_type.name: {
+                "delivered": event_stats["delivered"],
+                "coalesced": event_stats["coalesced"],
+                "mean_latency": event_stats["total_latency"]
+                / max(1, event_stats["delivered"]),
+                "max_latency": event_stats["max_latency"],
+            }
+            for event_type, event_stats in stats.items()
+        }
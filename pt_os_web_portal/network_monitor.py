@@ -0,0 +1,167 @@
+import ctypes
+import ctypes.util
+import logging
+import socket
+import struct
+from os import O_CLOEXEC, O_NONBLOCK, close, path, pipe, read, write
+from select import select
+from time import monotonic
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# rtnetlink multicast groups, from linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+# inotify flags, from linux/inotify.h
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+INOTIFY_EVENT = struct.Struct("iIII")
+
+LEASE_DIRECTORIES = ("/var/lib/NetworkManager", "/var/lib/dhcp")
+
+
+class NetworkChangeMonitor:
+    """Waits for changes in the network state, without polling.
+
+    Listens to rtnetlink link and address events, and uses inotify to watch
+    for changes in the DHCP lease files of the devices connected to the AP
+    or USB interfaces. 'open' returns False when neither is available, so
+    that callers can fall back to polling."""
+
+    # Changes come in bursts; wait this long for a burst to finish
+    SETTLE_TIME = 0.2
+
+    def __init__(self, lease_directories: Iterable[str] = LEASE_DIRECTORIES) -> None:
+        self._lease_directories = lease_directories
+        self._netlink: Optional[socket.socket] = None
+        self._inotify_fd: Optional[int] = None
+        self._wake_fds: Optional[tuple] = None
+        # Set by 'wake', in case it's called before 'open' or between calls
+        # to 'wait'
+        self._woken = False
+
+    def open(self) -> bool:
+        self._open_netlink()
+        self._open_inotify()
+        if self._netlink is None and self._inotify_fd is None:
+            return False
+        self._wake_fds = pipe()
+        return True
+
+    def close(self) -> None:
+        if self._netlink is not None:
+            self._netlink.close()
+            self._netlink = None
+        for fd in [self._inotify_fd, *(self._wake_fds or ())]:
+            if fd is not None:
+                close(fd)
+        self._inotify_fd = None
+        self._wake_fds = None
+
+    def wake(self) -> None:
+        """Makes a 'wait' call return straight away, or the next one if
+        there's no call waiting."""
+        self._woken = True
+        if self._wake_fds is not None:
+            write(self._wake_fds[1], b"\0")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the network changes, 'timeout' seconds or a call to
+        'wake'. Returns whether the network changed."""
+        if self._woken:
+            self._woken = False
+            return False
+
+        fds = self._fds()
+        deadline = None if timeout is None else monotonic() + timeout
+        changed = False
+        while not changed:
+            remaining = None if deadline is None else max(0, deadline - monotonic())
+            readable, _, _ = select(fds, [], [], remaining)
+            if not readable:
+                return False
+
+            while readable:
+                if self._wake_fds is not None and self._wake_fds[0] in readable:
+                    read(self._wake_fds[0], 64)
+                    self._woken = False
+                    return changed
+                changed = self._drain(readable) or changed
+                readable, _, _ = select(fds, [], [], self.SETTLE_TIME)
+        return changed
+
+    def _fds(self) -> List:
+        fds: List = [fd for fd in (self._netlink, self._inotify_fd) if fd is not None]
+        if self._wake_fds is not None:
+            fds.append(self._wake_fds[0])
+        return fds
+
+    def _drain(self, readable: List) -> bool:
+        changed = False
+        if self._netlink is not None and self._netlink in readable:
+            try:
+                while self._netlink.recv(65536):
+                    changed = True
+            except BlockingIOError:
+                pass
+        if self._inotify_fd is not None and self._inotify_fd in readable:
+            changed = self._read_inotify_events() or changed
+        return changed
+
+    def _open_netlink(self) -> None:
+        try:
+            netlink = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+            )
+            netlink.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            netlink.setblocking(False)
+            self._netlink = netlink
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Unable to listen to rtnetlink events: {e}")
+
+    def _open_inotify(self) -> None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(O_NONBLOCK | O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Unable to watch lease files: {e}")
+            return
+
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        watches = 0
+        for directory in self._lease_directories:
+            if not path.isdir(directory):
+                continue
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                logger.warning(f"Unable to watch lease files in '{directory}'")
+                continue
+            watches += 1
+
+        if watches == 0:
+            close(fd)
+            return
+        self._inotify_fd = fd
+
+    def _read_inotify_events(self) -> bool:
+        changed = False
+        while True:
+            try:
+                data = read(self._inotify_fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, _, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset : offset + name_length].rstrip(b"\0")
+                offset += name_length
+                if name.endswith(b".leases"):
+                    changed = True
@@ -0,0 +1,80 @@
+import logging
+from typing import Callable, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def bytes_to_size_str(size: int) -> str:
+    for unit, factor in (("GB", 1e9), ("MB", 1e6), ("kB", 1e3)):
+        if size >= factor:
+            return f"{round(size / factor, 1)} {unit}"
+    return f"{size} B"
+
+
+class UnknownPackages(Exception):
+    """Raised when staged packages aren't in apt's package lists."""
+
+
+def run_in_native_thread(fn: Callable):
+    """Returns 'fn()', run in gevent's pool of native threads when gevent has
+    patched threading: python-apt's calls don't release the GIL for long
+    enough to let other greenlets run, so they would block the whole hub."""
+    try:
+        from gevent import get_hub
+        from gevent.monkey import is_module_patched
+    except ImportError:
+        return fn()
+
+    if is_module_patched("threading") is not True:
+        return fn()
+    return get_hub().threadpool.apply(fn)
+
+
+class AptCache:
+    """Works out what an upgrade involves using python-apt in the current
+    process, instead of running apt-get and parsing its output.
+
+    The cache is read from disk in a native thread for each estimate and
+    released afterwards, since it takes tens of MB."""
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            import apt  # noqa: F401
+        except ModuleNotFoundError:
+            return False
+        return True
+
+    def upgrade_size(self, packages: Iterable[str] = ()) -> Tuple[int, int, int]:
+        """Returns the download size and required disk space, in bytes, and
+        the number of packages to install or upgrade when installing
+        'packages', or doing a 'dist-upgrade' if there are none.
+
+        Raises UnknownPackages if any of 'packages' isn't known to apt."""
+        return run_in_native_thread(lambda: self._upgrade_size(list(packages)))
+
+    def _upgrade_size(self, packages: List[str]) -> Tuple[int, int, int]:
+        import apt
+
+        logger.debug("AptCache: opening cache")
+        cache = apt.Cache()
+        try:
+            unknown = [name for name in packages if name not in cache]
+            if unknown:
+                raise UnknownPackages(f"Unknown packages: {', '.join(unknown)}")
+
+            with cache.actiongroup():
+                if packages:
+                    for name in packages:
+                        cache[name].mark_install()
+                else:
+                    cache.upgrade(dist_upgrade=True)
+
+            # Space freed by the upgrade is reported as 0
+            return (
+                cache.required_download,
+                max(0, cache.required_space),
+                cache.install_count,
+            )
+        finally:
+            cache.close()
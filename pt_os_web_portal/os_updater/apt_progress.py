@@ -0,0 +1,88 @@
+import logging
+from time import monotonic
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_status_line(line: str) -> Optional[Tuple[str, float, str]]:
+    """Parses a line written by apt to its 'APT::Status-Fd', such as
+    'pmstatus:python3:42.8571:Installing python3 (amd64)'.
+
+    Returns the kind of status ('dlstatus' or 'pmstatus'), the percentage and
+    the description, or None for other lines."""
+    try:
+        kind, _, percent, description = line.strip().split(":", 3)
+    except ValueError:
+        return None
+    if kind not in ("dlstatus", "pmstatus"):
+        return None
+    try:
+        return kind, float(percent), description
+    except ValueError:
+        return None
+
+
+class ProgressThrottle:
+    """Forwards progress updates at most once every 'interval' seconds. The
+    latest update is kept, to be forwarded later or by 'flush'."""
+
+    def __init__(self, callback: Callable[[float, str], None], interval: float):
+        self._callback = callback
+        self._interval = interval
+        self._last_sent_at: Optional[float] = None
+        self._pending: Optional[Tuple[float, str]] = None
+
+    def __call__(self, percent: float, message: str) -> None:
+        now = monotonic()
+        if (
+            self._last_sent_at is None
+            or now - self._last_sent_at >= self._interval
+            or percent >= 100.0
+        ):
+            self._pending = None
+            self._last_sent_at = now
+            self._callback(percent, message)
+        else:
+            self._pending = (percent, message)
+
+    def flush(self) -> None:
+        if self._pending is not None:
+            percent, message = self._pending
+            self._pending = None
+            self._last_sent_at = monotonic()
+            self._callback(percent, message)
+
+
+class AptProgress:
+    """Turns apt status lines into the overall progress of a command.
+
+    Downloading goes from 0% to 'download_weight' percent of the total,
+    installing takes the rest. Progress never goes backwards."""
+
+    def __init__(
+        self, callback: Callable[[float, str], None], download_weight: float = 0.5
+    ) -> None:
+        self._callback = callback
+        self._download_weight = download_weight
+        self.percent = 0.0
+
+    def parse_line(self, line: str) -> None:
+        status = parse_status_line(line)
+        if status is None:
+            logger.debug(f"AptProgress: ignoring '{line.strip()}'")
+            return
+
+        kind, percent, description = status
+        percent = min(max(percent, 0.0), 100.0)
+        if kind == "dlstatus":
+            overall = percent * self._download_weight
+        else:
+            overall = 100.0 * self._download_weight + percent * (
+                1 - self._download_weight
+            )
+
+        if overall < self.percent:
+            return
+        self.percent = round(overall, 1)
+        self._callback(self.percent, description)
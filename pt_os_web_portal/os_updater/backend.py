@@ -1,7 +1,16 @@
 import logging
-from os import environ
+from collections import deque
+from contextlib import contextmanager
+from os import close, environ, pipe, read
+from select import select
 from subprocess import PIPE, CalledProcessError, Popen
-from typing import Callable, List
+from threading import Condition, Thread
+from typing import Callable, Deque, List, Optional
+
+from .apt_cache import AptCache, UnknownPackages, bytes_to_size_str
+from .apt_progress import AptProgress
+from .log_sink import UpdaterLogSink, updater_log
+from .types import BackendOperation
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +52,25 @@ class AptCommands:
             "--yes",
         ]
 
+    @classmethod
+    def download_only(cls, cmd):
+        # Downloads into apt's archive, one connection per host in parallel;
+        # partial downloads are kept and resumed on the next run
+        return [
+            cmd[0],
+            "-o",
+            "Acquire::Queue-Mode=host",
+            "-o",
+            "Acquire::Retries=3",
+            *cmd[1:],
+            "--download-only",
+        ]
+
+    @classmethod
+    def no_download(cls, cmd):
+        # Installs from the packages already in apt's archive
+        return [*cmd, "--no-download"]
+
     @classmethod
     def update_size(cls):
         return ["apt-get", "dist-upgrade", "--assume-no"]
@@ -68,30 +96,146 @@ class AptCommands:
         return ["apt-get", "install", "--assume-no", *packages]
 
 
-def run_command(cmd: List, callback: Callable, check: bool = True):
-    logger.info(f"run_command: executing '{cmd}'")
+def with_status_fd(cmd: List, fd: int) -> List:
+    # Progress is written to 'fd' in a machine readable format
+    return [
+        cmd[0],
+        "-o",
+        f"APT::Status-Fd={fd}",
+        "-o",
+        "Dpkg::Progress-Fancy=0",
+        *cmd[1:],
+    ]
+
+
+def read_status_fd(fd: int, status_callback: Callable) -> None:
+    # Waits with select before reading, so that gevent's monkey patched
+    # select lets other greenlets run instead of blocking the hub
+    buffer = b""
+    try:
+        while True:
+            select([fd], [], [])
+            data = read(fd, 4096)
+            if not data:
+                break
+            *lines, buffer = (buffer + data).split(b"\n")
+            for line in lines:
+                _call_status_callback(status_callback, line)
+        if buffer:
+            _call_status_callback(status_callback, buffer)
+    finally:
+        close(fd)
+
+
+def _call_status_callback(status_callback: Callable, line: bytes) -> None:
+    try:
+        status_callback(line.decode(errors="replace"))
+    except Exception as e:
+        logger.error(f"read_status_fd: {e}")
+
+
+def run_command(
+    cmd: List,
+    callback: Callable,
+    check: bool = True,
+    status_callback: Optional[Callable] = None,
+    process_callback: Optional[Callable] = None,
+    log: Optional[UpdaterLogSink] = None,
+):
+    """Runs an apt command, calling 'callback' with each line of its output.
+    The output is written to 'log', the updater log file by default.
+
+    If 'status_callback' is provided, it's called from another thread with
+    each line that apt writes to its status file descriptor, a pipe read
+    separately from the output. 'process_callback' is called with the
+    Popen object once the command has started."""
     env = environ.copy()
     env["DEBIAN_FRONTEND"] = "noninteractive"
-    with Popen(cmd, stdout=PIPE, bufsize=1, universal_newlines=True, env=env) as p:
-        for line in p.stdout:
-            line = line.strip()
-            if callable(callback):
-                callback(line)
-            logger.info(f"run_command: {line}")
-        p.wait()
+    popen_kwargs = dict()
+    status_read_fd = status_write_fd = None
+    if callable(status_callback):
+        status_read_fd, status_write_fd = pipe()
+        cmd = with_status_fd(cmd, status_write_fd)
+        popen_kwargs["pass_fds"] = (status_write_fd,)
+
+    logger.info(f"run_command: executing '{cmd}'")
+    status_reader = None
+    try:
+        with Popen(
+            cmd,
+            stdout=PIPE,
+            bufsize=1,
+            universal_newlines=True,
+            env=env,
+            **popen_kwargs,
+        ) as p:
+            if callable(process_callback):
+                process_callback(p)
+            if status_read_fd is not None:
+                # Only the child writes to the pipe, so that reading it ends
+                # when the child exits
+                close(status_write_fd)
+                status_write_fd = None
+                status_reader = Thread(
+                    target=read_status_fd,
+                    args=(status_read_fd, status_callback),
+                    daemon=True,
+                )
+                status_reader.start()
+                status_read_fd = None
+
+            command_log = (log or updater_log).command(cmd)
+            try:
+                for line in p.stdout:
+                    line = line.strip()
+                    if callable(callback):
+                        callback(line)
+                    command_log.write(line)
+            finally:
+                command_log.close()
+            p.wait()
+    finally:
+        for fd in (status_read_fd, status_write_fd):
+            if fd is not None:
+                close(fd)
+
+    if status_reader is not None:
+        status_reader.join()
     if check and p.returncode != 0:
         raise CalledProcessError(p.returncode, p.args)
 
 
+class OsUpdaterBackendBusy(Exception):
+    pass
+
+
+class OperationCancelled(Exception):
+    pass
+
+
 class OsUpdaterBackend:
+    # Operations waiting for the running one to finish; more are rejected
+    MAX_QUEUED_OPERATIONS = 4
+
     def __init__(self) -> None:
-        self.lock = False
+        # Guards the running operation, the queue of operations waiting to
+        # run and the apt command being run
+        self._condition = Condition()
+        self._operation: Optional[BackendOperation] = None
+        self._queue: Deque[object] = deque()
+        self._process: Optional[Popen] = None
+        self._is_cancelled = False
         self._download_size = 0
         self.download_size_str = ""
         self._required_space = 0
         self.required_space_str = ""
         self._install_count = 0
         self.packages = []
+        # Whether the staged packages are in apt's archive, so that upgrading
+        # doesn't need the network
+        self.downloaded = False
+        # Estimates upgrade sizes with python-apt, when it's installed
+        self.apt_cache = AptCache() if AptCache.is_available() else None
 
     def download_size(self):
         return self._download_size
@@ -102,59 +246,229 @@ class OsUpdaterBackend:
     def install_count(self):
         return self._install_count
 
-    def update(self, callback) -> None:
-        logger.info("OsUpdaterBackend: Updating APT sources")
-        if self.lock:
-            raise Exception("OsUpdaterBackend is locked")
-        self.lock = True
-
+    @property
+    def lock(self) -> bool:
+        """Whether an operation is running."""
+        return self._operation is not None
+
+    @property
+    def operation(self) -> Optional[BackendOperation]:
+        return self._operation
+
+    @property
+    def queued_operations(self) -> int:
+        return len(self._queue)
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Waits until no operation is running or queued. Returns False if
+        'timeout' seconds passed first."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._operation is None and not self._queue, timeout
+            )
+
+    def cancel(self) -> bool:
+        """Stops the running operation, terminating its apt command. Commands
+        that install packages are left to finish, so that packages aren't
+        left half-configured, and the operation stops after them.
+
+        Returns whether there was an operation to cancel."""
+        with self._condition:
+            if self._operation is None:
+                return False
+            logger.info(f"OsUpdaterBackend: cancelling {self._operation.name}")
+            self._is_cancelled = True
+            process = self._process
+        if process is not None:
+            process.terminate()
+        return True
+
+    @contextmanager
+    def _exclusive(self, operation: BackendOperation, timeout: Optional[float]):
+        """Runs 'operation' once no other one is running, waiting for up to
+        'timeout' seconds, or forever if it's None. Operations that are
+        waiting run in the order they arrived."""
+        with self._condition:
+            self._acquire(operation, timeout)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._operation = None
+                self._process = None
+                self._is_cancelled = False
+                self._condition.notify_all()
+
+    def _acquire(self, operation: BackendOperation, timeout: Optional[float]) -> None:
+        if self._operation is None and not self._queue:
+            self._operation = operation
+            return
+        if timeout is not None and timeout <= 0:
+            raise OsUpdaterBackendBusy("OsUpdaterBackend is locked")
+        if len(self._queue) >= self.MAX_QUEUED_OPERATIONS:
+            raise OsUpdaterBackendBusy(
+                "OsUpdaterBackend has too many queued operations"
+            )
+
+        ticket = object()
+        self._queue.append(ticket)
         try:
-            self._do_update(callback)
+            is_next = self._condition.wait_for(
+                lambda: self._operation is None and self._queue[0] is ticket, timeout
+            )
         finally:
-            self.lock = False
+            self._queue.remove(ticket)
+            self._condition.notify_all()
+        if not is_next:
+            raise OsUpdaterBackendBusy("Timed out waiting for OsUpdaterBackend")
+        self._operation = operation
+
+    def _run_command(
+        self, cmd, callback, check=True, status_callback=None, cancellable=True
+    ):
+        def on_process(process):
+            with self._condition:
+                if not cancellable:
+                    return
+                self._process = process
+                is_cancelled = self._is_cancelled
+            if is_cancelled:
+                process.terminate()
+
+        with self._condition:
+            if self._is_cancelled:
+                raise OperationCancelled("OsUpdaterBackend operation cancelled")
+        try:
+            run_command(
+                cmd,
+                callback,
+                check=check,
+                status_callback=status_callback,
+                process_callback=on_process,
+            )
+        except CalledProcessError:
+            if not (cancellable and self._is_cancelled):
+                raise
+        finally:
+            with self._condition:
+                self._process = None
+        if cancellable and self._is_cancelled:
+            raise OperationCancelled("OsUpdaterBackend operation cancelled")
 
-    def stage_upgrade(self, packages=[]) -> None:
-        logger.info("OsUpdaterBackend: Staging packages for upgrade")
-        if self.lock:
-            raise Exception("OsUpdaterBackend is locked")
-        self.lock = True
+    def update(self, callback, progress_callback=None, timeout=0.0) -> None:
+        logger.info("OsUpdaterBackend: Updating APT sources")
+        with self._exclusive(BackendOperation.UPDATE, timeout):
+            self._do_update(callback, progress_callback)
 
-        try:
+    def stage_upgrade(self, packages=[], timeout=0.0) -> None:
+        logger.info("OsUpdaterBackend: Staging packages for upgrade")
+        with self._exclusive(BackendOperation.STAGE, timeout):
             self._do_stage_upgrade(packages)
-        finally:
-            self.lock = False
 
-    def upgrade(self, callback):
+    def download(self, callback, progress_callback=None, timeout=0.0) -> None:
+        logger.info("OsUpdaterBackend: Downloading staged packages")
+        with self._exclusive(BackendOperation.DOWNLOAD, timeout):
+            self._do_download(callback, progress_callback)
+
+    def upgrade(self, callback, progress_callback=None, timeout=0.0):
         logger.info("OsUpdaterBackend: starting upgrade")
-        if self.lock:
-            raise Exception("OsUpdaterBackend is locked")
-        self.lock = True
+        with self._exclusive(BackendOperation.UPGRADE, timeout):
+            install_progress_callback = progress_callback
+            if not self.downloaded:
+                # Download everything before installing, so that a network
+                # error can't leave packages half-installed
+                self._do_download(callback, self._scaled(progress_callback, 0.0, 50.0))
+                install_progress_callback = self._scaled(progress_callback, 50.0, 100.0)
 
-        try:
             if len(self.packages) > 0:
-                self._do_install(callback)
+                self._do_install(callback, install_progress_callback)
             else:
-                self._do_upgrade(callback)
-        finally:
-            self.lock = False
+                self._do_upgrade(callback, install_progress_callback)
+            self.downloaded = False
 
         logger.info("OsUpdaterBackend: finished upgrade")
 
-    def _do_update(self, callback):
-        run_command(AptCommands.update(), callback)
+    @staticmethod
+    def _status_callback(progress_callback, download_weight):
+        if not callable(progress_callback):
+            return None
+        return AptProgress(progress_callback, download_weight).parse_line
+
+    @staticmethod
+    def _scaled(progress_callback, start, end):
+        if not callable(progress_callback):
+            return None
+
+        def scaled_progress_callback(percent, message):
+            progress_callback(
+                round(start + percent * (end - start) / 100.0, 1), message
+            )
+
+        return scaled_progress_callback
+
+    def _do_update(self, callback, progress_callback=None):
+        # 'apt-get update' only downloads
+        self.downloaded = False
+        self._run_command(
+            AptCommands.update(),
+            callback,
+            status_callback=self._status_callback(progress_callback, 1.0),
+        )
 
-    def _do_install(self, callback):
-        run_command(AptCommands.install_packages(self.packages), callback)
+    def _upgrade_command(self):
+        if len(self.packages) > 0:
+            return AptCommands.install_packages(self.packages)
+        return AptCommands.dist_upgrade()
+
+    def _do_download(self, callback, progress_callback=None):
+        self._run_command(
+            AptCommands.download_only(self._upgrade_command()),
+            callback,
+            status_callback=self._status_callback(progress_callback, 1.0),
+        )
+        self.downloaded = True
+
+    def _do_install(self, callback, progress_callback=None):
+        self._run_command(
+            AptCommands.no_download(AptCommands.install_packages(self.packages)),
+            callback,
+            status_callback=self._status_callback(progress_callback, 0.0),
+            cancellable=False,
+        )
 
-    def _do_upgrade(self, callback):
-        run_command(AptCommands.dist_upgrade(), callback)
+    def _do_upgrade(self, callback, progress_callback=None):
+        self._run_command(
+            AptCommands.no_download(AptCommands.dist_upgrade()),
+            callback,
+            status_callback=self._status_callback(progress_callback, 0.0),
+            cancellable=False,
+        )
 
     def _do_get_install_size(self):
+        if self.apt_cache is not None:
+            try:
+                (
+                    self._download_size,
+                    self._required_space,
+                    self._install_count,
+                ) = self.apt_cache.upgrade_size(self.packages)
+                self.download_size_str = bytes_to_size_str(self._download_size)
+                self.required_space_str = bytes_to_size_str(self._required_space)
+                return
+            except UnknownPackages:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"OsUpdaterBackend: unable to use apt cache, running apt-get: {e}"
+                )
+        self._do_get_install_size_with_apt_get()
+
+    def _do_get_install_size_with_apt_get(self):
         if len(self.packages) > 0:
             cmd = AptCommands.install_size(self.packages)
         else:
             cmd = AptCommands.update_size()
-        run_command(cmd, self._parse_install_size_and_packages, check=False)
+        self._run_command(cmd, self._parse_install_size_and_packages, check=False)
 
     def _parse_install_size_and_packages(self, line):
         # parse lines from 'apt' command.
@@ -194,6 +508,7 @@ class OsUpdaterBackend:
         self.required_space_str = ""
         self._install_count = 0
         self.packages = packages
+        self.downloaded = False
 
         self._do_get_install_size()
 
@@ -0,0 +1,179 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from json import loads as jloads
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .types import EventNames
+
+logger = logging.getLogger(__name__)
+
+# Commands that report their progress to every client; while one is running,
+# clients that send it again get its result instead of starting another one
+SHARED_COMMANDS = (
+    "update_sources",
+    "prepare",
+    "prepare_web_portal",
+    "download",
+    "start",
+    "size",
+)
+
+
+class CommandStatus:
+    QUEUED = "QUEUED"
+    SUBSCRIBED = "SUBSCRIBED"
+    REJECTED = "REJECTED"
+    DONE = "DONE"
+    ERROR = "ERROR"
+
+
+def parse_command(message: str) -> Tuple[str, Optional[str]]:
+    """Returns the command and request id of a message from an /os-upgrade
+    client: either a command name, or a JSON object such as
+    '{"command": "start", "id": "1"}'. The request id is None for plain
+    command names."""
+    message = message.strip()
+    if not message.startswith("{"):
+        return message, None
+
+    try:
+        data = jloads(message)
+        command = data["command"]
+        request_id = data.get("id")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError(f"Invalid command message '{message}'")
+    if not isinstance(command, str):
+        raise ValueError(f"Invalid command '{command}'")
+    return command, None if request_id is None else str(request_id)
+
+
+class UpdaterCommandExecutor:
+    """Runs the commands sent by /os-upgrade clients in a fixed pool of
+    threads.
+
+    Commands sent as JSON with an 'id' get 'COMMAND' responses with that id:
+    one when the command is queued, subscribed to or rejected, and one when
+    it's done or failed."""
+
+    MAX_WORKERS = 4
+    # Commands waiting for a worker; more are rejected
+    MAX_PENDING_COMMANDS = 16
+
+    def __init__(self, os_updater, max_workers: int = MAX_WORKERS) -> None:
+        self.os_updater = os_updater
+        self.commands: Dict[str, Callable] = {
+            "update_sources": os_updater.update_sources,
+            "prepare": os_updater.stage_packages,
+            "prepare_web_portal": os_updater.stage_web_portal,
+            "download": os_updater.download_packages,
+            "start": os_updater.start_os_upgrade,
+            "cancel": os_updater.cancel,
+            "size": os_updater.upgrade_size,
+            "state": os_updater.state,
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="os-updater"
+        )
+        self._lock = Lock()
+        self._pending = 0
+        # Futures of the shared commands that are running, by command name
+        self._in_flight: Dict[str, Future] = dict()
+
+    def submit(self, ws, message: str) -> Optional[Future]:
+        try:
+            command, request_id = parse_command(message)
+        except ValueError as e:
+            logger.warning(f"UpdaterCommandExecutor: {e} - doing nothing")
+            return None
+
+        fn = self.commands.get(command)
+        if fn is None:
+            logger.warning(
+                f"UpdaterCommandExecutor: invalid command '{command}' - doing nothing"
+            )
+            self._respond(
+                ws, request_id, command, CommandStatus.REJECTED, "Unknown command"
+            )
+            return None
+
+        with self._lock:
+            future = self._in_flight.get(command)
+            if future is not None:
+                status = CommandStatus.SUBSCRIBED
+            elif self._pending >= self.MAX_PENDING_COMMANDS:
+                status = CommandStatus.REJECTED
+            else:
+                status = CommandStatus.QUEUED
+                self._pending += 1
+                try:
+                    future = self._executor.submit(self._run, fn, ws)
+                except RuntimeError:
+                    # Shut down
+                    self._pending -= 1
+                    status = CommandStatus.REJECTED
+                else:
+                    if command in SHARED_COMMANDS:
+                        self._in_flight[command] = future
+
+        logger.info(f"UpdaterCommandExecutor: '{command}' {status.lower()}")
+        if status == CommandStatus.REJECTED:
+            self._respond(ws, request_id, command, status, "Too many pending commands")
+            return None
+
+        if status == CommandStatus.SUBSCRIBED:
+            # Progress messages are sent to every client
+            self.os_updater.message_handler.register_client(ws)
+        elif command in SHARED_COMMANDS:
+            # Done callbacks of finished futures run straight away, so this
+            # can't be done while holding the lock
+            future.add_done_callback(lambda f: self._remove_in_flight(command, f))
+        self._respond(ws, request_id, command, status)
+        future.add_done_callback(
+            lambda f: self._respond_done(ws, request_id, command, f)
+        )
+        return future
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def in_flight(self) -> List[str]:
+        with self._lock:
+            return list(self._in_flight)
+
+    def _run(self, fn: Callable, ws) -> None:
+        with self._lock:
+            self._pending -= 1
+        fn(ws)
+
+    def _remove_in_flight(self, command: str, future: Future) -> None:
+        with self._lock:
+            if self._in_flight.get(command) is future:
+                self._in_flight.pop(command)
+
+    def _respond_done(self, ws, request_id, command: str, future: Future) -> None:
+        error = future.exception()
+        if error is not None:
+            logger.error(f"UpdaterCommandExecutor: '{command}' failed: {error}")
+            self._respond(ws, request_id, command, CommandStatus.ERROR, f"{error}")
+        else:
+            self._respond(ws, request_id, command, CommandStatus.DONE)
+
+    def _respond(
+        self, ws, request_id: Optional[str], command: str, status: str, message=""
+    ) -> None:
+        # Clients that send plain command names don't expect responses
+        if request_id is None:
+            return
+        self.os_updater.message_handler.send_to(
+            ws,
+            {
+                "type": EventNames.COMMAND.name,
+                "payload": {
+                    "id": request_id,
+                    "command": command,
+                    "status": status,
+                    "message": message,
+                },
+            },
+        )
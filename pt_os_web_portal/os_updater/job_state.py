@@ -0,0 +1,244 @@
+import json
+import logging
+from collections import deque
+from os import getpid, kill, listdir, makedirs, path, replace
+from threading import Lock
+from time import monotonic, time
+from typing import Deque, Dict, List, Optional
+
+from ..dpkg_status import installed_version
+from ..state import STATE_FILE_DIR
+from .types import EventNames, MessageType
+
+logger = logging.getLogger(__name__)
+
+JOB_STATE_FILE = f"{STATE_FILE_DIR}/pt-os-web-portal/os-updater-job.json"
+# dpkg keeps its journal here while it runs; leftovers mean it was interrupted
+DPKG_UPDATES_DIR = "/var/lib/dpkg/updates"
+# Changes on every boot, so that pids of a previous boot aren't mistaken for
+# running processes
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+
+class JobStatus:
+    RUNNING = "RUNNING"
+    FINISHED = "FINISHED"
+    FAILED = "FAILED"
+
+
+def process_is_running(pid: int) -> bool:
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def current_boot_id() -> Optional[str]:
+    try:
+        with open(BOOT_ID_FILE) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def dpkg_was_interrupted(updates_dir: str = DPKG_UPDATES_DIR) -> bool:
+    try:
+        return len(listdir(updates_dir)) > 0
+    except OSError:
+        return False
+
+
+class UpdaterJobState:
+    """The phase, packages, sizes, log tail and result of the last OS updater
+    job, saved to disk so that they are known after the web portal restarts.
+
+    A job that was running when the process that ran it stopped is marked
+    as finished if it upgraded its packages, and as failed otherwise. The
+    boot id is saved with the pid, since after a reboot the pid can belong to
+    another process."""
+
+    LOG_TAIL_LINES = 50
+    # Minimum time between saves while a job reports progress
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, file_path: str = JOB_STATE_FILE) -> None:
+        self.file_path = file_path
+        self.lock = Lock()
+        self.phase: Optional[str] = None
+        self.status: Optional[str] = None
+        self.percent = 0.0
+        self.packages: List[str] = []
+        # Installed versions of 'packages' when the job started
+        self.versions: Dict[str, Optional[str]] = dict()
+        self.download_size = 0
+        self.required_space = 0
+        self.log: Deque[str] = deque(maxlen=self.LOG_TAIL_LINES)
+        self.result = ""
+        self.pid: Optional[int] = None
+        self.boot_id: Optional[str] = None
+        self.updated_at: Optional[float] = None
+        # Set when a job interrupted by a restart hasn't been reported yet
+        self.recovered = False
+        self._saved_at = 0.0
+
+        self.load()
+
+    def to_dict(self) -> Dict:
+        return {
+            "phase": self.phase,
+            "status": self.status,
+            "percent": self.percent,
+            "packages": self.packages,
+            "versions": self.versions,
+            "downloadSize": self.download_size,
+            "requiredSpace": self.required_space,
+            "log": list(self.log),
+            "result": self.result,
+            "pid": self.pid,
+            "bootId": self.boot_id,
+            "updatedAt": self.updated_at,
+        }
+
+    def load(self) -> None:
+        try:
+            with open(self.file_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"UpdaterJobState: unable to read {self.file_path}: {e}")
+            return
+
+        with self.lock:
+            self.phase = data.get("phase")
+            self.status = data.get("status")
+            self.percent = data.get("percent", 0.0)
+            self.packages = data.get("packages", [])
+            self.versions = data.get("versions", {})
+            self.download_size = data.get("downloadSize", 0)
+            self.required_space = data.get("requiredSpace", 0)
+            self.log.extend(data.get("log", []))
+            self.result = data.get("result", "")
+            self.pid = data.get("pid")
+            self.boot_id = data.get("bootId")
+            self.updated_at = data.get("updatedAt")
+
+            if self.status == JobStatus.RUNNING and not self._is_running():
+                self._recover()
+                self._save()
+
+    def _is_running(self) -> bool:
+        boot_id = current_boot_id()
+        if self.boot_id and boot_id and self.boot_id != boot_id:
+            return False
+        return self.pid == getpid() or bool(self.pid and process_is_running(self.pid))
+
+    def _recover(self) -> None:
+        upgraded = (
+            self.phase == EventNames.OS_UPGRADE.name
+            and any(
+                installed_version(package) != self.versions.get(package)
+                for package in self.packages
+            )
+            and not dpkg_was_interrupted()
+        )
+        if upgraded:
+            self.status = JobStatus.FINISHED
+            self.percent = 100.0
+            self.result = "Finished upgrade"
+        else:
+            self.status = JobStatus.FAILED
+            self.result = "Interrupted by a restart of the web portal"
+        self.recovered = True
+        logger.info(f"UpdaterJobState: recovered {self.phase} job: {self.result}")
+
+    def record(
+        self,
+        phase: EventNames,
+        message_type: MessageType,
+        status_message: str,
+        percent: float,
+        packages: Optional[List[str]] = None,
+    ) -> None:
+        with self.lock:
+            if message_type == MessageType.START:
+                self.phase = phase.name
+                self.status = JobStatus.RUNNING
+                self.packages = list(packages or [])
+                self.versions = {
+                    package: installed_version(package) for package in self.packages
+                }
+                self.log.clear()
+                self.result = ""
+                self.pid = getpid()
+                self.boot_id = current_boot_id()
+                self.recovered = False
+            elif message_type == MessageType.FINISH:
+                self.status = JobStatus.FINISHED
+                self.result = status_message
+            elif message_type == MessageType.ERROR:
+                self.status = JobStatus.FAILED
+                self.result = status_message
+            elif status_message:
+                self.log.extend(status_message.splitlines())
+            self.percent = percent
+
+            if (
+                message_type != MessageType.STATUS
+                or monotonic() - self._saved_at >= self.SAVE_INTERVAL
+            ):
+                self._save()
+
+    def set_sizes(self, download_size: int, required_space: int) -> None:
+        with self.lock:
+            self.download_size = download_size
+            self.required_space = required_space
+            self._save()
+
+    def replay_messages(self) -> List[Dict]:
+        """Messages that bring a client up to date with a running job, or
+        with one that was interrupted by a restart."""
+        with self.lock:
+            if self.phase is None or not (
+                self.status == JobStatus.RUNNING or self.recovered
+            ):
+                return []
+            self.recovered = False
+
+            def message(status: MessageType, percent: float, text: str) -> Dict:
+                return {
+                    "type": self.phase,
+                    "payload": {
+                        "status": status.name,
+                        "percent": percent,
+                        "message": text,
+                    },
+                }
+
+            messages = [message(MessageType.START, 0.0, "")]
+            if self.log:
+                messages.append(
+                    message(MessageType.STATUS, self.percent, "\n".join(self.log))
+                )
+            if self.status == JobStatus.FINISHED:
+                messages.append(message(MessageType.FINISH, 100.0, self.result))
+            elif self.status == JobStatus.FAILED:
+                messages.append(message(MessageType.ERROR, 0.0, self.result))
+            return messages
+
+    def _save(self) -> None:
+        self.updated_at = time()
+        self._saved_at = monotonic()
+        try:
+            makedirs(path.dirname(self.file_path), exist_ok=True)
+            # Replace the file in a single step, so that a restart can't
+            # leave it half written
+            tmp_file_path = f"{self.file_path}.tmp"
+            with open(tmp_file_path, "w") as f:
+                json.dump(self.to_dict(), f)
+            replace(tmp_file_path, self.file_path)
+        except OSError as e:
+            logger.warning(f"UpdaterJobState: unable to save {self.file_path}: {e}")
@@ -0,0 +1,184 @@
+import json
+import logging
+from os import environ, makedirs, path, remove, rename
+from threading import Lock
+from time import monotonic, time
+from typing import IO, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def updater_log_file() -> str:
+    # Read when the log file is opened, since test mode is set after this
+    # module is imported
+    log_file_dir = "/var/log" if environ.get("TESTING", "") != "1" else "/tmp"
+    return f"{log_file_dir}/pt-os-web-portal/os-updater.log"
+
+
+class LogFormat:
+    TEXT = "text"
+    # One JSON object per line, with the time and the command of each line
+    NDJSON = "ndjson"
+
+
+class JournalSampling:
+    """Picks the lines of a command's output that are also logged to the
+    journal: the first 'head' lines, one in every 'every' lines after that,
+    and the lines that report errors or warnings."""
+
+    ALWAYS_LOGGED = ("E:", "W:", "Err:", "dpkg: error", "dpkg: warning")
+
+    def __init__(self, head: int = 10, every: int = 100) -> None:
+        self.head = head
+        self.every = every
+
+    def should_log(self, line_number: int, line: str) -> bool:
+        return (
+            line_number <= self.head
+            or (self.every > 0 and line_number % self.every == 0)
+            or line.startswith(self.ALWAYS_LOGGED)
+        )
+
+
+class CommandLog:
+    """The output of a command, written to an UpdaterLogSink."""
+
+    def __init__(self, sink: "UpdaterLogSink", cmd: List) -> None:
+        self.sink = sink
+        self.command = " ".join(str(arg) for arg in cmd)
+        self.lines = 0
+        self.logged = 0
+        sink.write(self.command, f"$ {self.command}")
+
+    def write(self, line: str) -> None:
+        self.lines += 1
+        self.sink.write(self.command, line)
+        if self.sink.sampling.should_log(self.lines, line):
+            self.logged += 1
+            logger.info(f"run_command: {line}")
+
+    def close(self) -> None:
+        self.sink.flush()
+        if self.lines > self.logged:
+            logger.info(
+                f"run_command: logged {self.logged} of {self.lines} lines of "
+                f"'{self.command}' output, see {self.sink.file_path}"
+            )
+
+
+class UpdaterLogSink:
+    """Log file for the output of the apt commands run by the OS updater, so
+    that the journal only gets a sample of it.
+
+    Writes are buffered, and flushed every FLUSH_INTERVAL seconds and when a
+    command finishes. The file is rotated when it reaches 'max_bytes'. The
+    default file is 'updater_log_file()' at the time it's opened."""
+
+    MAX_BYTES = 1024 * 1024
+    BACKUP_COUNT = 2
+    BUFFER_SIZE = 64 * 1024
+    FLUSH_INTERVAL = 2.0
+
+    def __init__(
+        self,
+        file_path: Optional[str] = None,
+        log_format: str = LogFormat.TEXT,
+        max_bytes: int = MAX_BYTES,
+        backup_count: int = BACKUP_COUNT,
+        sampling: Optional[JournalSampling] = None,
+    ) -> None:
+        self._file_path = file_path
+        self.log_format = log_format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.sampling = sampling or JournalSampling()
+        self.lock = Lock()
+        self._file: Optional[IO[bytes]] = None
+        self._size = 0
+        self._flushed_at = 0.0
+        # Set when the file can't be written, to stop trying
+        self._failed = False
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path or updater_log_file()
+
+    @file_path.setter
+    def file_path(self, file_path: Optional[str]) -> None:
+        self._file_path = file_path
+
+    def command(self, cmd: List) -> CommandLog:
+        return CommandLog(self, cmd)
+
+    def write(self, command: str, line: str) -> None:
+        if self.log_format == LogFormat.NDJSON:
+            record = json.dumps(
+                {"time": round(time(), 3), "command": command, "line": line},
+                separators=(",", ":"),
+            )
+        else:
+            record = line
+        data = f"{record}\n".encode()
+
+        with self.lock:
+            if self._failed:
+                return
+            try:
+                if self._file is None:
+                    self._open()
+                elif self._size > 0 and self._size + len(data) > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._size += len(data)
+                if monotonic() - self._flushed_at >= self.FLUSH_INTERVAL:
+                    self._flush()
+            except OSError as e:
+                logger.warning(f"UpdaterLogSink: unable to write {self.file_path}: {e}")
+                self._failed = True
+                self._close()
+
+    def flush(self) -> None:
+        with self.lock:
+            try:
+                self._flush()
+            except OSError as e:
+                logger.warning(f"UpdaterLogSink: unable to write {self.file_path}: {e}")
+
+    def close(self) -> None:
+        with self.lock:
+            self._close()
+
+    def _open(self) -> None:
+        makedirs(path.dirname(self.file_path), exist_ok=True)
+        self._file = open(self.file_path, "ab", buffering=self.BUFFER_SIZE)
+        self._size = self._file.tell()
+        self._flushed_at = monotonic()
+
+    def _flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+        self._flushed_at = monotonic()
+
+    def _close(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def _rotate(self) -> None:
+        self._close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                backup = f"{self.file_path}.{i}"
+                if path.exists(backup):
+                    rename(backup, f"{self.file_path}.{i + 1}")
+            rename(self.file_path, f"{self.file_path}.1")
+        else:
+            remove(self.file_path)
+        self._open()
+
+
+updater_log = UpdaterLogSink()
@@ -1,6 +1,9 @@
 import logging
+from collections import deque
 from json import dumps as jdumps
-from typing import List
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 from geventwebsocket.exceptions import WebSocketError
 from geventwebsocket.websocket import WebSocket
@@ -10,26 +13,356 @@ from .types import EventNames, MessageType
 logger = logging.getLogger(__name__)
 
 
+class BufferedClient:
+    """Sends messages to a websocket client from its own thread, so that
+    producers never block on network I/O.
+
+    Messages are sent after a flush window, so that the status lines queued
+    in the meantime are sent together: consecutive 'STATUS' messages of the
+    same type are merged into one, with their lines separated by newlines.
+    When a slow client falls behind, the oldest 'STATUS' messages in its
+    queue are dropped.
+
+    Pings are sent from the same thread, and 'last_seen' is updated when the
+    client answers them or sends a message."""
+
+    FLUSH_INTERVAL = 0.1
+    MAX_QUEUED_MESSAGES = 50
+    MAX_BATCH_LINES = 200
+
+    def __init__(
+        self, ws: WebSocket, on_error: Optional[Callable[[WebSocket], None]] = None
+    ) -> None:
+        self.ws = ws
+        self.closed = False
+        self.dropped = 0
+        self.last_seen = monotonic()
+        self._on_error = on_error
+        self._queue: Deque[Dict] = deque()
+        self._is_sending = False
+        self._ping_requested = False
+        self._condition = Condition()
+        self._watch_pongs()
+        Thread(target=self._run, daemon=True).start()
+
+    def _watch_pongs(self) -> None:
+        handle_pong = getattr(self.ws, "handle_pong", None)
+        if not callable(handle_pong):
+            return
+
+        def on_pong(header, payload):
+            self.mark_alive()
+            return handle_pong(header, payload)
+
+        self.ws.handle_pong = on_pong
+
+    def mark_alive(self) -> None:
+        self.last_seen = monotonic()
+
+    def ping(self) -> None:
+        with self._condition:
+            self._ping_requested = True
+            self._condition.notify_all()
+
+    def put(self, data: Dict) -> None:
+        with self._condition:
+            if self.closed:
+                return
+            if not self._merge(data):
+                # Merging modifies queued messages, which must not be shared
+                self._queue.append({**data, "payload": dict(data["payload"])})
+                self._truncate()
+            self._condition.notify_all()
+
+    def wait_until_sent(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.closed or not (self._queue or self._is_sending),
+                timeout,
+            )
+
+    def close(self) -> None:
+        with self._condition:
+            self.closed = True
+            self._queue.clear()
+            self._condition.notify_all()
+
+    def _merge(self, data: Dict) -> bool:
+        if not self._queue or not self._is_status(data):
+            return False
+        last = self._queue[-1]
+        if not self._is_status(last) or last["type"] != data["type"]:
+            return False
+        if last["payload"]["message"].count("\n") + 1 >= self.MAX_BATCH_LINES:
+            return False
+
+        message = data["payload"]["message"]
+        if message:
+            # Progress updates have no lines to add
+            last["payload"]["message"] = (
+                f"{last['payload']['message']}\n{message}"
+                if last["payload"]["message"]
+                else message
+            )
+        last["payload"]["percent"] = data["payload"]["percent"]
+        return True
+
+    def _truncate(self) -> None:
+        while len(self._queue) > self.MAX_QUEUED_MESSAGES:
+            oldest_status = next(
+                (data for data in self._queue if self._is_status(data)), None
+            )
+            if oldest_status is None:
+                return
+            self._queue.remove(oldest_status)
+            if self.dropped == 0:
+                logger.warning(f"Client {self.ws} is too slow, dropping messages")
+            self.dropped += 1
+
+    @staticmethod
+    def _is_status(data: Dict) -> bool:
+        return data["payload"].get("status") == MessageType.STATUS.name and (
+            "message" in data["payload"]
+        )
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self.closed or self._queue or self._ping_requested
+                )
+                if self.closed:
+                    return
+
+            if self._queue:
+                # Let more messages be queued, to send them together
+                sleep(self.FLUSH_INTERVAL)
+
+            with self._condition:
+                batch = list(self._queue)
+                self._queue.clear()
+                send_ping, self._ping_requested = self._ping_requested, False
+                self._is_sending = True
+
+            try:
+                if self.ws.closed:
+                    raise WebSocketError("Websocket is closed")
+                if send_ping and callable(getattr(self.ws, "send_frame", None)):
+                    self.ws.send_frame(b"", self.ws.OPCODE_PING)
+                for data in batch:
+                    if self.ws.closed:
+                        raise WebSocketError("Websocket is closed")
+                    self.ws.send(jdumps(data))
+            except Exception as e:
+                logger.info(f"Unable to send to client {self.ws}, removing: {e}")
+                self.close()
+                if callable(self._on_error):
+                    self._on_error(self.ws)
+            finally:
+                with self._condition:
+                    self._is_sending = False
+                    self._condition.notify_all()
+
+
+class MessageHistory:
+    """Recent progress messages of the running updater phases, so that
+    clients that connect while they run can catch up.
+
+    The log lines are kept in a ring buffer bounded in lines and in bytes.
+    A phase is forgotten once it finishes or fails."""
+
+    MAX_LINES = 1000
+    MAX_BYTES = 128 * 1024
+    # Log lines replayed per phase
+    REPLAY_LINES = 100
+
+    def __init__(self, max_lines: int = MAX_LINES, max_bytes: int = MAX_BYTES) -> None:
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        # (phase, line, size in bytes)
+        self._lines: Deque[Tuple[str, str, int]] = deque()
+        self._bytes = 0
+        # START message and latest percentage of the running phases
+        self._phases: Dict[str, Tuple[Dict, float]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @property
+    def size_in_bytes(self) -> int:
+        return self._bytes
+
+    def add(self, data: Dict) -> None:
+        phase = data["type"]
+        payload = data["payload"]
+        if "percent" not in payload:
+            # Not a progress message
+            return
+
+        status = payload.get("status")
+        if status == MessageType.START.name:
+            self._forget(phase)
+            self._phases[phase] = (data, payload["percent"])
+        elif status in (MessageType.FINISH.name, MessageType.ERROR.name):
+            self._forget(phase)
+        elif phase in self._phases:
+            start, _ = self._phases[phase]
+            self._phases[phase] = (start, payload["percent"])
+            for line in payload.get("message", "").splitlines():
+                self._append(phase, line)
+
+    def clear(self) -> None:
+        self._lines.clear()
+        self._bytes = 0
+        self._phases.clear()
+
+    def replay_messages(self) -> List[Dict]:
+        """The START message of each running phase, followed by a 'STATUS'
+        message with its latest percentage and last log lines."""
+        messages = []
+        for phase, (start, percent) in self._phases.items():
+            messages.append(start)
+            lines = [line for line_phase, line, _ in self._lines if line_phase == phase]
+            if lines:
+                messages.append(
+                    {
+                        "type": phase,
+                        "payload": {
+                            "status": MessageType.STATUS.name,
+                            "percent": percent,
+                            "message": "\n".join(lines[-self.REPLAY_LINES :]),
+                        },
+                    }
+                )
+        return messages
+
+    def _append(self, phase: str, line: str) -> None:
+        size = len(line.encode())
+        self._lines.append((phase, line, size))
+        self._bytes += size
+        while len(self._lines) > self.max_lines or self._bytes > self.max_bytes:
+            _, _, size = self._lines.popleft()
+            self._bytes -= size
+
+    def _forget(self, phase: str) -> None:
+        self._phases.pop(phase, None)
+        if any(line_phase == phase for line_phase, _, _ in self._lines):
+            self._lines = deque(entry for entry in self._lines if entry[0] != phase)
+            self._bytes = sum(size for _, _, size in self._lines)
+
+
 class OSUpdaterFrontendMessageHandler:
-    ws_clients: List[WebSocket] = []
+    """Sends updater messages to the registered websocket clients.
+
+    Clients are registered when they connect and unregistered when they
+    close. A heartbeat pings them, and unregisters the ones that didn't
+    answer or send anything for HEARTBEAT_TIMEOUT seconds.
+
+    The messages of the running phases are kept in 'history', and replayed
+    to clients that connect while they run. 'STATUS' messages aren't logged,
+    since the apt output they carry is in the updater log file."""
 
-    def _send(self, message):
-        failed_ws_clients = []
-        for ws_client in self.ws_clients:
-            if not ws_client.closed:
-                ws_client.send(message)
-            else:
-                failed_ws_clients.append(ws_client)
+    HEARTBEAT_INTERVAL = 10
+    HEARTBEAT_TIMEOUT = 30
 
-        for ws_client in failed_ws_clients:
-            self.ws_clients.remove(ws_client)
+    clients: Dict[WebSocket, BufferedClient] = dict()
+    clients_lock = Lock()
+    # Notified when clients are unregistered, to stop the heartbeat early
+    clients_changed = Condition(clients_lock)
+    heartbeat_thread: Optional[Thread] = None
+    history = MessageHistory()
+
+    def _send(self, data: Dict) -> None:
+        with self.clients_lock:
+            self.history.add(data)
+            for ws, client in list(self.clients.items()):
+                if client.closed or ws.closed:
+                    client.close()
+                    self.clients.pop(ws)
+                    continue
+                client.put(data)
+
+    def send_to(self, ws, data: Dict) -> None:
+        """Sends 'data' to a single client, after the messages already queued
+        for it."""
+        with self.clients_lock:
+            client = self.clients.get(ws)
+        if client is not None and not client.closed:
+            client.put(data)
+            return
+        try:
+            ws.send(jdumps(data))
+        except Exception as e:
+            logger.info(f"Unable to send to client {ws}: {e}")
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Waits until the queued messages are sent to all clients."""
+        with self.clients_lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            client.wait_until_sent(timeout)
 
     def register_client(self, ws):
-        if ws not in self.ws_clients:
+        with self.clients_lock:
+            if ws not in self.clients:
+                logger.info(
+                    f"OSUpdaterFrontendMessageHandler.register_client : New websocket {ws} - adding to list of clients"
+                )
+                self.clients[ws] = BufferedClient(ws, on_error=self.unregister_client)
+            self._start_heartbeat()
+
+    def unregister_client(self, ws):
+        with self.clients_lock:
+            client = self.clients.pop(ws, None)
+            self.clients_changed.notify_all()
+        if client is not None:
             logger.info(
-                f"OSUpdaterFrontendMessageHandler.register_client : New websocket {ws} - adding to list of clients"
+                f"OSUpdaterFrontendMessageHandler.unregister_client : Removing websocket {ws}"
             )
-            self.ws_clients.append(ws)
+            client.close()
+
+    def unregister_all_clients(self):
+        with self.clients_lock:
+            clients = list(self.clients.values())
+            self.clients.clear()
+            self.clients_changed.notify_all()
+        for client in clients:
+            client.close()
+
+    def mark_alive(self, ws):
+        with self.clients_lock:
+            client = self.clients.get(ws)
+        if client is not None:
+            client.mark_alive()
+
+    def _start_heartbeat(self):
+        # Called with 'clients_lock' held
+        cls = type(self)
+        if cls.heartbeat_thread is None:
+            cls.heartbeat_thread = Thread(target=self._heartbeat, daemon=True)
+            cls.heartbeat_thread.start()
+
+    def _heartbeat(self):
+        while True:
+            with self.clients_changed:
+                self.clients_changed.wait_for(
+                    lambda: not self.clients, self.HEARTBEAT_INTERVAL
+                )
+                if not self.clients:
+                    type(self).heartbeat_thread = None
+                    return
+                clients = list(self.clients.items())
+
+            now = monotonic()
+            for ws, client in clients:
+                if (
+                    ws.closed
+                    or client.closed
+                    or now - client.last_seen > self.HEARTBEAT_TIMEOUT
+                ):
+                    self.unregister_client(ws)
+                else:
+                    client.ping()
 
     def create_emit_update_sources_message(self, ws):
         def emit_update_sources_message(
@@ -44,9 +377,10 @@ class OSUpdaterFrontendMessageHandler:
                     "message": message,
                 },
             }
-            logger.info(f"APT Source: {percent}% '{message}'")
+            if message_type != MessageType.STATUS:
+                logger.info(f"APT Source: {percent}% '{message}'")
 
-            self._send(jdumps(data))
+            self._send(data)
 
         return emit_update_sources_message
 
@@ -63,12 +397,33 @@ class OSUpdaterFrontendMessageHandler:
                     "message": message,
                 },
             }
-            logger.info(f"Upgrade Prepare: {percent}% '{message}'")
+            if message_type != MessageType.STATUS:
+                logger.info(f"Upgrade Prepare: {percent}% '{message}'")
 
-            self._send(jdumps(data))
+            self._send(data)
 
         return emit_os_prepare_upgrade_message
 
+    def create_emit_os_download_message(self, ws):
+        def emit_os_download_message(
+            message_type: MessageType, status_message: str, percent: float
+        ) -> None:
+            message = status_message.strip()
+            data = {
+                "type": EventNames.OS_DOWNLOAD.name,
+                "payload": {
+                    "status": message_type.name,
+                    "percent": percent,
+                    "message": message,
+                },
+            }
+            if message_type != MessageType.STATUS:
+                logger.info(f"OS Download: {percent}% '{message}'")
+
+            self._send(data)
+
+        return emit_os_download_message
+
     def create_emit_os_upgrade_message(self, ws):
         def emit_os_upgrade_message(
             message_type: MessageType, status_message: str, percent: float
@@ -82,9 +437,10 @@ class OSUpdaterFrontendMessageHandler:
                     "message": message,
                 },
             }
-            logger.info(f"OS Upgrade: {percent}% '{message}'")
+            if message_type != MessageType.STATUS:
+                logger.info(f"OS Upgrade: {percent}% '{message}'")
 
-            self._send(jdumps(data))
+            self._send(data)
 
         return emit_os_upgrade_message
 
@@ -96,13 +452,13 @@ class OSUpdaterFrontendMessageHandler:
             }
             logger.info(f"OS upgrade size: {size}")
 
-            self._send(jdumps(data))
+            self._send(data)
 
         return emit_os_size_message
 
     def create_emit_state_message(self, ws):
         def emit_state_message(message_type, is_busy):
-            clients = self.active_clients()
+            clients = self.active_clients(exclude=ws)
             data = {
                 "type": EventNames.STATE.name,
                 "payload": {
@@ -115,20 +471,40 @@ class OSUpdaterFrontendMessageHandler:
 
             if not ws:
                 return
-            ws.send(jdumps(data))
-            if clients == 0:
-                self.register_client(ws)
+            self.send_to(ws, data)
 
         return emit_state_message
 
-    def active_clients(self):
-        clients = 0
-        for ws_client in self.ws_clients:
-            try:
-                ws_client.send("ping")
-                clients += 1
-            except WebSocketError:
-                pass
-            except Exception as e:
-                logger.error(f"OSUpdaterFrontendMessageHandler.active_clients : {e}")
-        return clients
+    def replay(self, ws, messages: Optional[List[Dict]] = None) -> None:
+        """Sends the history of the running phases to a client in a single
+        'REPLAY' message. 'messages' are sent instead when there's no
+        history, e.g. after the web portal restarted."""
+        if not ws:
+            return
+        with self.clients_lock:
+            # Queued while holding the lock, so that the client gets every
+            # message sent after the replay, and none of the ones in it
+            replayed = self.history.replay_messages() or messages
+            if not replayed:
+                return
+            data = {
+                "type": EventNames.REPLAY.name,
+                "payload": {"messages": replayed},
+            }
+            client = self.clients.get(ws)
+            if client is not None and not client.closed:
+                client.put(data)
+                return
+        try:
+            ws.send(jdumps(data))
+        except Exception as e:
+            logger.info(f"Unable to send to client {ws}: {e}")
+
+    def clear_history(self) -> None:
+        with self.clients_lock:
+            self.history.clear()
+
+    def active_clients(self, exclude=None):
+        """Number of registered clients, other than 'exclude'."""
+        with self.clients_lock:
+            return len(self.clients) - (exclude in self.clients)
@@ -2,7 +2,8 @@ import logging
 from time import sleep
 
 from pitop.common.command_runner import run_command
-from pitop.common.sys_info import is_connected_to_internet
+
+from ..connectivity import connectivity
 
 logger = logging.getLogger(__name__)
 
@@ -42,11 +43,8 @@ def wait_until_clock_is_synchronized() -> None:
 
 def synchronize_system_clock() -> None:
     logger.info("Checking for internet connection for up to 15 seconds")
-    attempts = 75
-    while not is_connected_to_internet() and attempts > 0:
-        logger.info("Not connected to internet... sleeping for 0.2 seconds")
-        sleep(0.2)
-        attempts = attempts - 1
+    if not connectivity.wait_until_connected(timeout=15):
+        logger.info("Not connected to internet")
 
     if not is_system_clock_synchronized():
         sync_clock()
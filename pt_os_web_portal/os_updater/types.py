@@ -9,8 +9,18 @@ class MessageType(Enum):
 
 
 class EventNames(Enum):
+    COMMAND = auto()
+    OS_DOWNLOAD = auto()
     OS_UPGRADE = auto()
     OS_PREPARE_UPGRADE = auto()
+    REPLAY = auto()
     SIZE = auto()
     STATE = auto()
     UPDATE_SOURCES = auto()
+
+
+class BackendOperation(Enum):
+    UPDATE = auto()
+    STAGE = auto()
+    DOWNLOAD = auto()
+    UPGRADE = auto()
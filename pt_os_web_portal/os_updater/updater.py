@@ -1,53 +1,115 @@
 import logging
 import subprocess
-from time import sleep
 
+from ..dpkg_status import installed_packages
 from ..event import AppEvents, post_event
+from .apt_progress import ProgressThrottle
 from .backend import OsUpdaterBackend
+from .command_executor import UpdaterCommandExecutor
+from .job_state import JOB_STATE_FILE, UpdaterJobState
 from .message_handler import OSUpdaterFrontendMessageHandler
 from .system_clock import is_system_clock_synchronized, synchronize_system_clock
-from .types import MessageType
+from .types import BackendOperation, EventNames, MessageType
 
 logger = logging.getLogger(__name__)
 
 
 class OSUpdater:
-    def __init__(self):
+    # Minimum time between progress messages
+    PROGRESS_INTERVAL = 0.5
+    # How often to log while waiting for the backend to finish when stopping
+    STOP_LOG_INTERVAL = 5
+
+    def __init__(self, job_state_file=None):
         self.backend = OsUpdaterBackend()
         self.message_handler = OSUpdaterFrontendMessageHandler()
+        self.job = UpdaterJobState(job_state_file or JOB_STATE_FILE)
+        self.commands = UpdaterCommandExecutor(self)
 
     def start(self):
         pass
 
     def stop(self):
-        while self.backend.lock:
-            logger.debug("Waiting: OS updater backend lock")
-            sleep(0.2)
+        while not self.backend.wait_until_idle(timeout=self.STOP_LOG_INTERVAL):
+            logger.info(
+                f"Waiting: OS updater backend operation {self.backend.operation}"
+            )
+        self.commands.shutdown()
 
         logger.info("Stopped: OS updater")
 
+    def cancel(self, ws=None):
+        self.backend.cancel()
+
     def updates_available(self):
         self.update_sources()
         self.stage_packages()
         return self.backend.install_count > 0
 
-    def update_sources(self, ws=None):
-        if not is_system_clock_synchronized():
-            synchronize_system_clock()
-
-        post_event(AppEvents.OS_UPDATE_SOURCES, "started")
-        callback = self.message_handler.create_emit_update_sources_message(ws)
+    def _tracked(self, phase, callback, packages=None, waits_for=()):
+        """Returns 'callback' recording the messages it sends in the persisted
+        job state. Calls made while another operation is running fail straight
+        away and aren't recorded, unless they wait for operations in
+        'waits_for'."""
+        is_tracking = False
+
+        def tracked_callback(message_type, status_message, percent):
+            nonlocal is_tracking
+            if message_type == MessageType.START:
+                is_tracking = (
+                    self.backend.operation is None
+                    or self.backend.operation in waits_for
+                )
+            if is_tracking:
+                self.job.record(
+                    phase,
+                    message_type,
+                    status_message,
+                    percent,
+                    packages=self.backend.packages if packages is None else packages,
+                )
+            return callback(message_type, status_message, percent)
+
+        return tracked_callback
+
+    def _status_callbacks(self, callback):
+        """Returns callbacks for the output lines and the progress of an apt
+        command. Output lines are sent with the latest progress, and progress
+        is sent every PROGRESS_INTERVAL seconds at most, as a 'STATUS'
+        message without output lines."""
+        percent = 0.0
 
         def on_state_update(status_message):
             return callback(
                 message_type=MessageType.STATUS,
-                percent=0.0,
+                percent=percent,
                 status_message=status_message,
             )
 
+        def on_progress(new_percent, description):
+            nonlocal percent
+            percent = new_percent
+            # The description isn't apt output, so it's not sent as a line
+            on_state_update("")
+
+        return on_state_update, ProgressThrottle(on_progress, self.PROGRESS_INTERVAL)
+
+    def update_sources(self, ws=None):
+        if not is_system_clock_synchronized():
+            synchronize_system_clock()
+
+        post_event(AppEvents.OS_UPDATE_SOURCES, "started")
+        callback = self._tracked(
+            EventNames.UPDATE_SOURCES,
+            self.message_handler.create_emit_update_sources_message(ws),
+            packages=[],
+        )
+        on_state_update, on_progress = self._status_callbacks(callback)
+
         try:
             callback(MessageType.START, "Updating sources", 0.0)
-            self.backend.update(on_state_update)
+            self.backend.update(on_state_update, on_progress)
+            on_progress.flush()
             callback(MessageType.FINISH, "Finished updating sources", 100.0)
             post_event(AppEvents.OS_UPDATE_SOURCES, "success")
         except Exception as e:
@@ -57,10 +119,17 @@ class OSUpdater:
 
     def stage_packages(self, ws=None, packages=[]):
         post_event(AppEvents.OS_UPDATER_PREPARE, "started")
-        callback = self.message_handler.create_emit_os_prepare_upgrade_message(ws)
+        callback = self._tracked(
+            EventNames.OS_PREPARE_UPGRADE,
+            self.message_handler.create_emit_os_prepare_upgrade_message(ws),
+            packages=packages,
+        )
         try:
             callback(MessageType.START, "Preparing OS upgrade", 0.0)
             self.backend.stage_upgrade(packages)
+            self.job.set_sizes(
+                self.backend.download_size(), self.backend.required_space()
+            )
             callback(MessageType.FINISH, "Finished preparing", 100.0)
             post_event(AppEvents.OS_UPDATER_PREPARE, "success")
         except Exception as e:
@@ -82,8 +151,18 @@ class OSUpdater:
 
     def stage_web_portal(self, ws=None):
         web_portal_package = "pt-os-web-portal"
-        # Stage the web portal and all its dependencies
-        dependencies = self.get_package_dependencies(web_portal_package)
+        installed = installed_packages()
+        logger.info(
+            f"Installed {web_portal_package} version: {installed.get(web_portal_package)}"
+        )
+        # Stage the web portal and its installed dependencies, to upgrade them
+        # with it. apt installs the missing ones itself, and staging them would
+        # install every alternative of an 'a | b' dependency
+        dependencies = [
+            dependency
+            for dependency in self.get_package_dependencies(web_portal_package)
+            if dependency in installed
+        ]
         packages = [web_portal_package] + dependencies
         logger.info(f"Staging pt-os-web-portal and dependencies for update: {packages}")
         self.stage_packages(ws, packages=packages)
@@ -105,20 +184,44 @@ class OSUpdater:
                 size={"downloadSize": 0, "requiredSpace": 0},
             )
 
+    def download_packages(self, ws=None):
+        callback = self._tracked(
+            EventNames.OS_DOWNLOAD,
+            self.message_handler.create_emit_os_download_message(ws),
+        )
+        on_state_update, on_progress = self._status_callbacks(callback)
+
+        try:
+            callback(MessageType.START, "Downloading packages", 0.0)
+            self.backend.download(on_state_update, on_progress)
+            on_progress.flush()
+            callback(MessageType.FINISH, "Finished downloading packages", 100.0)
+        except Exception as e:
+            logger.error(f"OSUpdater.download_packages: {e}")
+            callback(message_type=MessageType.ERROR, percent=0.0, status_message=f"{e}")
+
     def start_os_upgrade(self, ws=None):
         post_event(AppEvents.OS_UPDATER_UPGRADE, "started")
-        callback = self.message_handler.create_emit_os_upgrade_message(ws)
-
-        def on_state_update(status_message):
-            return callback(
-                message_type=MessageType.STATUS,
-                percent=0.0,
-                status_message=status_message,
-            )
+        # Packages that are being downloaded in the background won't be
+        # downloaded again, so wait for them instead of failing
+        waits_for = (BackendOperation.DOWNLOAD,)
+        timeout = (
+            None
+            if self.backend.operation in waits_for
+            and self.backend.queued_operations == 0
+            else 0.0
+        )
+        callback = self._tracked(
+            EventNames.OS_UPGRADE,
+            self.message_handler.create_emit_os_upgrade_message(ws),
+            waits_for=waits_for if timeout is None else (),
+        )
+        on_state_update, on_progress = self._status_callbacks(callback)
 
         try:
             callback(MessageType.START, "Starting install & upgrade process", 0.0)
-            self.backend.upgrade(on_state_update)
+            self.backend.upgrade(on_state_update, on_progress, timeout=timeout)
+            on_progress.flush()
             callback(MessageType.FINISH, "Finished upgrade", 100.0)
             post_event(AppEvents.OS_UPDATER_UPGRADE, "success")
         except Exception as e:
@@ -130,6 +233,9 @@ class OSUpdater:
         callback = self.message_handler.create_emit_state_message(ws)
         try:
             callback(MessageType.STATUS, self.backend.lock)
+            # Bring the client up to date with a job that's running, or that
+            # was interrupted by a restart
+            self.message_handler.replay(ws, self.job.replay_messages())
         except Exception as e:
             logger.error(f"OSUpdater.state: {e}")
             callback(MessageType.ERROR, False)
@@ -0,0 +1,205 @@
+import sys
+from contextlib import nullcontext
+from shutil import which
+from time import perf_counter
+from types import ModuleType
+
+import pytest
+
+
+class FakePackage:
+    def __init__(self, cache, name):
+        self.cache = cache
+        self.name = name
+
+    def mark_install(self):
+        self.cache.marked.append(self.name)
+
+
+class FakeCache:
+    instances = []
+
+    def __init__(self):
+        FakeCache.instances.append(self)
+        self.packages = {"pt-os-web-portal", "python3"}
+        self.marked = []
+        self.upgraded = False
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def actiongroup(self):
+        return nullcontext()
+
+    def upgrade(self, dist_upgrade=False):
+        self.upgraded = dist_upgrade
+
+    def __contains__(self, name):
+        return name in self.packages
+
+    def __getitem__(self, name):
+        return FakePackage(self, name)
+
+    @property
+    def required_download(self):
+        return 2155000000 if self.upgraded else 1000 * len(self.marked)
+
+    @property
+    def required_space(self):
+        return 99300000 if self.upgraded else -5000
+
+    @property
+    def install_count(self):
+        return 120 if self.upgraded else len(self.marked)
+
+
+@pytest.fixture
+def fake_apt(mocker):
+    FakeCache.instances = []
+    apt = ModuleType("apt")
+    apt.Cache = FakeCache
+    mocker.patch.dict(sys.modules, {"apt": apt})
+    return apt
+
+
+def test_backend_without_python_apt(patch_modules, mocker):
+    mocker.patch.dict(sys.modules, {"apt": None})
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    assert OsUpdaterBackend().apt_cache is None
+
+
+def test_upgrade_size_from_cache(patch_modules, fake_apt, mocker):
+    popen_mock = mocker.patch("pt_os_web_portal.os_updater.backend.Popen")
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    backend.stage_upgrade()
+
+    popen_mock.assert_not_called()
+    assert backend.download_size() == 2155000000
+    assert backend.download_size_str == "2.2 GB"
+    assert backend.required_space() == 99300000
+    assert backend.required_space_str == "99.3 MB"
+    assert backend.install_count() == 120
+
+    # The cache is released after estimating the size
+    assert FakeCache.instances[0].closed is True
+
+
+def test_install_size_from_cache(patch_modules, fake_apt):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    backend.stage_upgrade(["pt-os-web-portal", "python3"])
+
+    assert backend.download_size() == 2000
+    assert backend.download_size_str == "2.0 kB"
+    assert backend.required_space() == 0
+    assert backend.install_count() == 2
+
+
+def test_unknown_packages_fail_staging(patch_modules, fake_apt, mocker):
+    run_command_mock = mocker.patch("pt_os_web_portal.os_updater.backend.run_command")
+    from pt_os_web_portal.os_updater.apt_cache import UnknownPackages
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    with pytest.raises(UnknownPackages, match="unknown-package"):
+        backend.stage_upgrade(["pt-os-web-portal", "unknown-package"])
+
+    # Not hidden by estimating the size with apt-get
+    run_command_mock.assert_not_called()
+    assert FakeCache.instances[0].closed is True
+
+
+def test_cache_is_read_for_each_estimate(patch_modules, fake_apt, mocker):
+    run_command_mock = mocker.patch("pt_os_web_portal.os_updater.backend.run_command")
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    backend.stage_upgrade()
+    backend.stage_upgrade(["python3"])
+
+    assert len(FakeCache.instances) == 2
+    assert all(cache.closed for cache in FakeCache.instances)
+    run_command_mock.assert_not_called()
+
+
+def test_cache_is_read_in_a_native_thread_with_gevent(patch_modules, mocker):
+    from pt_os_web_portal.os_updater.apt_cache import run_in_native_thread
+
+    gevent = sys.modules["gevent"]
+    mocker.patch.object(gevent.monkey, "is_module_patched", return_value=True)
+    apply_mock = mocker.patch.object(
+        gevent.get_hub.return_value.threadpool, "apply", return_value=3
+    )
+    mocker.patch.dict(sys.modules, {"gevent.monkey": gevent.monkey})
+
+    def fn():
+        return 3
+
+    assert run_in_native_thread(fn) == 3
+    apply_mock.assert_called_once_with(fn)
+
+
+def test_cache_is_read_in_the_calling_thread_without_gevent(patch_modules, mocker):
+    mocker.patch.dict(sys.modules, {"gevent": None})
+    from pt_os_web_portal.os_updater.apt_cache import run_in_native_thread
+
+    assert run_in_native_thread(lambda: 3) == 3
+
+
+def test_falls_back_to_apt_get_on_cache_errors(patch_modules, fake_apt, mocker):
+    mocker.patch.object(FakeCache, "upgrade", side_effect=SystemError("broken"))
+    run_command_mock = mocker.patch("pt_os_web_portal.os_updater.backend.run_command")
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    mocker.patch.object(backend, "_parse_install_size_and_packages")
+    backend.stage_upgrade()
+
+    run_command_mock.assert_called_once()
+    assert run_command_mock.call_args.args[0] == [
+        "apt-get",
+        "dist-upgrade",
+        "--assume-no",
+    ]
+    assert FakeCache.instances[0].closed is True
+
+
+@pytest.mark.benchmark
+def test_benchmark_cache_against_apt_get(patch_modules, mocker):
+    pytest.importorskip("apt")
+    if which("apt-get") is None:
+        pytest.skip("apt-get is not available")
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    # First estimate opens the cache
+    backend.stage_upgrade()
+
+    start = perf_counter()
+    backend.stage_upgrade()
+    cache_estimate = perf_counter() - start
+    cache_install_count = backend.install_count()
+
+    mocker.patch.object(backend, "apt_cache", None)
+    start = perf_counter()
+    backend.stage_upgrade()
+    apt_get_estimate = perf_counter() - start
+
+    assert backend.install_count() == cache_install_count
+    assert cache_estimate < apt_get_estimate
+
+
+def test_size_strings(patch_modules):
+    from pt_os_web_portal.os_updater.apt_cache import bytes_to_size_str
+    from pt_os_web_portal.os_updater.backend import size_str_to_bytes
+
+    assert bytes_to_size_str(0) == "0 B"
+    assert bytes_to_size_str(999) == "999 B"
+    assert bytes_to_size_str(11400) == "11.4 kB"
+    assert bytes_to_size_str(99300000) == "99.3 MB"
+    assert size_str_to_bytes(bytes_to_size_str(2155000000)) == 2200000000
@@ -0,0 +1,212 @@
+import sys
+from os import chmod
+from pathlib import Path
+from subprocess import run
+
+import pytest
+
+fake_apt_get = f"""#!{sys.executable}
+import os
+import sys
+
+status_fd = None
+for arg in sys.argv:
+    if arg.startswith("APT::Status-Fd="):
+        status_fd = int(arg.split("=")[1])
+
+print("Reading package lists...")
+if status_fd is not None:
+    os.write(status_fd, b"dlstatus:1:50.0000:Retrieving file 1 of 2\\n")
+    os.write(status_fd, b"dlstatus:2:100.0000:Retrieving file 2 of 2\\n")
+    os.write(status_fd, b"pmstatus:dpkg-exec:0.0000:Running dpkg\\n")
+    os.write(status_fd, b"pmstatus:python3:50.0000:Installing python3\\n")
+print("Unpacking python3 ...")
+print("Fancy progress: " + str("Dpkg::Progress-Fancy=0" in sys.argv))
+"""
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        (
+            "dlstatus:1:12.5000:Retrieving file 1 of 8",
+            ("dlstatus", 12.5, "Retrieving file 1 of 8"),
+        ),
+        (
+            "pmstatus:python3:42.8571:Installing python3 (amd64)\n",
+            ("pmstatus", 42.8571, "Installing python3 (amd64)"),
+        ),
+        (
+            "pmstatus:libc6:80.0000:Configuring libc6: a description",
+            ("pmstatus", 80.0, "Configuring libc6: a description"),
+        ),
+        ("pmerror:foo.deb:50.0000:trying to overwrite file", None),
+        ("dlstatus:1:not-a-number:Retrieving", None),
+        ("Reading package lists...", None),
+    ],
+)
+def test_parse_status_line(patch_modules, line, expected):
+    from pt_os_web_portal.os_updater.apt_progress import parse_status_line
+
+    assert parse_status_line(line) == expected
+
+
+def test_apt_progress_splits_download_and_install(patch_modules, mocker):
+    from pt_os_web_portal.os_updater.apt_progress import AptProgress
+
+    callback = mocker.Mock()
+    progress = AptProgress(callback, download_weight=0.5)
+
+    for line in (
+        "dlstatus:1:50.0000:Retrieving file 1 of 2",
+        "dlstatus:2:100.0000:Retrieving file 2 of 2",
+        "pmstatus:python3:40.0000:Installing python3",
+        # Progress never goes backwards
+        "pmstatus:python3:20.0000:Preparing python3",
+        "pmstatus:python3:100.0000:Installed python3",
+        "not a status line",
+    ):
+        progress.parse_line(line)
+
+    assert [c.args for c in callback.call_args_list] == [
+        (25.0, "Retrieving file 1 of 2"),
+        (50.0, "Retrieving file 2 of 2"),
+        (70.0, "Installing python3"),
+        (100.0, "Installed python3"),
+    ]
+
+
+def test_progress_throttle(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.apt_progress.monotonic",
+        side_effect=[0.0, 0.1, 0.2, 0.6, 0.7, 0.8, 0.9],
+    )
+    from pt_os_web_portal.os_updater.apt_progress import ProgressThrottle
+
+    callback = mocker.Mock()
+    throttle = ProgressThrottle(callback, interval=0.5)
+
+    throttle(10.0, "a")  # 0.0: sent
+    throttle(20.0, "b")  # 0.1: throttled
+    throttle(30.0, "c")  # 0.2: throttled
+    throttle(40.0, "d")  # 0.6: sent
+    throttle(50.0, "e")  # 0.7: throttled
+    throttle(100.0, "f")  # 0.8: sent, since it's the end
+    throttle.flush()  # nothing pending
+
+    assert [c.args for c in callback.call_args_list] == [
+        (10.0, "a"),
+        (40.0, "d"),
+        (100.0, "f"),
+    ]
+
+
+def test_run_command_reads_status_fd(patch_modules, tmp_path, mocker):
+    from pt_os_web_portal.os_updater.apt_progress import AptProgress
+    from pt_os_web_portal.os_updater.backend import run_command
+
+    apt_get = tmp_path / "apt-get"
+    apt_get.write_text(fake_apt_get)
+    chmod(apt_get, 0o755)
+
+    output_callback = mocker.Mock()
+    progress_callback = mocker.Mock()
+    run_command(
+        [str(apt_get), "dist-upgrade"],
+        output_callback,
+        status_callback=AptProgress(progress_callback).parse_line,
+    )
+
+    assert [c.args[0] for c in output_callback.call_args_list] == [
+        "Reading package lists...",
+        "Unpacking python3 ...",
+        "Fancy progress: True",
+    ]
+    assert [c.args for c in progress_callback.call_args_list] == [
+        (25.0, "Retrieving file 1 of 2"),
+        (50.0, "Retrieving file 2 of 2"),
+        (50.0, "Running dpkg"),
+        (75.0, "Installing python3"),
+    ]
+
+
+gevent_script = f"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import sys
+from unittest.mock import Mock
+
+sys.path.insert(0, {str(Path(__file__).parent.parent)!r})
+sys.modules["pitop.common.sys_info"] = Mock()
+
+from pt_os_web_portal.os_updater.backend import run_command
+
+statuses = []
+run_command([sys.argv[1], "dist-upgrade"], None, status_callback=statuses.append)
+print(len(statuses))
+"""
+
+
+def test_run_command_reads_status_fd_with_gevent(patch_modules, tmp_path):
+    pytest.importorskip("gevent")
+    apt_get = tmp_path / "apt-get"
+    apt_get.write_text(fake_apt_get)
+    chmod(apt_get, 0o755)
+    script = tmp_path / "run_command.py"
+    script.write_text(gevent_script)
+
+    # Reading the status pipe must not block gevent's hub
+    result = run(
+        [sys.executable, str(script), str(apt_get)],
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "4"
+
+
+def test_run_command_without_status_fd(patch_modules, tmp_path, mocker):
+    from pt_os_web_portal.os_updater.backend import run_command
+
+    apt_get = tmp_path / "apt-get"
+    apt_get.write_text(fake_apt_get)
+    chmod(apt_get, 0o755)
+
+    output_callback = mocker.Mock()
+    run_command([str(apt_get), "update"], output_callback)
+
+    assert output_callback.call_args_list[-1].args[0] == "Fancy progress: False"
+
+
+def test_upgrade_sends_progress_messages(patch_modules, os_updater_job_file, mocker):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.updater.is_system_clock_synchronized",
+        return_value=True,
+    )
+
+    def fake_upgrade(callback, progress_callback, **kwargs):
+        callback("Reading package lists...")
+        for percent in (10.0, 20.0, 30.0, 100.0):
+            progress_callback(percent, f"Installing {percent}")
+        callback("Done")
+
+    from pt_os_web_portal.os_updater import OSUpdater
+
+    os_updater = OSUpdater()
+    mocker.patch.object(os_updater.backend, "upgrade", side_effect=fake_upgrade)
+    send_mock = mocker.patch.object(os_updater.message_handler, "_send")
+
+    os_updater.start_os_upgrade()
+
+    payloads = [c.args[0]["payload"] for c in send_mock.call_args_list]
+    assert [(p["status"], p["percent"], p["message"]) for p in payloads] == [
+        ("START", 0.0, "Starting install & upgrade process"),
+        ("STATUS", 0.0, "Reading package lists..."),
+        ("STATUS", 10.0, ""),
+        ("STATUS", 100.0, ""),
+        ("STATUS", 100.0, "Done"),
+        ("FINISH", 100.0, "Finished upgrade"),
+    ]
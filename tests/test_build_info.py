@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+from flask import json
+
+from tests.utils import dotdict
+
+BUILD_INFO_DELAY = 0.3
+CONCURRENT_CLIENTS = 10
+
+pitopOS_info_response = {
+    "build_date": "2022-02-02",
+    "build_run_number": "3",
+    "build_commit": "abcdef",
+    "schema_version": "1",
+    "build_type": "release",
+    "build_os_version": "bullseye",
+    "build_name": "pi-topOS",
+    "build_repo": "release",
+    "final_repo": "release",
+}
+
+
+def slow_pitopOS_info():
+    sleep(BUILD_INFO_DELAY)
+    return dotdict(pitopOS_info_response)
+
+
+def mock_build_info_sources(mocker):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.build.installed_version",
+        return_value="1.2.3",
+    )
+    return mocker.patch(
+        "pt_os_web_portal.backend.helpers.build.get_pitopOS_info",
+        side_effect=slow_pitopOS_info,
+    )
+
+
+def test_build_info_response(app, mocker):
+    mock_build_info_sources(mocker)
+
+    response = app.get("/build-info")
+    body = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert body["buildDate"] == "2022-02-02"
+    assert body["buildName"] == "pi-topOS"
+    assert body["ptOsWebPortalVersion"] == "1.2.3"
+
+
+def test_concurrent_build_info_requests_share_one_computation(app, mocker):
+    pt_os_info_mock = mock_build_info_sources(mocker)
+    from pt_os_web_portal.backend.helpers.build import os_build_info
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CLIENTS) as executor:
+        results = list(
+            executor.map(lambda _: os_build_info(), range(CONCURRENT_CLIENTS))
+        )
+    elapsed = perf_counter() - start
+
+    pt_os_info_mock.assert_called_once()
+    assert all(result == results[0] for result in results)
+    # Serialising callers would take CONCURRENT_CLIENTS * BUILD_INFO_DELAY
+    assert elapsed < 2 * BUILD_INFO_DELAY
+
+    # Later callers get the cached value straight away
+    start = perf_counter()
+    os_build_info()
+    assert perf_counter() - start < BUILD_INFO_DELAY
+    pt_os_info_mock.assert_called_once()
+
+
+def test_build_info_errors_are_shared_and_not_cached(app, mocker):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.build.installed_version",
+        side_effect=Exception("dpkg error"),
+    )
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.build.get_pitopOS_info",
+        side_effect=slow_pitopOS_info,
+    )
+    from pt_os_web_portal.backend.helpers.build import os_build_info
+
+    def call():
+        try:
+            os_build_info()
+        except Exception as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CLIENTS) as executor:
+        errors = list(executor.map(lambda _: call(), range(CONCURRENT_CLIENTS)))
+
+    assert errors == ["dpkg error"] * CONCURRENT_CLIENTS
+    assert os_build_info.cache_info()["entries"] == 0
+
+
+def test_build_info_cache_is_cleared_when_os_upgrade_finishes(app, mocker):
+    pt_os_info_mock = mock_build_info_sources(mocker)
+    from pt_os_web_portal.backend.helpers.build import (
+        os_build_info,
+        setup_build_info_event_handlers,
+    )
+    from pt_os_web_portal.event import AppEvents, post_event
+
+    setup_build_info_event_handlers()
+
+    os_build_info()
+    post_event(AppEvents.OS_UPDATER_UPGRADE, "started")
+    os_build_info()
+    assert pt_os_info_mock.call_count == 1
+
+    post_event(AppEvents.OS_UPDATER_UPGRADE, "success")
+    os_build_info()
+    assert pt_os_info_mock.call_count == 2
@@ -0,0 +1,212 @@
+import builtins
+from unittest.mock import Mock
+
+from flask import json
+
+from tests.utils import wait_for_condition, wait_for_jobs
+
+
+def test_cached_function_returns_cached_value(patch_modules):
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    fn = Mock(return_value="value")
+    cached_fn = cached()(lambda *args: fn(*args))
+
+    assert cached_fn() == "value"
+    assert cached_fn() == "value"
+
+    fn.assert_called_once()
+    assert cached_fn.cache_info()["hits"] == 1
+    assert cached_fn.cache_info()["misses"] == 1
+
+
+def test_cached_function_caches_by_arguments(patch_modules):
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    fn = Mock(side_effect=lambda x: x * 2)
+    cached_fn = cached()(lambda *args: fn(*args))
+
+    assert cached_fn(1) == 2
+    assert cached_fn(2) == 4
+    assert cached_fn(1) == 2
+
+    assert fn.call_count == 2
+    assert cached_fn.cache_info()["entries"] == 2
+
+
+def test_cached_value_expires_after_ttl(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    monotonic_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.cache.monotonic", return_value=100
+    )
+    fn = Mock(return_value="value")
+    cached_fn = cached(ttl=10)(lambda: fn())
+
+    cached_fn()
+    monotonic_mock.return_value = 105
+    cached_fn()
+    assert fn.call_count == 1
+
+    monotonic_mock.return_value = 111
+    cached_fn()
+    assert fn.call_count == 2
+
+
+def test_cached_value_is_invalidated_when_source_file_changes(patch_modules, tmp_path):
+    from os import utime
+
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    source_file = tmp_path / "source"
+    source_file.write_text("content")
+
+    fn = Mock(return_value="value")
+    cached_fn = cached(source_files=(lambda: str(source_file),))(lambda: fn())
+
+    cached_fn()
+    cached_fn()
+    assert fn.call_count == 1
+
+    utime(source_file, (0, 0))
+    cached_fn()
+    assert fn.call_count == 2
+
+
+def test_cached_value_is_invalidated_when_file_key_changes(patch_modules, tmp_path):
+    from pt_os_web_portal.backend.helpers.cache import cached, stat_key
+
+    source_file = tmp_path / "source"
+    source_file.write_text("content")
+
+    fn = Mock(side_effect=lambda file_path: open(file_path).read())
+    cached_fn = cached(file_key=stat_key)(lambda file_path: fn(file_path))
+
+    assert cached_fn(str(source_file)) == "content"
+    assert cached_fn(str(source_file)) == "content"
+    assert fn.call_count == 1
+
+    source_file.write_text("new content")
+    assert cached_fn(str(source_file)) == "new content"
+    assert fn.call_count == 2
+
+
+def test_values_are_only_cached_if_cache_if_is_true(patch_modules):
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    fn = Mock(side_effect=[[], [], ["value"]])
+    cached_fn = cached(cache_if=bool)(lambda: fn())
+
+    assert cached_fn() == []
+    assert cached_fn() == []
+    assert cached_fn() == ["value"]
+    assert cached_fn() == ["value"]
+    assert fn.call_count == 3
+
+
+def test_cache_clear(patch_modules):
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    fn = Mock(return_value="value")
+    cached_fn = cached()(lambda *args: fn(*args))
+
+    cached_fn()
+    cached_fn.cache_clear()
+    cached_fn()
+
+    assert fn.call_count == 2
+
+
+def test_callers_waiting_for_an_interrupted_computation_compute_it(patch_modules):
+    from threading import Event, Thread
+
+    from pt_os_web_portal.backend.helpers.cache import cached
+
+    class Interrupt(BaseException):
+        pass
+
+    started = Event()
+    release = Event()
+
+    def compute():
+        if not started.is_set():
+            started.set()
+            release.wait()
+            raise Interrupt()
+        return "value"
+
+    cached_fn = cached()(compute)
+
+    def owner():
+        try:
+            cached_fn()
+        except Interrupt:
+            pass
+
+    owner_thread = Thread(target=owner)
+    owner_thread.start()
+    started.wait()
+
+    results = []
+    waiter_thread = Thread(target=lambda: results.append(cached_fn()))
+    waiter_thread.start()
+    assert wait_for_condition(lambda: cached_fn.cache_info()["shared"] == 1)
+    release.set()
+
+    owner_thread.join(5)
+    waiter_thread.join(5)
+    assert results == ["value"]
+    assert cached_fn() == "value"
+
+
+def test_list_routes_read_source_files_once(app, mocker):
+    open_spy = mocker.spy(builtins, "open")
+
+    for _ in range(3):
+        app.get("/list-timezones")
+        app.get("/list-wifi-countries")
+        app.get("/list-locales-supported")
+
+    opened_files = [call.args[0] for call in open_spy.call_args_list]
+    for filename in ("zone.tab", "iso3166.tab", "SUPPORTED"):
+        assert len([f for f in opened_files if f.endswith(filename)]) == 1
+
+
+def test_set_route_keeps_list_cache(app, mocker):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.wifi_country.run_command", return_value=""
+    )
+    from pt_os_web_portal.backend.routes import list_wifi_countries
+
+    app.get("/list-wifi-countries")
+    assert list_wifi_countries.cache_info()["entries"] == 1
+
+    # Setting the country doesn't change the list of countries
+    app.post("/set-wifi-country", json={"wifi_country": "GB"})
+    wait_for_jobs()
+    assert list_wifi_countries.cache_info()["entries"] == 1
+
+
+def test_catalogues_are_listed_in_cache_stats(app):
+    app.get("/list-timezones")
+    app.get("/list-locales-supported")
+
+    stats = json.loads(app.get("/cache-stats").data)
+    for name in (
+        "pt_os_web_portal.backend.helpers.timezone.load_timezone_index",
+        "pt_os_web_portal.backend.helpers.language.read_locales",
+    ):
+        assert stats[name]["misses"] >= 1
+
+
+def test_cache_stats_route(app):
+    app.get("/list-wifi-countries")
+    app.get("/list-wifi-countries")
+
+    response = app.get("/cache-stats")
+    body = json.loads(response.data)
+
+    assert response.status_code == 200
+    stats = body["pt_os_web_portal.backend.helpers.wifi_country.list_wifi_countries"]
+    assert stats["hits"] >= 1
+    assert stats["misses"] >= 1
@@ -1,4 +1,9 @@
-from tests.utils import SleepMocker
+from threading import Event
+from time import sleep, time
+
+import pytest
+
+from tests.utils import SleepMocker, wait_for_condition
 
 
 def test_connection_manager_triggers_event_when_getting_ap_credentials(
@@ -16,10 +21,6 @@ def test_connection_manager_triggers_event_when_getting_ap_credentials(
         "pt_os_web_portal.connection_manager.get_ap_mode_status",
         return_value={},
     )
-    mocker.patch(
-        "pt_os_web_portal.connection_manager.is_connected_to_internet",
-        return_value=False,
-    )
     post_event_mock = mocker.patch("pt_os_web_portal.connection_manager.post_event")
     sleep_mocker = SleepMocker()
     sleep_patch = mocker.patch(
@@ -28,7 +29,7 @@ def test_connection_manager_triggers_event_when_getting_ap_credentials(
 
     from pt_os_web_portal.connection_manager import AppEvents, ConnectionManager
 
-    cm = ConnectionManager()
+    cm = ConnectionManager(wait_for_network_changes=False)
     cm.start()
 
     # Events are not triggered since AP credentials are not available yet
@@ -76,10 +77,6 @@ def test_connection_manager_triggers_event_on_connected_device_ip_changes(
         "pt_os_web_portal.connection_manager.get_ap_mode_status",
         return_value={},
     )
-    mocker.patch(
-        "pt_os_web_portal.connection_manager.is_connected_to_internet",
-        return_value=False,
-    )
     post_event_mock = mocker.patch(
         "pt_os_web_portal.connection_manager.post_event",
     )
@@ -90,7 +87,7 @@ def test_connection_manager_triggers_event_on_connected_device_ip_changes(
 
     from pt_os_web_portal.connection_manager import AppEvents, ConnectionManager
 
-    cm = ConnectionManager()
+    cm = ConnectionManager(wait_for_network_changes=False)
     cm.start()
 
     sleep_mocker.wait_until_next_iteration(sleep_patch)
@@ -111,8 +108,49 @@ def test_connection_manager_triggers_event_on_connected_device_ip_changes(
     cm.stop()
 
 
-def test_connection_manager_triggers_event_on_connection_to_internet(
-    patch_modules, mocker
+def run_idle(cm, seconds):
+    """returns the wakeups per minute of a connection manager while the
+    network doesn't change"""
+    cm.start()
+    assert wait_for_condition(lambda: cm.wakeups == 1)
+    start = time()
+    sleep(seconds)
+    wakeups = cm.wakeups - 1
+    elapsed = time() - start
+    cm.stop()
+    return wakeups * 60 / elapsed
+
+
+def test_connection_manager_wakeups_per_minute_at_idle(patch_modules, mocker, tmp_path):
+    mocker.patch(
+        "pt_os_web_portal.connection_manager.get_address_for_connected_device",
+        return_value="",
+    )
+    mocker.patch(
+        "pt_os_web_portal.connection_manager.get_ap_mode_status",
+        return_value={},
+    )
+    mocker.patch("pt_os_web_portal.connection_manager.post_event")
+
+    from pt_os_web_portal.connection_manager import ConnectionManager
+    from pt_os_web_portal.network_monitor import NetworkChangeMonitor
+
+    mocker.patch.object(ConnectionManager, "SLEEP_TIME", 0.05)
+    polling_wakeups = run_idle(ConnectionManager(wait_for_network_changes=False), 1)
+
+    cm = ConnectionManager()
+    cm._network_monitor = NetworkChangeMonitor(lease_directories=[str(tmp_path)])
+    if not cm._network_monitor.open():
+        pytest.skip("rtnetlink and inotify are not available")
+    cm._network_monitor.close()
+    event_driven_wakeups = run_idle(cm, 1)
+
+    assert polling_wakeups > 100
+    assert event_driven_wakeups < polling_wakeups / 10
+
+
+def test_connection_manager_checks_again_when_leases_change(
+    patch_modules, mocker, tmp_path
 ):
     mocker.patch(
         "pt_os_web_portal.connection_manager.get_address_for_connected_device",
@@ -122,36 +160,122 @@ def test_connection_manager_triggers_event_on_connection_to_internet(
         "pt_os_web_portal.connection_manager.get_ap_mode_status",
         return_value={},
     )
+    post_event_mock = mocker.patch("pt_os_web_portal.connection_manager.post_event")
+
+    from pt_os_web_portal.connection_manager import AppEvents, ConnectionManager
+    from pt_os_web_portal.network_monitor import NetworkChangeMonitor
+
+    cm = ConnectionManager()
+    cm._network_monitor = NetworkChangeMonitor(lease_directories=[str(tmp_path)])
+    cm.start()
+    assert wait_for_condition(lambda: cm.wakeups == 1)
+    if cm._network_monitor._inotify_fd is None:
+        cm.stop()
+        pytest.skip("inotify is not available")
+
+    # Changes in other files are ignored
+    (tmp_path / "NetworkManager.state").write_text("[main]")
+    sleep(0.5)
+    assert cm.wakeups == 1
+
     mocker.patch(
-        "pt_os_web_portal.connection_manager.is_connected_to_internet",
-        return_value=False,
+        "pt_os_web_portal.connection_manager.get_address_for_connected_device",
+        return_value="192.168.64.1",
     )
-    post_event_mock = mocker.patch(
-        "pt_os_web_portal.connection_manager.post_event",
+    (tmp_path / "dnsmasq-wlan_ap0.leases").write_text(
+        "1700000000 aa:bb:cc:dd:ee:ff 192.168.64.1 laptop *\n"
     )
-    sleep_mocker = SleepMocker()
-    sleep_patch = mocker.patch(
-        "pt_os_web_portal.connection_manager.sleep", side_effect=sleep_mocker.sleep
+    assert wait_for_condition(lambda: cm.wakeups == 2)
+    post_event_mock.assert_called_once_with(AppEvents.HAS_CONNECTED_DEVICE, True)
+
+    cm.stop()
+
+
+def test_connection_manager_notices_disconnections_without_network_changes(
+    patch_modules, mocker, tmp_path
+):
+    address_mock = mocker.patch(
+        "pt_os_web_portal.connection_manager.get_address_for_connected_device",
+        return_value="192.168.64.1",
+    )
+    mocker.patch(
+        "pt_os_web_portal.connection_manager.get_ap_mode_status",
+        return_value={},
     )
+    post_event_mock = mocker.patch("pt_os_web_portal.connection_manager.post_event")
 
     from pt_os_web_portal.connection_manager import AppEvents, ConnectionManager
+    from pt_os_web_portal.network_monitor import NetworkChangeMonitor
 
     cm = ConnectionManager()
+    cm._network_monitor = NetworkChangeMonitor(lease_directories=[str(tmp_path)])
+    if not cm._network_monitor.open():
+        pytest.skip("rtnetlink and inotify are not available")
+    cm._network_monitor.close()
     cm.start()
+    assert wait_for_condition(lambda: cm.wakeups == 1)
+    post_event_mock.assert_called_once_with(AppEvents.HAS_CONNECTED_DEVICE, True)
 
-    sleep_mocker.wait_until_next_iteration(sleep_patch)
+    # The device leaves without any link, address or lease changes
+    address_mock.return_value = ""
+    start = time()
+    assert wait_for_condition(lambda: post_event_mock.call_count == 2)
+    assert time() - start < 2 * cm.SLEEP_TIME + 1
+    post_event_mock.assert_called_with(AppEvents.HAS_CONNECTED_DEVICE, False)
 
-    # no changes, no events posted
-    assert post_event_mock.call_count == 0
+    cm.stop()
+
+
+def test_network_monitor_wake_before_wait(patch_modules, tmp_path):
+    from pt_os_web_portal.network_monitor import NetworkChangeMonitor
+
+    monitor = NetworkChangeMonitor(lease_directories=[str(tmp_path)])
+    # Before opening the monitor, as when stopping the connection manager
+    # while it starts
+    monitor.wake()
+    if not monitor.open():
+        pytest.skip("rtnetlink and inotify are not available")
+    try:
+        start = time()
+        assert monitor.wait(5) is False
+        assert time() - start < 1
+
+        # Only one call to 'wait' returns for each call to 'wake'
+        assert monitor.wait(0.1) is False
+        monitor.wake()
+        assert monitor.wait(5) is False
+        assert monitor.wait(0.1) is False
+    finally:
+        monitor.close()
 
+
+def test_connection_manager_stops_while_checking(patch_modules, mocker, tmp_path):
     mocker.patch(
-        "pt_os_web_portal.connection_manager.is_connected_to_internet",
-        return_value=True,
+        "pt_os_web_portal.connection_manager.get_address_for_connected_device",
+        return_value="",
     )
-    sleep_mocker.wait_until_next_iteration(sleep_patch)
+    mocker.patch(
+        "pt_os_web_portal.connection_manager.get_ap_mode_status",
+        return_value={},
+    )
+    mocker.patch("pt_os_web_portal.connection_manager.post_event")
 
-    post_event_mock.assert_called_once_with(AppEvents.IS_CONNECTED_TO_INTERNET, True)
+    from pt_os_web_portal.connection_manager import ConnectionManager
+    from pt_os_web_portal.network_monitor import NetworkChangeMonitor
 
-    cm._stop = True
-    sleep_mocker.sleep_event.set()
+    cm = ConnectionManager()
+    cm._network_monitor = NetworkChangeMonitor(lease_directories=[str(tmp_path)])
+    checking = Event()
+
+    def slow_check():
+        checking.set()
+        sleep(0.2)
+
+    mocker.patch.object(cm, "_check", side_effect=slow_check)
+    cm.start()
+    assert checking.wait(5)
+
+    # Stopping before the manager waits for network changes
+    start = time()
     cm.stop()
+    assert time() - start < 5
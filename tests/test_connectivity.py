@@ -0,0 +1,113 @@
+from threading import Event, Thread
+
+from tests.utils import wait_for_condition
+
+
+def test_posts_event_only_when_connectivity_changes(patch_modules, mocker):
+    probe_mock = mocker.patch(
+        "pt_os_web_portal.connectivity.is_connected_to_internet",
+        side_effect=[False, False, True, True],
+    )
+    post_event_mock = mocker.patch("pt_os_web_portal.connectivity.post_event")
+
+    from pt_os_web_portal.connectivity import AppEvents, ConnectivityProbe
+
+    probe = ConnectivityProbe()
+    results = [probe.is_connected(max_age=0) for _ in range(4)]
+
+    assert results == [False, False, True, True]
+    assert probe_mock.call_count == 4
+    # Starting offline isn't a change
+    assert [c.args for c in post_event_mock.call_args_list] == [
+        (AppEvents.IS_CONNECTED_TO_INTERNET, True),
+    ]
+
+
+def test_reads_cached_result_within_max_age(patch_modules, mocker):
+    probe_mock = mocker.patch(
+        "pt_os_web_portal.connectivity.is_connected_to_internet", return_value=True
+    )
+    mocker.patch("pt_os_web_portal.connectivity.post_event")
+
+    from pt_os_web_portal.connectivity import ConnectivityProbe
+
+    probe = ConnectivityProbe()
+    for _ in range(10):
+        assert probe.is_connected(max_age=60) is True
+
+    probe_mock.assert_called_once()
+    assert probe.checked_at is not None
+
+
+def test_concurrent_callers_share_a_single_probe(patch_modules, mocker):
+    probe_event = Event()
+    probe_mock = mocker.patch(
+        "pt_os_web_portal.connectivity.is_connected_to_internet",
+        side_effect=lambda: probe_event.wait(5),
+    )
+    mocker.patch("pt_os_web_portal.connectivity.post_event")
+
+    from pt_os_web_portal.connectivity import ConnectivityProbe
+
+    probe = ConnectivityProbe()
+    results = []
+    threads = [
+        Thread(target=lambda: results.append(probe.is_connected(max_age=60)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+
+    wait_for_condition(lambda: probe_mock.call_count == 1)
+    probe_event.set()
+    for t in threads:
+        t.join()
+
+    probe_mock.assert_called_once()
+    assert results == [True] * 5
+
+
+def test_probe_interval_backs_off_while_result_does_not_change(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.connectivity.is_connected_to_internet",
+        side_effect=[False, False, True, True, True, False],
+    )
+    mocker.patch("pt_os_web_portal.connectivity.post_event")
+
+    from pt_os_web_portal.connectivity import ConnectivityProbe
+
+    probe = ConnectivityProbe(interval=1, max_interval=4, max_offline_interval=2)
+    stop_mock = mocker.Mock()
+    stop_mock.is_set.side_effect = [False] * 6 + [True]
+    probe._stop = stop_mock
+
+    probe._main()
+
+    # Backs off less while offline
+    waits = [c.args[0] for c in stop_mock.wait.call_args_list]
+    assert waits == [2, 2, 1, 2, 4, 1]
+
+
+def test_wait_until_connected(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.connectivity.is_connected_to_internet",
+        side_effect=[False, False, True],
+    )
+    mocker.patch("pt_os_web_portal.connectivity.post_event")
+
+    from pt_os_web_portal.connectivity import ConnectivityProbe
+
+    probe = ConnectivityProbe(interval=0.01)
+    assert probe.wait_until_connected(timeout=5) is True
+
+
+def test_wait_until_connected_times_out(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.connectivity.is_connected_to_internet", return_value=False
+    )
+    mocker.patch("pt_os_web_portal.connectivity.post_event")
+
+    from pt_os_web_portal.connectivity import ConnectivityProbe
+
+    probe = ConnectivityProbe(interval=0.01)
+    assert probe.wait_until_connected(timeout=0.1) is False
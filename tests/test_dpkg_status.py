@@ -0,0 +1,103 @@
+from os import utime
+from time import perf_counter
+
+import pytest
+
+status_file_content = """Package: pt-os-web-portal
+Status: install ok installed
+Priority: optional
+Version: 1.2.3
+Description: pi-topOS Web Portal
+ pi-topOS's web portal.
+
+Package: removed-package
+Status: deinstall ok config-files
+Version: 0.1.0
+
+Package: held-package
+Status: hold ok installed
+Version: 2.0.0-1
+"""
+
+
+def status_file_with_packages(path, count):
+    paragraphs = [
+        f"Package: package-{i}\nStatus: install ok installed\n"
+        f"Priority: optional\nVersion: {i}.0.0\nDescription: package {i}\n"
+        for i in range(count)
+    ]
+    path.write_text("\n".join(paragraphs))
+    return str(path)
+
+
+def test_parse_dpkg_status_only_includes_installed_packages(patch_modules):
+    from pt_os_web_portal.dpkg_status import parse_dpkg_status
+
+    assert parse_dpkg_status(status_file_content) == {
+        "pt-os-web-portal": "1.2.3",
+        "held-package": "2.0.0-1",
+    }
+
+
+def test_installed_version(patch_modules, tmp_path):
+    from pt_os_web_portal.dpkg_status import installed_version
+
+    status_file = tmp_path / "status"
+    status_file.write_text(status_file_content)
+
+    assert installed_version("pt-os-web-portal", str(status_file)) == "1.2.3"
+    assert installed_version("removed-package", str(status_file)) is None
+    assert installed_version("unknown-package", str(status_file)) is None
+
+
+def test_installed_version_without_status_file(patch_modules, tmp_path):
+    from pt_os_web_portal.dpkg_status import installed_version
+
+    assert installed_version("pt-os-web-portal", str(tmp_path / "status")) is None
+
+
+def test_status_file_is_parsed_again_only_when_it_changes(
+    patch_modules, mocker, tmp_path
+):
+    from pt_os_web_portal import dpkg_status
+
+    parse_spy = mocker.spy(dpkg_status, "parse_dpkg_status")
+    status_file = tmp_path / "status"
+    status_file.write_text(status_file_content)
+
+    for _ in range(3):
+        dpkg_status.installed_version("pt-os-web-portal", str(status_file))
+    assert parse_spy.call_count == 1
+
+    status_file.write_text(status_file_content.replace("1.2.3", "1.2.4"))
+    utime(status_file, (0, 0))
+    assert dpkg_status.installed_version("pt-os-web-portal", str(status_file)) == (
+        "1.2.4"
+    )
+    assert parse_spy.call_count == 2
+
+
+@pytest.mark.benchmark
+def test_benchmark_lookup_against_apt_cache(patch_modules, tmp_path):
+    from pt_os_web_portal.dpkg_status import installed_version
+
+    # A pi-topOS image has around 2000 installed packages
+    status_file = status_file_with_packages(tmp_path / "status", 2000)
+
+    start = perf_counter()
+    assert installed_version("package-1999", status_file) == "1999.0.0"
+    first_lookup = perf_counter() - start
+
+    start = perf_counter()
+    for _ in range(100):
+        installed_version("package-1999", status_file)
+    cached_lookup = (perf_counter() - start) / 100
+
+    assert cached_lookup < first_lookup
+
+    apt = pytest.importorskip("apt")
+    start = perf_counter()
+    apt.Cache().get("dpkg")
+    apt_cache_lookup = perf_counter() - start
+
+    assert first_lookup < apt_cache_lookup
@@ -1,5 +1,11 @@
+from threading import Event
+from time import sleep, time
 from unittest.mock import Mock
 
+import pytest
+
+from tests.utils import wait_for_condition
+
 
 def test_event_supports_multiple_subscribers(patch_modules):
     from pt_os_web_portal.event import AppEvents, subscribe, subscribers
@@ -32,3 +38,201 @@ def test_subscribes_callables_only(patch_modules):
     subscribe(AppEvents.OS_UPDATER_PREPARE, lambda x: x)
 
     assert len(subscribers[AppEvents.OS_UPDATER_PREPARE]) == 1
+
+
+@pytest.fixture
+def async_dispatch(patch_modules, monkeypatch):
+    from pt_os_web_portal import event
+
+    monkeypatch.setattr(event, "subscribers", dict())
+    monkeypatch.setattr(event, "stats", dict())
+    monkeypatch.setattr(event, "queues", dict())
+    event.start_async_dispatch()
+    yield event
+    event.stop_async_dispatch()
+
+
+def test_async_dispatch_does_not_block_poster(async_dispatch):
+    from pt_os_web_portal.event import AppEvents, post_event, subscribe
+
+    release = Event()
+    slow = Mock(side_effect=lambda data: release.wait(5))
+    fast = Mock()
+    subscribe(AppEvents.OS_UPDATE_SOURCES, slow, subscriber="slow")
+    subscribe(AppEvents.OS_UPDATE_SOURCES, fast, subscriber="fast")
+
+    start = time()
+    post_event(AppEvents.OS_UPDATE_SOURCES, "started")
+    assert time() - start < 1
+
+    # Other subscribers don't wait for the slow one
+    assert wait_for_condition(lambda: fast.call_count == 1)
+    assert wait_for_condition(lambda: slow.call_count == 1)
+    assert not release.is_set()
+    release.set()
+    slow.assert_called_once_with("started")
+
+
+def test_async_dispatch_uses_a_bounded_pool(async_dispatch):
+    from pt_os_web_portal.event import (
+        DISPATCH_WORKERS,
+        AppEvents,
+        post_event,
+        subscribe,
+    )
+
+    release = Event()
+    running = []
+
+    def slow(data):
+        running.append(data)
+        release.wait(5)
+
+    for i in range(DISPATCH_WORKERS + 2):
+        subscribe(AppEvents.OS_UPDATE_SOURCES, slow, subscriber=f"slow-{i}")
+
+    post_event(AppEvents.OS_UPDATE_SOURCES, "started")
+    assert wait_for_condition(lambda: len(running) == DISPATCH_WORKERS)
+    sleep(0.1)
+    assert len(running) == DISPATCH_WORKERS
+
+    release.set()
+    assert wait_for_condition(lambda: len(running) == DISPATCH_WORKERS + 2)
+
+
+def test_async_dispatch_keeps_order_per_subscriber(async_dispatch):
+    from pt_os_web_portal.event import AppEvents, post_event, subscribe
+
+    received = []
+    subscribe(AppEvents.BACKGROUND_JOB, lambda data: received.append(data))
+
+    for i in range(50):
+        post_event(AppEvents.BACKGROUND_JOB, i)
+
+    assert wait_for_condition(lambda: len(received) == 50)
+    assert received == list(range(50))
+
+
+def test_async_dispatch_coalesces_state_events(async_dispatch):
+    from pt_os_web_portal.event import (
+        AppEvents,
+        dispatch_stats,
+        post_event,
+        subscribe,
+    )
+
+    release = Event()
+    received = []
+
+    def slow_subscriber(data):
+        received.append(data)
+        release.wait(5)
+
+    subscribe(AppEvents.IS_CONNECTED_TO_INTERNET, slow_subscriber)
+
+    post_event(AppEvents.IS_CONNECTED_TO_INTERNET, True)
+    assert wait_for_condition(lambda: received == [True])
+    for value in (False, True, False):
+        post_event(AppEvents.IS_CONNECTED_TO_INTERNET, value)
+    release.set()
+
+    assert wait_for_condition(lambda: len(received) == 2)
+    assert received == [True, False]
+    stats = dispatch_stats()["IS_CONNECTED_TO_INTERNET"]
+    assert stats["delivered"] == 2
+    assert stats["coalesced"] == 2
+    assert stats["max_latency"] > 0
+
+
+def test_async_dispatch_isolates_subscriber_errors(async_dispatch):
+    from pt_os_web_portal.event import AppEvents, post_event, subscribe
+
+    failing = Mock(side_effect=Exception("oops"))
+    working = Mock()
+    subscribe(AppEvents.OS_UPDATER_UPGRADE, failing)
+    subscribe(AppEvents.OS_UPDATER_UPGRADE, working)
+
+    post_event(AppEvents.OS_UPDATER_UPGRADE, "started")
+    post_event(AppEvents.OS_UPDATER_UPGRADE, "success")
+
+    assert wait_for_condition(lambda: working.call_count == 2)
+    assert wait_for_condition(lambda: failing.call_count == 2)
+
+
+def test_async_dispatch_keeps_order_across_event_types(async_dispatch):
+    from pt_os_web_portal.event import AppEvents, post_event, subscribe
+
+    release = Event()
+    received = []
+
+    def on_event(name, data):
+        received.append((name, data))
+        release.wait(5)
+
+    for event_type in (
+        AppEvents.AP_HAS_SSID,
+        AppEvents.AP_HAS_PASSPHRASE,
+        AppEvents.OS_UPDATER_PREPARE,
+        AppEvents.OS_UPDATER_UPGRADE,
+    ):
+        subscribe(
+            event_type,
+            lambda data, name=event_type.name: on_event(name, data),
+            subscriber="onboarding",
+        )
+
+    # Keep the subscriber busy, so that the next events are all queued
+    post_event(AppEvents.OS_UPDATER_PREPARE, "started")
+    assert wait_for_condition(lambda: len(received) == 1)
+    for i in range(3):
+        post_event(AppEvents.AP_HAS_SSID, f"ssid-{i}")
+        post_event(AppEvents.AP_HAS_PASSPHRASE, f"passphrase-{i}")
+        post_event(AppEvents.OS_UPDATER_PREPARE, f"prepare-{i}")
+        post_event(AppEvents.OS_UPDATER_UPGRADE, f"upgrade-{i}")
+    release.set()
+
+    assert wait_for_condition(lambda: len(received) == 9)
+    # Coalesced state events keep the place of the first one queued
+    assert received == [
+        ("OS_UPDATER_PREPARE", "started"),
+        ("AP_HAS_SSID", "ssid-2"),
+        ("AP_HAS_PASSPHRASE", "passphrase-2"),
+        ("OS_UPDATER_PREPARE", "prepare-0"),
+        ("OS_UPDATER_UPGRADE", "upgrade-0"),
+        ("OS_UPDATER_PREPARE", "prepare-1"),
+        ("OS_UPDATER_UPGRADE", "upgrade-1"),
+        ("OS_UPDATER_PREPARE", "prepare-2"),
+        ("OS_UPDATER_UPGRADE", "upgrade-2"),
+    ]
+
+
+def test_subscribers_default_to_the_module_of_the_callback(patch_modules):
+    from pt_os_web_portal.event import AppEvents, subscribe, subscribers
+
+    def callback(data):
+        pass
+
+    subscribe(AppEvents.USER_SKIPPED_CONNECTION_GUIDE, callback)
+
+    assert subscribers[AppEvents.USER_SKIPPED_CONNECTION_GUIDE][-1].subscriber == (
+        __name__
+    )
+
+
+def test_restart_events_are_delivered_synchronously_after_queued_events(
+    async_dispatch,
+):
+    from pt_os_web_portal.event import AppEvents, post_event, subscribe
+
+    received = []
+    subscribe(
+        AppEvents.BACKGROUND_JOB,
+        lambda data: (sleep(0.01), received.append(data)),
+    )
+    subscribe(AppEvents.RESTARTING_WEB_PORTAL, lambda data: received.append(data))
+
+    for i in range(5):
+        post_event(AppEvents.BACKGROUND_JOB, i)
+    post_event(AppEvents.RESTARTING_WEB_PORTAL, "restarting")
+
+    assert received == [0, 1, 2, 3, 4, "restarting"]
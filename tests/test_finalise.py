@@ -1,9 +1,13 @@
 from enum import Enum
+from threading import Barrier
+from time import perf_counter, sleep
 from unittest.mock import call
 
+import pytest
 from flask import json
 
 from tests.data.finalise_data import available_space, available_space_out
+from tests.utils import wait_for_jobs
 
 
 class DeviceNameMock(Enum):
@@ -109,11 +113,33 @@ def test_reboot_success(app, mocker):
     )
 
     response = app.post("/reboot")
+    wait_for_jobs()
     run_mock.assert_called_once_with("reboot")
     assert response.status_code == 200
     assert response.data == b"OK"
 
 
+def test_reboot_waits_for_background_jobs_without_blocking_request(app, mocker):
+    from threading import Event
+
+    from pt_os_web_portal.backend.helpers.jobs import job_queue
+
+    run_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.finalise.run_command_background",
+        return_value=0,
+    )
+    release = Event()
+    job_queue.submit("locale", release.wait, 5)
+
+    response = app.post("/reboot")
+    assert response.status_code == 200
+    run_mock.assert_not_called()
+
+    release.set()
+    wait_for_jobs()
+    run_mock.assert_called_once_with("reboot")
+
+
 def test_restore_files(app, mocker):
     run_mock = mocker.patch("pt_os_web_portal.backend.helpers.finalise.run_command")
 
@@ -240,3 +266,177 @@ def test_disable_ap_response_on_failure(app, mocker):
     run_mock.assert_called_once_with(
         "/usr/bin/wifi-ap-sta disable", check=False, timeout=20
     )
+
+
+def fake_steps(mocker, *steps):
+    from pt_os_web_portal.backend.helpers.finalise import FinaliseStep
+
+    mocker.patch.dict(
+        "pt_os_web_portal.backend.helpers.finalise.FINALISE_STEPS",
+        {name: FinaliseStep(name, fn, after) for name, fn, after in steps},
+        clear=True,
+    )
+    return mocker.patch("pt_os_web_portal.backend.helpers.finalise.post_event")
+
+
+def test_finalise_steps_run_concurrently_after_their_dependencies(app, mocker):
+    from pt_os_web_portal.backend.helpers.finalise import run_finalise_steps
+    from pt_os_web_portal.backend.helpers.jobs import JobStatus
+
+    # Only passed if both steps run at the same time
+    barrier = Barrier(2, timeout=5)
+    order = []
+
+    def step(name, wait=False):
+        def fn():
+            if wait:
+                barrier.wait()
+            order.append(name)
+
+        return fn
+
+    fake_steps(
+        mocker,
+        ("a", step("a", wait=True), ()),
+        ("b", step("b", wait=True), ()),
+        ("c", step("c"), ("a",)),
+        ("d", step("d"), ("b", "c", "not-run")),
+    )
+
+    statuses = run_finalise_steps(["d", "c", "b", "a"])
+
+    assert sorted(order) == ["a", "b", "c", "d"]
+    assert order.index("c") > order.index("a")
+    assert order[-1] == "d"
+    assert statuses == {name: JobStatus.SUCCESS for name in "abcd"}
+
+
+def test_failed_finalise_step_does_not_stop_the_others(app, mocker):
+    from pt_os_web_portal.backend.helpers.finalise import run_finalise_steps
+    from pt_os_web_portal.event import AppEvents
+
+    after_failed_step = mocker.Mock()
+    post_event_mock = fake_steps(
+        mocker,
+        ("a", mocker.Mock(side_effect=Exception("Couldn't do it")), ()),
+        ("b", after_failed_step, ("a",)),
+    )
+
+    with pytest.raises(Exception, match="Finalise steps failed: a"):
+        run_finalise_steps(["a", "b"])
+    after_failed_step.assert_called_once()
+
+    events = [c.args for c in post_event_mock.call_args_list]
+    assert all(event_type == AppEvents.FINALISE_STEP for event_type, _ in events)
+    assert [(data["name"], data["status"]) for _, data in events] == [
+        ("a", "QUEUED"),
+        ("b", "QUEUED"),
+        ("a", "RUNNING"),
+        ("a", "FAILED"),
+        ("b", "RUNNING"),
+        ("b", "SUCCESS"),
+    ]
+    assert events[3][1]["error"] == "Couldn't do it"
+
+
+def test_finalise_takes_as_long_as_the_longest_chain(app, mocker):
+    from pt_os_web_portal.backend.helpers.finalise import (
+        DEFAULT_FINALISE_STEPS,
+        run_finalise_steps,
+    )
+
+    command_duration = 0.2
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.finalise.run_command",
+        side_effect=lambda *args, **kwargs: sleep(command_duration),
+    )
+    mocker.patch("pt_os_web_portal.backend.helpers.finalise.post_event")
+    mocker.patch("pt_os_web_portal.backend.helpers.finalise.state")
+    mocker.patch("pt_os_web_portal.backend.helpers.finalise.remove")
+
+    start = perf_counter()
+    run_finalise_steps(DEFAULT_FINALISE_STEPS)
+    elapsed = perf_counter() - start
+
+    # Restoring files runs 3 commands, and configuring the landing page or
+    # deprioritising the openbox session run 1 after it; one by one, the
+    # steps run 9 commands
+    assert elapsed < 6 * command_duration
+
+
+def test_finalise_route(app, mocker):
+    run_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.finalise.run_command", return_value=""
+    )
+    post_event_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.finalise.post_event"
+    )
+    mocker.patch("pt_os_web_portal.backend.helpers.finalise.state")
+    mocker.patch("pt_os_web_portal.backend.helpers.finalise.remove")
+
+    response = app.post(
+        "/finalise",
+        json={"steps": ["enable_further_link_service", "disable_ap_mode"]},
+    )
+    assert response.status_code == 200
+    assert "jobId" in json.loads(response.data)
+    wait_for_jobs()
+
+    assert [c.args[0] for c in run_mock.call_args_list] == [
+        "systemctl enable further-link",
+        "/usr/bin/wifi-ap-sta disable",
+    ]
+    assert post_event_mock.call_args_list[-1].args[1] == {
+        "name": "disable_ap_mode",
+        "status": "SUCCESS",
+        "error": "",
+    }
+
+    # Without a body, the steps of the frontend are run
+    run_mock.reset_mock()
+    assert app.post("/finalise").status_code == 200
+    wait_for_jobs()
+    assert "systemctl enable pt-miniscreen" in [
+        c.args[0] for c in run_mock.call_args_list
+    ]
+
+
+def test_finalise_reports_failed_commands(app, mocker):
+    from subprocess import CalledProcessError
+
+    from pt_os_web_portal.backend.helpers.finalise import run_finalise_steps
+
+    def run_command(cmd, **kwargs):
+        if "pt-eeprom" in cmd and kwargs.get("check", True):
+            raise CalledProcessError(1, cmd)
+        # Restoring files that were already restored fails too
+        if cmd.startswith(("rsync", "rm")):
+            raise CalledProcessError(1, cmd)
+        return ""
+
+    run_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.finalise.run_command",
+        side_effect=run_command,
+    )
+    post_event_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.finalise.post_event"
+    )
+
+    with pytest.raises(Exception, match="Finalise steps failed: update_eeprom$"):
+        run_finalise_steps(["update_eeprom", "restore_files"])
+
+    run_mock.assert_any_call(
+        "/usr/lib/pt-os-notify-services/pt-eeprom -f", timeout=10, check=True
+    )
+    finished = {
+        data["name"]: data["status"]
+        for _, data in (c.args for c in post_event_mock.call_args_list)
+        if data["status"] in ("SUCCESS", "FAILED")
+    }
+    assert finished == {"update_eeprom": "FAILED", "restore_files": "SUCCESS"}
+
+
+def test_finalise_route_invalid_steps(app):
+    assert app.post("/finalise", json={"steps": ["reboot"]}).status_code == 400
+    assert app.post("/finalise", json={"steps": "restore_files"}).status_code == 422
+    assert app.post("/finalise", json={"steps": [{}]}).status_code == 422
@@ -0,0 +1,113 @@
+from threading import Event
+
+from flask import json
+
+from tests.utils import wait_for_condition, wait_for_jobs
+
+
+def test_job_runs_in_background(patch_modules):
+    from pt_os_web_portal.backend.helpers.jobs import JobQueue, JobStatus
+
+    queue = JobQueue()
+    run_event = Event()
+    job = queue.submit("resource", run_event.wait, 5)
+
+    wait_for_condition(lambda: job.status == JobStatus.RUNNING)
+    assert queue.get(job.id) is job
+    assert queue.wait(timeout=0.1) is False
+
+    run_event.set()
+    assert queue.wait(timeout=5)
+    assert job.status == JobStatus.SUCCESS
+    assert job.to_dict() == {
+        "id": job.id,
+        "resource": "resource",
+        "status": "SUCCESS",
+        "error": "",
+        "supersededBy": "",
+    }
+
+
+def test_pending_job_is_superseded_by_newer_job(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.jobs import JobQueue, JobStatus
+
+    queue = JobQueue()
+    run_event = Event()
+    fn = mocker.Mock(side_effect=lambda value: run_event.wait(5))
+
+    running = queue.submit("resource", fn, 1)
+    wait_for_condition(lambda: fn.call_count == 1)
+    superseded = queue.submit("resource", fn, 2)
+    latest = queue.submit("resource", fn, 3)
+
+    assert superseded.status == JobStatus.SUPERSEDED
+    assert superseded.superseded_by == latest.id
+
+    run_event.set()
+    assert queue.wait(timeout=5)
+    assert [c.args[0] for c in fn.call_args_list] == [1, 3]
+    assert running.status == JobStatus.SUCCESS
+    assert latest.status == JobStatus.SUCCESS
+    assert queue.latest("resource") is latest
+
+
+def test_jobs_for_different_resources_run_concurrently(patch_modules):
+    from pt_os_web_portal.backend.helpers.jobs import JobQueue, JobStatus
+
+    queue = JobQueue()
+    run_event = Event()
+    first = queue.submit("first", run_event.wait, 5)
+    second = queue.submit("second", run_event.wait, 5)
+
+    wait_for_condition(
+        lambda: first.status == JobStatus.RUNNING and second.status == JobStatus.RUNNING
+    )
+    run_event.set()
+    assert queue.wait(timeout=5)
+
+
+def test_failed_job_reports_error(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.jobs import JobQueue, JobStatus
+
+    queue = JobQueue()
+    job = queue.submit("resource", mocker.Mock(side_effect=Exception("oops")))
+
+    assert queue.wait(timeout=5)
+    assert job.status == JobStatus.FAILED
+    assert job.error == "oops"
+
+
+def test_finished_jobs_are_pruned(patch_modules):
+    from pt_os_web_portal.backend.helpers.jobs import JobQueue
+
+    queue = JobQueue(max_finished_jobs=2)
+    jobs = []
+    for i in range(4):
+        jobs.append(queue.submit(f"resource-{i}", lambda: None))
+        assert queue.wait(timeout=5)
+
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[-1].id) is jobs[-1]
+
+
+def test_job_status_route(app, mocker):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.timezone.run_command",
+        return_value="",
+    )
+
+    response = app.post("/set-timezone", json={"timezone": "America/Santiago"})
+    job_id = json.loads(response.data)["jobId"]
+    wait_for_jobs()
+
+    job_response = app.get(f"/jobs/{job_id}")
+    assert job_response.status_code == 200
+    job = json.loads(job_response.data)
+    assert job["id"] == job_id
+    assert job["resource"] == "timezone"
+    assert job["status"] == "SUCCESS"
+
+
+def test_job_status_route_unknown_job(app):
+    response = app.get("/jobs/unknown")
+    assert response.status_code == 404
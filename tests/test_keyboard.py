@@ -1,11 +1,13 @@
+from threading import Event
+
 from flask import json
 
-from tests.data.keyboard_data import (
-    keyboard_code_list,
-    keyboard_current,
-    keyboard_query_data,
-    keyboard_variants_list,
-)
+from tests.data.keyboard_data import keyboard_code_list, keyboard_variants_list
+from tests.utils import wait_for_condition, wait_for_jobs
+
+
+def wait_until_configured():
+    wait_for_jobs()
 
 
 def test_list_keyboard_codes_correct_format(app):
@@ -23,22 +25,16 @@ def test_list_keyboard_variants_correct_format(app):
 
 
 def test_current_keyboard(app, mocker):
-    run_mock = mocker.patch(
-        "pt_os_web_portal.backend.helpers.keyboard.run_command",
-        return_value=keyboard_query_data,
-    )
+    run_mock = mocker.patch("pt_os_web_portal.backend.helpers.keyboard.run_command")
 
     response = app.get("/current-keyboard-layout")
     body = json.loads(response.data)
-    run_mock.assert_called_once_with(
-        "setxkbmap -query",
-        timeout=10,
-    )
+    run_mock.assert_not_called()
     assert response.status_code == 200
-    assert body == keyboard_current
+    assert body == {"layout": "us", "variant": None}
 
 
-def test_set_keyboard_layout_success(app, mocker):
+def test_set_keyboard_layout_success(app, mocker, restore_files):
     valid_keyboard_layout = "ad"
     run_mock = mocker.patch(
         "pt_os_web_portal.backend.helpers.keyboard.run_command",
@@ -48,13 +44,14 @@ def test_set_keyboard_layout_success(app, mocker):
     successful_response = app.post(
         "/set-keyboard-layout", json={"layout": valid_keyboard_layout}
     )
+    wait_until_configured()
     run_mock.assert_called_once_with(
         f"raspi-config nonint do_configure_keyboard {valid_keyboard_layout}",
         timeout=30,
         capture_output=False,
     )
     assert successful_response.status_code == 200
-    assert successful_response.data == b"OK"
+    assert "jobId" in json.loads(successful_response.data)
 
 
 def test_set_keyboard_layout_failure_wrong_type(app):
@@ -72,9 +69,128 @@ def test_set_keyboard_layout_invalid_code(app, mocker, restore_files):
     no_locale_found_error = app.post(
         "/set-keyboard-layout", json={"layout": "fake-layout"}
     )
+    wait_until_configured()
     run_mock.assert_called_once_with(
         "raspi-config nonint do_configure_keyboard fake-layout",
         timeout=30,
         capture_output=False,
     )
     assert no_locale_found_error.status_code == 200
+
+
+def test_keyboard_layout_responses_are_serialized_once(app, mocker):
+    from pt_os_web_portal.backend.helpers import keyboard
+
+    load_spy = mocker.spy(keyboard, "jload")
+    dumps_spy = mocker.spy(keyboard, "jdumps")
+
+    for _ in range(3):
+        codes_response = app.get("/list-keyboard-layout-codes")
+        variants_response = app.get("/list-keyboard-layout-variants")
+
+    assert json.loads(codes_response.data) == keyboard_code_list
+    assert json.loads(variants_response.data) == keyboard_variants_list
+    assert load_spy.call_count == 1
+    assert dumps_spy.call_count == 2
+
+
+def test_set_keyboard_layout_returns_before_system_is_configured(
+    app, mocker, restore_files
+):
+    configure_event = Event()
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.keyboard.run_command",
+        side_effect=lambda *args, **kwargs: configure_event.wait(5),
+    )
+
+    response = app.post("/set-keyboard-layout", json={"layout": "gb", "variant": "mac"})
+    assert response.status_code == 200
+
+    # The configuration file is already updated
+    current = json.loads(app.get("/current-keyboard-layout").data)
+    assert current == {"layout": "gb", "variant": "mac"}
+
+    status = json.loads(app.get("/keyboard-layout-status").data)
+    assert status == {
+        "layout": "gb",
+        "variant": "mac",
+        "configuring": True,
+        "error": "",
+    }
+
+    configure_event.set()
+    wait_until_configured()
+
+    status = json.loads(app.get("/keyboard-layout-status").data)
+    assert status["configuring"] is False
+
+
+def test_set_keyboard_layout_applies_only_last_pending_layout(
+    app, mocker, restore_files
+):
+    configure_event = Event()
+    run_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.keyboard.run_command",
+        side_effect=lambda *args, **kwargs: configure_event.wait(5),
+    )
+
+    app.post("/set-keyboard-layout", json={"layout": "gb"})
+    wait_for_condition(lambda: run_mock.call_count == 1)
+    for layout in ("fr", "de", "es"):
+        app.post("/set-keyboard-layout", json={"layout": layout})
+
+    configure_event.set()
+    wait_until_configured()
+
+    assert [c.args[0] for c in run_mock.call_args_list] == [
+        "raspi-config nonint do_configure_keyboard gb",
+        "raspi-config nonint do_configure_keyboard es",
+    ]
+
+
+def test_keyboard_layout_status_reports_errors(app, mocker, restore_files):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.keyboard.run_command",
+        side_effect=Exception("raspi-config failed"),
+    )
+
+    app.post("/set-keyboard-layout", json={"layout": "gb"})
+    wait_until_configured()
+
+    status = json.loads(app.get("/keyboard-layout-status").data)
+    assert status["configuring"] is False
+    assert status["error"] == "raspi-config failed"
+
+
+def test_keyboard_configuration_is_read_only_when_it_changes(
+    app, mocker, restore_files
+):
+    from pt_os_web_portal.backend.helpers import keyboard
+
+    mocker.patch("pt_os_web_portal.backend.helpers.keyboard.run_command")
+    parse_spy = mocker.spy(keyboard, "parse_keyboard_conf")
+
+    for _ in range(3):
+        app.get("/current-keyboard-layout")
+    assert parse_spy.call_count == 1
+
+    app.post("/set-keyboard-layout", json={"layout": "gb"})
+    wait_until_configured()
+    current = json.loads(app.get("/current-keyboard-layout").data)
+    assert current == {"layout": "gb", "variant": None}
+    assert parse_spy.call_count == 2
+
+
+def test_current_keyboard_without_configuration_file(app, mocker, tmp_path):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.keyboard.default_keyboard_conf",
+        return_value=str(tmp_path / "keyboard"),
+    )
+
+    response = app.get("/current-keyboard-layout")
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"layout": "", "variant": None}
+
+    (tmp_path / "keyboard").write_text('XKBLAYOUT="gb"\nXKBVARIANT=""\n')
+    response = app.get("/current-keyboard-layout")
+    assert json.loads(response.data) == {"layout": "gb", "variant": None}
@@ -1,6 +1,8 @@
+import pytest
 from flask import json
 
 from tests.data.locale_data import default_locale, formatted_locales
+from tests.utils import wait_for_jobs
 
 
 def test_list_locales_supported_gets_correct_formats(app):
@@ -26,13 +28,14 @@ def test_set_locale_success(app, mocker):
     successful_response = app.post(
         "/set-locale", json={"locale_code": valid_locale_code}
     )
+    wait_for_jobs()
     run_mock.assert_called_once_with(
         f"raspi-config nonint do_change_locale {valid_locale_code}.UTF-8",
         timeout=30,
         capture_output=False,
     )
     assert successful_response.status_code == 200
-    assert successful_response.data == b"OK"
+    assert "jobId" in json.loads(successful_response.data)
 
 
 def test_set_locale_failure_wrong_type(app):
@@ -45,3 +48,97 @@ def test_set_locale_failure_invalid_code(app):
         "/set-locale", json={"locale_code": "fake-locale-code"}
     )
     assert no_locale_found_error.status_code == 400
+
+
+def quadratic_list_locales_supported(file_path):
+    # Previous implementation, kept as a benchmark reference
+    with open(file_path) as file:
+        utf8_locales = list()
+        for line in (line.rstrip() for line in file):
+            if line[0] != "@" and ".UTF-8" in line:
+                locale_code = line.split(".UTF-8")[0]
+                if not any(locale == locale_code for locale in utf8_locales):
+                    utf8_locales.append(locale_code)
+        return utf8_locales
+
+
+def test_locale_catalogue_removes_repeats_keeping_order(patch_modules, tmp_path):
+    from pt_os_web_portal.backend.helpers.language import (
+        LocaleCatalogue,
+        parse_supported_locale,
+    )
+
+    supported = tmp_path / "SUPPORTED"
+    supported.write_text(
+        "en_GB.UTF-8 UTF-8\nen_GB ISO-8859-1\nen_US.UTF-8 UTF-8\n"
+        "en_GB.UTF-8@euro UTF-8\n@invalid.UTF-8 UTF-8\n\n"
+    )
+    catalogue = LocaleCatalogue(lambda: str(supported), parse_supported_locale)
+
+    assert catalogue.locales() == ["en_GB", "en_US"]
+    assert "en_US" in catalogue
+    assert "fr_FR" not in catalogue
+
+
+def test_locale_catalogue_is_parsed_again_only_when_file_changes(
+    patch_modules, mocker, tmp_path
+):
+    from os import utime
+
+    from pt_os_web_portal.backend.helpers.language import (
+        LocaleCatalogue,
+        parse_supported_locale,
+    )
+
+    supported = tmp_path / "SUPPORTED"
+    supported.write_text("en_GB.UTF-8 UTF-8\n")
+    parse_mock = mocker.Mock(side_effect=parse_supported_locale)
+    catalogue = LocaleCatalogue(lambda: str(supported), parse_mock)
+
+    for _ in range(3):
+        assert catalogue.locales() == ["en_GB"]
+    assert parse_mock.call_count == 1
+
+    supported.write_text("en_GB.UTF-8 UTF-8\nen_US.UTF-8 UTF-8\n")
+    utime(supported, (0, 0))
+    assert catalogue.locales() == ["en_GB", "en_US"]
+
+
+@pytest.mark.benchmark
+def test_benchmark_locale_catalogue_against_quadratic_parsing(patch_modules):
+    from os import path
+    from time import perf_counter
+
+    from pt_os_web_portal.backend.helpers.language import (
+        LocaleCatalogue,
+        parse_supported_locale,
+        read_locales,
+    )
+    from pt_os_web_portal.backend.helpers.paths import get_test_file_path
+
+    # Use the system file if available, the mocked one is a copy of it
+    supported = "/usr/share/i18n/SUPPORTED"
+    if not path.isfile(supported):
+        supported = get_test_file_path("SUPPORTED")
+
+    runs = 20
+    start = perf_counter()
+    for _ in range(runs):
+        expected = quadratic_list_locales_supported(supported)
+    quadratic_time = (perf_counter() - start) / runs
+
+    start = perf_counter()
+    for _ in range(runs):
+        read_locales.cache_clear()
+        catalogue = LocaleCatalogue(lambda: supported, parse_supported_locale)
+        assert catalogue.locales() == expected
+    parse_time = (perf_counter() - start) / runs
+
+    start = perf_counter()
+    for _ in range(runs):
+        assert "en_GB" in catalogue
+        catalogue.locales()
+    cached_time = (perf_counter() - start) / runs
+
+    assert parse_time < quadratic_time
+    assert cached_time < parse_time
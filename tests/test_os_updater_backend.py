@@ -0,0 +1,373 @@
+import sys
+from os import chmod
+from subprocess import CalledProcessError
+from threading import Barrier, Event, Lock, Thread, Timer
+from time import monotonic, sleep
+
+import pytest
+
+from .utils import wait_for_condition
+
+
+@pytest.fixture
+def run_command_mock(patch_modules, mocker):
+    # Estimate sizes with apt-get in every environment
+    mocker.patch.dict(sys.modules, {"apt": None})
+    return mocker.patch("pt_os_web_portal.os_updater.backend.run_command")
+
+
+def commands(run_command_mock):
+    return [c.args[0] for c in run_command_mock.call_args_list]
+
+
+def test_download_stage_is_separate_from_install(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    backend.download(callback=None)
+    assert backend.downloaded is True
+
+    download_cmd = commands(run_command_mock)[-1]
+    assert "--download-only" in download_cmd
+    assert "Acquire::Queue-Mode=host" in download_cmd
+    assert "dist-upgrade" in download_cmd
+
+    backend.upgrade(callback=None)
+    assert backend.downloaded is False
+
+    # Packages were already downloaded, so upgrading doesn't use the network
+    assert len(run_command_mock.call_args_list) == 2
+    install_cmd = commands(run_command_mock)[-1]
+    assert "--no-download" in install_cmd
+    assert "--download-only" not in install_cmd
+    assert "dist-upgrade" in install_cmd
+
+
+def test_upgrade_downloads_before_installing(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    backend.packages = ["pt-os-web-portal"]
+    backend.upgrade(callback=None)
+
+    download_cmd, install_cmd = commands(run_command_mock)
+    assert "--download-only" in download_cmd
+    assert "pt-os-web-portal" in download_cmd
+    assert "--no-download" in install_cmd
+    assert "pt-os-web-portal" in install_cmd
+
+
+def test_failed_download_does_not_install(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    run_command_mock.side_effect = CalledProcessError(100, "apt-get")
+
+    backend = OsUpdaterBackend()
+    with pytest.raises(CalledProcessError):
+        backend.upgrade(callback=None)
+
+    assert len(run_command_mock.call_args_list) == 1
+    assert "--download-only" in commands(run_command_mock)[0]
+    assert backend.downloaded is False
+    assert backend.lock is False
+
+
+def test_downloaded_packages_are_invalidated(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    backend = OsUpdaterBackend()
+    backend.download(callback=None)
+    backend.update(callback=None)
+    assert backend.downloaded is False
+
+    backend.download(callback=None)
+    backend.stage_upgrade(["pt-os-web-portal"])
+    assert backend.downloaded is False
+
+
+def test_upgrade_progress_covers_download_and_install(run_command_mock, mocker):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+
+    def fake_run_command(cmd, callback, check=True, status_callback=None, **kwargs):
+        if "--download-only" in cmd:
+            status_callback("dlstatus:1:50.0000:Retrieving file 1 of 2")
+            status_callback("dlstatus:2:100.0000:Retrieving file 2 of 2")
+        else:
+            status_callback("pmstatus:python3:50.0000:Installing python3")
+            status_callback("pmstatus:python3:100.0000:Installed python3")
+
+    run_command_mock.side_effect = fake_run_command
+    progress_callback = mocker.Mock()
+
+    backend = OsUpdaterBackend()
+    backend.upgrade(callback=None, progress_callback=progress_callback)
+
+    assert [c.args for c in progress_callback.call_args_list] == [
+        (25.0, "Retrieving file 1 of 2"),
+        (50.0, "Retrieving file 2 of 2"),
+        (75.0, "Installing python3"),
+        (100.0, "Installed python3"),
+    ]
+
+
+def test_download_packages_messages(run_command_mock, os_updater_job_file, mocker):
+    from pt_os_web_portal.os_updater import OSUpdater
+
+    os_updater = OSUpdater()
+    send_mock = mocker.patch.object(os_updater.message_handler, "_send")
+
+    os_updater.download_packages()
+
+    messages = [c.args[0] for c in send_mock.call_args_list]
+    assert {m["type"] for m in messages} == {"OS_DOWNLOAD"}
+    assert messages[0]["payload"]["status"] == "START"
+    assert messages[-1]["payload"]["status"] == "FINISH"
+    assert os_updater.backend.downloaded is True
+
+
+class ConcurrencyTracker:
+    def __init__(self, duration=0.005):
+        self.duration = duration
+        self.lock = Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+
+    def __call__(self, cmd, callback, **kwargs):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.calls.append(cmd)
+        sleep(self.duration)
+        with self.lock:
+            self.running -= 1
+
+
+def run_threads(targets):
+    threads = [Thread(target=target, daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+
+
+def test_concurrent_operations_are_rejected(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import (
+        OsUpdaterBackend,
+        OsUpdaterBackendBusy,
+    )
+
+    tracker = ConcurrencyTracker(duration=0.05)
+    run_command_mock.side_effect = tracker
+    backend = OsUpdaterBackend()
+    barrier = Barrier(32)
+    results = []
+
+    def start():
+        barrier.wait()
+        try:
+            backend.upgrade(callback=None)
+            results.append("ok")
+        except OsUpdaterBackendBusy as e:
+            results.append(str(e))
+
+    run_threads([start] * 32)
+
+    assert tracker.max_running == 1
+    assert len(results) == 32
+    assert 1 <= results.count("ok") < 32
+    assert set(results) == {"ok", "OsUpdaterBackend is locked"}
+    assert backend.lock is False
+
+
+def test_hammer_queued_operations(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import (
+        OsUpdaterBackend,
+        OsUpdaterBackendBusy,
+    )
+
+    tracker = ConcurrencyTracker()
+    run_command_mock.side_effect = tracker
+    backend = OsUpdaterBackend()
+    results = []
+
+    def operation(i):
+        method = (backend.update, backend.download, backend.upgrade)[i % 3]
+        timeout = (None, 0.0, 0.01, 5)[i % 4]
+        try:
+            method(callback=None, timeout=timeout)
+            results.append("ok")
+        except OsUpdaterBackendBusy:
+            results.append("rejected")
+
+    run_threads([lambda i=i: operation(i) for i in range(200)])
+
+    assert tracker.max_running == 1
+    assert len(results) == 200
+    assert "ok" in results
+    assert backend.wait_until_idle(timeout=0)
+    assert backend.queued_operations == 0
+
+
+def test_queued_operations_run_in_order(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import (
+        OsUpdaterBackend,
+        OsUpdaterBackendBusy,
+    )
+    from pt_os_web_portal.os_updater.types import BackendOperation
+
+    backend = OsUpdaterBackend()
+    order = []
+
+    def queued(name):
+        def target():
+            backend.stage_upgrade([name], timeout=None)
+            order.append(name)
+
+        return target
+
+    threads = []
+    with backend._exclusive(BackendOperation.UPDATE, timeout=0):
+        with pytest.raises(OsUpdaterBackendBusy, match="Timed out"):
+            backend.update(callback=None, timeout=0.05)
+        assert backend.queued_operations == 0
+
+        for i in range(backend.MAX_QUEUED_OPERATIONS):
+            thread = Thread(target=queued(f"package-{i}"), daemon=True)
+            thread.start()
+            threads.append(thread)
+            assert wait_for_condition(lambda: backend.queued_operations == i + 1)
+
+        with pytest.raises(OsUpdaterBackendBusy, match="too many queued"):
+            backend.update(callback=None, timeout=None)
+        # A new operation doesn't jump the queue
+        with pytest.raises(OsUpdaterBackendBusy, match="is locked"):
+            backend.update(callback=None)
+
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == [f"package-{i}" for i in range(backend.MAX_QUEUED_OPERATIONS)]
+
+
+def test_wait_until_idle(run_command_mock):
+    from pt_os_web_portal.os_updater.backend import OsUpdaterBackend
+    from pt_os_web_portal.os_updater.types import BackendOperation
+
+    backend = OsUpdaterBackend()
+    assert backend.wait_until_idle(timeout=0) is True
+
+    release = Event()
+
+    def hold():
+        with backend._exclusive(BackendOperation.UPGRADE, timeout=0):
+            release.wait(5)
+
+    thread = Thread(target=hold, daemon=True)
+    thread.start()
+    assert wait_for_condition(lambda: backend.lock)
+
+    start = monotonic()
+    assert backend.wait_until_idle(timeout=0.1) is False
+    assert monotonic() - start >= 0.1
+
+    Timer(0.1, release.set).start()
+    assert backend.wait_until_idle(timeout=5) is True
+    assert backend.operation is None
+
+
+def test_stop_waits_for_running_operation(run_command_mock, os_updater_job_file):
+    from pt_os_web_portal.os_updater import OSUpdater
+    from pt_os_web_portal.os_updater.types import BackendOperation
+
+    os_updater = OSUpdater()
+    os_updater.STOP_LOG_INTERVAL = 0.05
+    finished = []
+
+    def hold():
+        with os_updater.backend._exclusive(BackendOperation.UPGRADE, timeout=0):
+            sleep(0.3)
+            finished.append(True)
+
+    thread = Thread(target=hold, daemon=True)
+    thread.start()
+    assert wait_for_condition(lambda: os_updater.backend.lock)
+
+    os_updater.stop()
+    assert finished == [True]
+
+
+def test_cancel_terminates_apt_command(patch_modules, tmp_path, mocker):
+    mocker.patch.dict(sys.modules, {"apt": None})
+    from pt_os_web_portal.os_updater.backend import (
+        AptCommands,
+        OperationCancelled,
+        OsUpdaterBackend,
+    )
+
+    apt_get = tmp_path / "apt-get"
+    apt_get.write_text(f"#!{sys.executable}\nimport time\ntime.sleep(30)\n")
+    chmod(apt_get, 0o755)
+    mocker.patch.object(AptCommands, "update", return_value=[str(apt_get), "update"])
+
+    backend = OsUpdaterBackend()
+    assert backend.cancel() is False
+
+    errors = []
+
+    def update():
+        try:
+            backend.update(callback=None)
+        except Exception as e:
+            errors.append(e)
+
+    thread = Thread(target=update, daemon=True)
+    thread.start()
+    assert wait_for_condition(lambda: backend._process is not None)
+
+    start = monotonic()
+    assert backend.cancel() is True
+    thread.join(timeout=5)
+    assert monotonic() - start < 5
+
+    assert len(errors) == 1
+    assert isinstance(errors[0], OperationCancelled)
+    assert backend.lock is False
+
+    # Cancelling doesn't affect the next operation
+    mocker.patch.object(AptCommands, "update", return_value=["true"])
+    backend.update(callback=None)
+
+
+def test_cancel_does_not_interrupt_install(run_command_mock, mocker):
+    from pt_os_web_portal.os_updater.backend import (
+        OperationCancelled,
+        OsUpdaterBackend,
+    )
+
+    backend = OsUpdaterBackend()
+    process = mocker.Mock()
+
+    def fake_run_command(cmd, callback, process_callback=None, **kwargs):
+        process_callback(process)
+        if "--no-download" in cmd:
+            assert backend.cancel() is True
+
+    run_command_mock.side_effect = fake_run_command
+    backend.downloaded = True
+    backend.upgrade(callback=None)
+
+    process.terminate.assert_not_called()
+
+    # Cancelled before installing
+    def cancel_while_downloading(cmd, callback, process_callback=None, **kwargs):
+        process_callback(process)
+        backend.cancel()
+
+    run_command_mock.reset_mock()
+    run_command_mock.side_effect = cancel_while_downloading
+    with pytest.raises(OperationCancelled):
+        backend.upgrade(callback=None)
+
+    process.terminate.assert_called_once()
+    assert not any("--no-download" in cmd for cmd in commands(run_command_mock))
@@ -2,8 +2,12 @@ from json import loads as jloads
 from threading import Thread
 from unittest.mock import MagicMock
 
+import pytest
+
 from .data.apt_stdout import apt_update_output, apt_upgrade_output
 
+pytestmark = pytest.mark.usefixtures("os_updater_job_file")
+
 
 def mock_apt_output(mocker, stdout, returncode):
     context_mock = MagicMock()
@@ -47,7 +51,7 @@ def test_send_error_message_when_locked(patch_modules, mocker):
     os_updater = OSUpdater()
     ws_mock = WsMock()
     # Register WS client with app
-    os_updater.state(ws_mock)
+    os_updater.message_handler.register_client(ws_mock)
 
     for method in ["update_sources", "stage_packages", "start_os_upgrade"]:
         method_reference = getattr(os_updater, method)
@@ -57,6 +61,7 @@ def test_send_error_message_when_locked(patch_modules, mocker):
 
         # Call method again to make sure the updater is locked
         method_reference(ws_mock)
+        os_updater.message_handler.flush(timeout=5)
 
         # Find the error message
         error_message = {}
@@ -104,10 +109,11 @@ def test_send_status_messages_on_update(patch_modules, mocker):
     os_updater = OSUpdater()
 
     ws_mock = WsMock()
-    os_updater.state(ws_mock)
+    os_updater.message_handler.register_client(ws_mock)
     ws_mock.messages.clear()
 
     os_updater.update_sources(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
 
     assert len(ws_mock.messages) >= 1
     assert ws_mock.messages[0].get("type") == "UPDATE_SOURCES"
@@ -127,10 +133,11 @@ def test_send_start_finish_messages_on_update_sources(patch_modules, mocker):
 
     os_updater = OSUpdater()
     ws_mock = WsMock()
-    os_updater.state(ws_mock)
+    os_updater.message_handler.register_client(ws_mock)
     ws_mock.messages.clear()
 
     os_updater.update_sources(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
 
     assert len(ws_mock.messages) >= 1
     assert ws_mock.messages[0].get("type") == "UPDATE_SOURCES"
@@ -157,10 +164,11 @@ def test_send_start_finish_messages_on_upgrade(patch_modules, mocker):
     os_updater = OSUpdater()
 
     ws_mock = WsMock()
-    os_updater.state(ws_mock)
+    os_updater.message_handler.register_client(ws_mock)
     ws_mock.messages.clear()
 
     os_updater.start_os_upgrade(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
 
     assert len(ws_mock.messages) >= 1
     assert ws_mock.messages[0].get("type") == "OS_UPGRADE"
@@ -185,10 +193,11 @@ def test_send_start_finish_messages_on_stage_packages(patch_modules, mocker):
     os_updater = OSUpdater()
 
     ws_mock = WsMock()
-    os_updater.state(ws_mock)
+    os_updater.message_handler.register_client(ws_mock)
     ws_mock.messages.clear()
 
     os_updater.stage_packages(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
 
     assert len(ws_mock.messages) >= 1
     assert ws_mock.messages[0].get("type") == "OS_PREPARE_UPGRADE"
@@ -200,6 +209,29 @@ def test_send_start_finish_messages_on_stage_packages(patch_modules, mocker):
     assert ws_mock.messages[-1].get("payload", {}).get("percent") == 100.0
 
 
+def test_stage_web_portal_stages_installed_dependencies(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.updater.installed_packages",
+        return_value={"pt-os-web-portal": "1.2.3", "python3-flask": "2.0.1"},
+    )
+    from pt_os_web_portal.os_updater import OSUpdater
+
+    os_updater = OSUpdater()
+    # 'python3-gevent | python3-eventlet' lists both alternatives
+    mocker.patch.object(
+        os_updater,
+        "get_package_dependencies",
+        return_value=["python3-flask", "python3-gevent", "python3-eventlet"],
+    )
+    stage_mock = mocker.patch.object(os_updater, "stage_packages")
+
+    os_updater.stage_web_portal()
+
+    stage_mock.assert_called_once_with(
+        None, packages=["pt-os-web-portal", "python3-flask"]
+    )
+
+
 def test_download_size_format(patch_modules, mocker):
     mock_apt_output(mocker, stdout=apt_update_output, returncode=0)
 
@@ -212,10 +244,11 @@ def test_download_size_format(patch_modules, mocker):
     os_updater = OSUpdater()
 
     ws_mock = WsMock()
-    os_updater.state(ws_mock)
+    os_updater.message_handler.register_client(ws_mock)
 
     # After instantiation, we don't know if there's an upgrade
     os_updater.upgrade_size(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
     assert ws_mock.messages[-1].get("type") == "SIZE"
     assert ws_mock.messages[-1].get("payload", {}).get("status") == "STATUS"
     assert ws_mock.messages[-1].get("payload", {}).get("size").get("downloadSize") == 0
@@ -225,6 +258,7 @@ def test_download_size_format(patch_modules, mocker):
     os_updater.update_sources(ws_mock)
     os_updater.stage_packages(ws_mock)
     os_updater.upgrade_size(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
 
     assert (
         ws_mock.messages[-1].get("payload", {}).get("size").get("downloadSize")
@@ -0,0 +1,147 @@
+import json
+from threading import Event, current_thread
+from unittest.mock import Mock
+
+import pytest
+
+from .utils import wait_for_condition
+
+
+def responses(os_updater, ws):
+    return [
+        (c.args[1]["payload"]["id"], c.args[1]["payload"]["status"])
+        for c in os_updater.message_handler.send_to.call_args_list
+        if c.args[0] is ws
+    ]
+
+
+@pytest.fixture
+def executor(patch_modules):
+    from pt_os_web_portal.os_updater.command_executor import UpdaterCommandExecutor
+
+    executor = UpdaterCommandExecutor(Mock())
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.mark.parametrize(
+    "message,expected",
+    [
+        ("state", ("state", None)),
+        (" start\n", ("start", None)),
+        ('{"command": "start", "id": "1"}', ("start", "1")),
+        ('{"command": "size", "id": 7}', ("size", "7")),
+        ('{"command": "size"}', ("size", None)),
+    ],
+)
+def test_parse_command(patch_modules, message, expected):
+    from pt_os_web_portal.os_updater.command_executor import parse_command
+
+    assert parse_command(message) == expected
+
+
+@pytest.mark.parametrize("message", ["{", '{"id": "1"}', '{"command": 1}'])
+def test_parse_invalid_command(patch_modules, message):
+    from pt_os_web_portal.os_updater.command_executor import parse_command
+
+    with pytest.raises(ValueError):
+        parse_command(message)
+
+
+def test_responses_are_correlated_to_request_ids(executor):
+    ws = Mock()
+    future = executor.submit(ws, json.dumps({"command": "state", "id": "abc"}))
+    future.result(timeout=5)
+
+    executor.os_updater.state.assert_called_once_with(ws)
+    assert wait_for_condition(lambda: len(responses(executor.os_updater, ws)) == 2)
+    assert responses(executor.os_updater, ws) == [("abc", "QUEUED"), ("abc", "DONE")]
+
+
+def test_plain_commands_get_no_responses(executor):
+    ws = Mock()
+    executor.submit(ws, "size").result(timeout=5)
+    assert executor.submit(ws, "unknown") is None
+
+    executor.os_updater.upgrade_size.assert_called_once_with(ws)
+    executor.os_updater.message_handler.send_to.assert_not_called()
+
+
+def test_unknown_and_failed_commands(executor):
+    ws = Mock()
+    assert executor.submit(ws, '{"command": "reboot", "id": "1"}') is None
+
+    executor.os_updater.state.side_effect = Exception("broken")
+    future = executor.submit(ws, '{"command": "state", "id": "2"}')
+    with pytest.raises(Exception):
+        future.result(timeout=5)
+
+    assert wait_for_condition(lambda: len(responses(executor.os_updater, ws)) == 3)
+    assert responses(executor.os_updater, ws) == [
+        ("1", "REJECTED"),
+        ("2", "QUEUED"),
+        ("2", "ERROR"),
+    ]
+
+
+def test_shared_commands_are_deduplicated(executor):
+    release = Event()
+    executor.os_updater.update_sources.side_effect = lambda ws: release.wait(5)
+
+    clients = [Mock() for _ in range(3)]
+    futures = [
+        executor.submit(ws, json.dumps({"command": "update_sources", "id": str(i)}))
+        for i, ws in enumerate(clients)
+    ]
+    assert futures[0] is futures[1] is futures[2]
+    assert executor.in_flight() == ["update_sources"]
+
+    release.set()
+    futures[0].result(timeout=5)
+
+    executor.os_updater.update_sources.assert_called_once_with(clients[0])
+    # Subscribers receive the progress messages sent to every client
+    register_client = executor.os_updater.message_handler.register_client
+    assert [c.args[0] for c in register_client.call_args_list] == clients[1:]
+
+    for i, ws in enumerate(clients):
+        assert wait_for_condition(lambda: len(responses(executor.os_updater, ws)) == 2)
+        status = "QUEUED" if i == 0 else "SUBSCRIBED"
+        assert responses(executor.os_updater, ws) == [
+            (str(i), status),
+            (str(i), "DONE"),
+        ]
+
+    # Once finished, the command can run again
+    assert wait_for_condition(lambda: executor.in_flight() == [])
+    executor.submit(clients[0], "update_sources").result(timeout=5)
+    assert executor.os_updater.update_sources.call_count == 2
+
+
+def test_commands_run_in_a_bounded_pool(executor):
+    release = Event()
+    threads = set()
+
+    def state(ws):
+        threads.add(current_thread().name)
+        release.wait(5)
+
+    executor.os_updater.state.side_effect = state
+
+    ws = Mock()
+    futures = [
+        executor.submit(ws, json.dumps({"command": "state", "id": str(i)}))
+        for i in range(100)
+    ]
+    accepted = [f for f in futures if f is not None]
+    # Commands are pending until a worker picks them up
+    max_accepted = executor.MAX_WORKERS + executor.MAX_PENDING_COMMANDS
+    assert executor.MAX_PENDING_COMMANDS <= len(accepted) <= max_accepted
+
+    rejected = [r for r in responses(executor.os_updater, ws) if r[1] == "REJECTED"]
+    assert len(rejected) == 100 - len(accepted)
+
+    release.set()
+    for future in accepted:
+        future.result(timeout=5)
+    assert len(threads) <= executor.MAX_WORKERS
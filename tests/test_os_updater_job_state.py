@@ -0,0 +1,246 @@
+import json
+from subprocess import run
+
+import pytest
+
+
+class WsMock:
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    def send(self, data):
+        self.messages.append(json.loads(data))
+
+
+def dead_pid():
+    # The shell has exited by the time its pid is read
+    return int(run(["sh", "-c", "echo $$"], capture_output=True).stdout)
+
+
+def write_job(job_file, **fields):
+    data = {
+        "phase": "OS_UPGRADE",
+        "status": "RUNNING",
+        "percent": 42.0,
+        "packages": ["pt-os-web-portal"],
+        "versions": {"pt-os-web-portal": "1.0.0"},
+        "downloadSize": 1000,
+        "requiredSpace": 2000,
+        "log": ["Unpacking pt-os-web-portal (2.0.0) ..."],
+        "result": "",
+        "pid": dead_pid(),
+        "updatedAt": 0,
+    }
+    data.update(fields)
+    job_file.write_text(json.dumps(data))
+
+
+def test_job_state_is_persisted(patch_modules, tmp_path, mocker):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.installed_version",
+        return_value="1.0.0",
+    )
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.current_boot_id",
+        return_value="boot-1",
+    )
+    from pt_os_web_portal.os_updater.job_state import JobStatus, UpdaterJobState
+    from pt_os_web_portal.os_updater.types import EventNames, MessageType
+
+    job_file = tmp_path / "job.json"
+    job = UpdaterJobState(str(job_file))
+    job.record(
+        EventNames.OS_PREPARE_UPGRADE,
+        MessageType.START,
+        "Preparing OS upgrade",
+        0.0,
+        packages=["pt-os-web-portal"],
+    )
+    job.set_sizes(1000, 2000)
+    job.record(EventNames.OS_PREPARE_UPGRADE, MessageType.STATUS, "a\nb", 50.0)
+    job.record(EventNames.OS_PREPARE_UPGRADE, MessageType.FINISH, "Done", 100.0)
+
+    restored = UpdaterJobState(str(job_file))
+    assert restored.phase == "OS_PREPARE_UPGRADE"
+    assert restored.status == JobStatus.FINISHED
+    assert restored.packages == ["pt-os-web-portal"]
+    assert restored.versions == {"pt-os-web-portal": "1.0.0"}
+    assert restored.download_size == 1000
+    assert restored.required_space == 2000
+    assert list(restored.log) == ["a", "b"]
+    assert restored.result == "Done"
+    assert restored.boot_id == "boot-1"
+    assert restored.recovered is False
+
+    # Finished jobs aren't replayed
+    assert restored.replay_messages() == []
+
+
+def test_log_tail_is_bounded(patch_modules, tmp_path):
+    from pt_os_web_portal.os_updater.job_state import UpdaterJobState
+    from pt_os_web_portal.os_updater.types import EventNames, MessageType
+
+    job = UpdaterJobState(str(tmp_path / "job.json"))
+    job.record(EventNames.OS_UPGRADE, MessageType.START, "Starting", 0.0)
+    for i in range(200):
+        job.record(EventNames.OS_UPGRADE, MessageType.STATUS, f"line {i}", 0.0)
+
+    assert len(job.log) == UpdaterJobState.LOG_TAIL_LINES
+    assert job.log[-1] == "line 199"
+
+
+def test_interrupted_upgrade_that_installed_packages_finished(
+    patch_modules, tmp_path, mocker
+):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.installed_version",
+        return_value="2.0.0",
+    )
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.dpkg_was_interrupted",
+        return_value=False,
+    )
+    from pt_os_web_portal.os_updater.job_state import JobStatus, UpdaterJobState
+
+    job_file = tmp_path / "job.json"
+    write_job(job_file)
+
+    job = UpdaterJobState(str(job_file))
+    assert job.status == JobStatus.FINISHED
+    assert job.recovered is True
+
+    assert [
+        (m["type"], m["payload"]["status"], m["payload"]["percent"])
+        for m in job.replay_messages()
+    ] == [
+        ("OS_UPGRADE", "START", 0.0),
+        ("OS_UPGRADE", "STATUS", 100.0),
+        ("OS_UPGRADE", "FINISH", 100.0),
+    ]
+    # Only replayed once
+    assert job.replay_messages() == []
+
+    # The recovered result is saved
+    assert json.loads(job_file.read_text())["status"] == JobStatus.FINISHED
+
+
+@pytest.mark.parametrize(
+    "phase,installed,dpkg_interrupted",
+    [
+        ("OS_UPGRADE", "1.0.0", False),
+        ("OS_UPGRADE", "2.0.0", True),
+        ("OS_PREPARE_UPGRADE", "2.0.0", False),
+    ],
+)
+def test_interrupted_jobs_failed(
+    patch_modules, tmp_path, mocker, phase, installed, dpkg_interrupted
+):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.installed_version",
+        return_value=installed,
+    )
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.dpkg_was_interrupted",
+        return_value=dpkg_interrupted,
+    )
+    from pt_os_web_portal.os_updater.job_state import JobStatus, UpdaterJobState
+
+    job_file = tmp_path / "job.json"
+    write_job(job_file, phase=phase)
+
+    job = UpdaterJobState(str(job_file))
+    assert job.status == JobStatus.FAILED
+    assert [m["payload"]["status"] for m in job.replay_messages()] == [
+        "START",
+        "STATUS",
+        "ERROR",
+    ]
+
+
+@pytest.mark.parametrize("same_boot,is_running", [(True, True), (False, False)])
+def test_pids_of_another_boot_are_not_running(
+    patch_modules, tmp_path, mocker, same_boot, is_running
+):
+    from os import getppid
+
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.installed_version",
+        return_value="1.0.0",
+    )
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.current_boot_id",
+        return_value="boot-1",
+    )
+    from pt_os_web_portal.os_updater.job_state import JobStatus, UpdaterJobState
+
+    job_file = tmp_path / "job.json"
+    # A running process, that after a reboot can be an unrelated one
+    write_job(job_file, pid=getppid(), bootId="boot-1" if same_boot else "boot-0")
+
+    job = UpdaterJobState(str(job_file))
+    assert (job.status == JobStatus.RUNNING) is is_running
+    assert job.recovered is not is_running
+
+
+def test_state_replays_interrupted_job(patch_modules, os_updater_job_file, mocker):
+    mocker.patch(
+        "pt_os_web_portal.os_updater.job_state.installed_version",
+        return_value="1.0.0",
+    )
+    write_job(os_updater_job_file)
+    from pt_os_web_portal.os_updater import OSUpdater
+
+    os_updater = OSUpdater()
+    ws_mock = WsMock()
+    os_updater.state(ws_mock)
+    os_updater.message_handler.flush(timeout=5)
+
+    assert [m["type"] for m in ws_mock.messages] == ["STATE", "REPLAY"]
+    replayed = ws_mock.messages[1]["payload"]["messages"]
+    assert [(m["type"], m["payload"]["status"]) for m in replayed] == [
+        ("OS_UPGRADE", "START"),
+        ("OS_UPGRADE", "STATUS"),
+        ("OS_UPGRADE", "ERROR"),
+    ]
+    assert replayed[1]["payload"]["message"] == "Unpacking pt-os-web-portal (2.0.0) ..."
+
+
+def test_state_replays_running_job(patch_modules, os_updater_job_file, mocker):
+    from pt_os_web_portal.os_updater import OSUpdater
+    from pt_os_web_portal.os_updater.types import (
+        BackendOperation,
+        EventNames,
+        MessageType,
+    )
+
+    os_updater = OSUpdater()
+    mocker.patch.object(os_updater.message_handler, "_send")
+
+    def upgrade(callback, progress_callback, **kwargs):
+        callback("Unpacking python3 ...")
+
+        # A client connects while upgrading
+        ws_mock = WsMock()
+        os_updater.state(ws_mock)
+        os_updater.message_handler.flush(timeout=5)
+        assert [m["type"] for m in ws_mock.messages] == ["STATE", "REPLAY"]
+        replayed = ws_mock.messages[1]["payload"]["messages"]
+        assert [(m["type"], m["payload"]["status"]) for m in replayed] == [
+            ("OS_UPGRADE", "START"),
+            ("OS_UPGRADE", "STATUS"),
+        ]
+        assert replayed[1]["payload"]["message"] == "Unpacking python3 ..."
+
+    mocker.patch.object(os_updater.backend, "upgrade", side_effect=upgrade)
+    os_updater.start_os_upgrade()
+
+    assert os_updater.job.status == "FINISHED"
+    assert json.loads(os_updater_job_file.read_text())["result"] == "Finished upgrade"
+
+    # A call made while the updater is busy doesn't replace the job
+    with os_updater.backend._exclusive(BackendOperation.UPDATE, timeout=0):
+        callback = os_updater._tracked(EventNames.OS_PREPARE_UPGRADE, mocker.Mock())
+        callback(MessageType.START, "Preparing OS upgrade", 0.0)
+        callback(MessageType.ERROR, "OsUpdaterBackend is locked", 0.0)
+    assert os_updater.job.status == "FINISHED"
@@ -0,0 +1,161 @@
+import json
+import logging
+from time import process_time
+
+import pytest
+
+from tests.data.apt_stdout import apt_upgrade_output
+
+
+def test_lines_are_written_in_batches(patch_modules, tmp_path, mocker):
+    from pt_os_web_portal.os_updater.log_sink import UpdaterLogSink
+
+    mocker.patch.object(UpdaterLogSink, "FLUSH_INTERVAL", 60)
+    log_file = tmp_path / "updater" / "os-updater.log"
+    sink = UpdaterLogSink(str(log_file))
+
+    command_log = sink.command(["apt-get", "update"])
+    command_log.write("Hit:1 http://deb.debian.org/debian bullseye InRelease")
+    command_log.write("Reading package lists...")
+    # Still buffered
+    assert log_file.read_text() == ""
+
+    command_log.close()
+    assert log_file.read_text().splitlines() == [
+        "$ apt-get update",
+        "Hit:1 http://deb.debian.org/debian bullseye InRelease",
+        "Reading package lists...",
+    ]
+
+
+def test_ndjson_format(patch_modules, tmp_path):
+    from pt_os_web_portal.os_updater.log_sink import LogFormat, UpdaterLogSink
+
+    log_file = tmp_path / "os-updater.log"
+    sink = UpdaterLogSink(str(log_file), log_format=LogFormat.NDJSON)
+    command_log = sink.command(["apt-get", "dist-upgrade"])
+    command_log.write("Unpacking python3 ...")
+    command_log.close()
+
+    records = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [(r["command"], r["line"]) for r in records] == [
+        ("apt-get dist-upgrade", "$ apt-get dist-upgrade"),
+        ("apt-get dist-upgrade", "Unpacking python3 ..."),
+    ]
+    assert all(isinstance(r["time"], float) for r in records)
+
+
+def test_log_file_is_rotated(patch_modules, tmp_path):
+    from pt_os_web_portal.os_updater.log_sink import UpdaterLogSink
+
+    log_file = tmp_path / "os-updater.log"
+    sink = UpdaterLogSink(str(log_file), max_bytes=100, backup_count=2)
+    command_log = sink.command(["apt-get", "update"])
+    for i in range(100):
+        command_log.write(f"line {i}")
+    command_log.close()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "os-updater.log",
+        "os-updater.log.1",
+        "os-updater.log.2",
+    ]
+    for p in tmp_path.iterdir():
+        assert len(p.read_bytes()) <= 100
+    assert log_file.read_text().splitlines()[-1] == "line 99"
+
+
+def test_journal_gets_a_sample_of_the_output(patch_modules, tmp_path, caplog):
+    from pt_os_web_portal.os_updater.log_sink import JournalSampling, UpdaterLogSink
+
+    sink = UpdaterLogSink(
+        str(tmp_path / "os-updater.log"), sampling=JournalSampling(head=2, every=10)
+    )
+    with caplog.at_level(logging.INFO):
+        command_log = sink.command(["apt-get", "update"])
+        for i in range(1, 31):
+            command_log.write(f"line {i}")
+        command_log.write("E: Unable to locate package pt-os-web-portal")
+        command_log.close()
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages[:-1] == [
+        "run_command: line 1",
+        "run_command: line 2",
+        "run_command: line 10",
+        "run_command: line 20",
+        "run_command: line 30",
+        "run_command: E: Unable to locate package pt-os-web-portal",
+    ]
+    assert "logged 6 of 31 lines" in messages[-1]
+
+
+def test_unwritable_log_file_is_ignored(patch_modules, tmp_path, caplog):
+    from pt_os_web_portal.os_updater.log_sink import UpdaterLogSink
+
+    not_a_dir = tmp_path / "not-a-directory"
+    not_a_dir.write_text("")
+
+    sink = UpdaterLogSink(str(not_a_dir / "os-updater.log"))
+    command_log = sink.command(["apt-get", "update"])
+    command_log.write("Reading package lists...")
+    command_log.close()
+
+    warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1
+
+
+def test_run_command_writes_output_to_log(patch_modules, tmp_path):
+    from pt_os_web_portal.os_updater.backend import run_command
+    from pt_os_web_portal.os_updater.log_sink import UpdaterLogSink
+
+    log_file = tmp_path / "os-updater.log"
+    lines = []
+    run_command(["printf", "a\\nb\\n"], lines.append, log=UpdaterLogSink(str(log_file)))
+
+    assert lines == ["a", "b"]
+    assert log_file.read_text().splitlines() == ["$ printf a\\nb\\n", "a", "b"]
+
+
+@pytest.mark.benchmark
+def test_benchmark_log_sink_against_logging_every_line(patch_modules, tmp_path):
+    from pt_os_web_portal.os_updater.log_sink import UpdaterLogSink
+
+    lines = [line.strip() for line in apt_upgrade_output.splitlines()] * 200
+
+    # What run_command and the message handler used to do for every line
+    journal = logging.getLogger("test_benchmark_journal")
+    journal.propagate = False
+    journal.setLevel(logging.INFO)
+    handler = logging.FileHandler(tmp_path / "journal.log")
+    journal.addHandler(handler)
+    try:
+        start = process_time()
+        for line in lines:
+            journal.info(f"run_command: {line}")
+            journal.info(f"OS Upgrade: 50.0% '{line}'")
+        per_line_logging = (process_time() - start) / len(lines)
+    finally:
+        journal.removeHandler(handler)
+        handler.close()
+
+    sink = UpdaterLogSink(str(tmp_path / "os-updater.log"))
+    start = process_time()
+    command_log = sink.command(["apt-get", "dist-upgrade"])
+    for line in lines:
+        command_log.write(line)
+    command_log.close()
+    log_sink = (process_time() - start) / len(lines)
+
+    assert log_sink < per_line_logging
+
+
+def test_default_log_file_is_chosen_when_opened(patch_modules, monkeypatch):
+    from pt_os_web_portal.os_updater.log_sink import UpdaterLogSink
+
+    sink = UpdaterLogSink()
+    monkeypatch.delenv("TESTING", raising=False)
+    assert sink.file_path == "/var/log/pt-os-web-portal/os-updater.log"
+
+    monkeypatch.setenv("TESTING", "1")
+    assert sink.file_path == "/tmp/pt-os-web-portal/os-updater.log"
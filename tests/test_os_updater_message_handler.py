@@ -0,0 +1,372 @@
+from json import loads as jloads
+from threading import Event
+from time import time
+
+from .utils import wait_for_condition
+
+
+class WsMock:
+    def __init__(self, send_event=None):
+        self.messages = []
+        self.closed = False
+        self.send_event = send_event
+
+    def send(self, data):
+        if self.send_event:
+            self.send_event.wait(5)
+        self.messages.append(jloads(data))
+
+
+def status_message(line, status="STATUS", message_type="OS_UPGRADE"):
+    return {
+        "type": message_type,
+        "payload": {"status": status, "percent": 0.0, "message": line},
+    }
+
+
+def test_status_lines_are_batched_into_one_frame(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import BufferedClient
+
+    ws = WsMock()
+    client = BufferedClient(ws)
+
+    client.put(status_message("Starting", status="START"))
+    for i in range(100):
+        client.put(status_message(f"line {i}"))
+    client.put(status_message("Finished", status="FINISH"))
+    assert client.wait_until_sent(timeout=5)
+
+    assert [m["payload"]["status"] for m in ws.messages] == [
+        "START",
+        "STATUS",
+        "FINISH",
+    ]
+    assert ws.messages[1]["payload"]["message"].split("\n") == [
+        f"line {i}" for i in range(100)
+    ]
+
+
+def test_batches_are_split_by_message_type(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import BufferedClient
+
+    ws = WsMock()
+    client = BufferedClient(ws)
+
+    client.put(status_message("a", message_type="UPDATE_SOURCES"))
+    client.put(status_message("b", message_type="UPDATE_SOURCES"))
+    client.put(status_message("c", message_type="OS_UPGRADE"))
+    assert client.wait_until_sent(timeout=5)
+
+    assert [(m["type"], m["payload"]["message"]) for m in ws.messages] == [
+        ("UPDATE_SOURCES", "a\nb"),
+        ("OS_UPGRADE", "c"),
+    ]
+
+
+def test_slow_client_does_not_block_producer(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import BufferedClient
+
+    send_event = Event()
+    ws = WsMock(send_event=send_event)
+    client = BufferedClient(ws)
+    client.put(status_message("Starting", status="START"))
+
+    start = time()
+    for i in range(5000):
+        client.put(status_message(f"line {i}", message_type=f"TYPE_{i % 2}"))
+    client.put(status_message("Finished", status="FINISH"))
+    assert time() - start < 2
+
+    assert client.dropped > 0
+    send_event.set()
+    assert client.wait_until_sent(timeout=5)
+
+    statuses = [m["payload"]["status"] for m in ws.messages]
+    assert statuses[0] == "START"
+    assert statuses[-1] == "FINISH"
+    assert len(ws.messages) <= BufferedClient.MAX_QUEUED_MESSAGES + 1
+
+
+def test_handler_removes_closed_clients(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+
+    handler = OSUpdaterFrontendMessageHandler()
+    open_ws = WsMock()
+    closed_ws = WsMock()
+    handler.register_client(open_ws)
+    handler.register_client(closed_ws)
+    closed_ws.closed = True
+
+    handler._send(status_message("line"))
+    handler.flush(timeout=5)
+
+    assert open_ws.messages == [status_message("line")]
+    assert closed_ws.messages == []
+    assert open_ws in handler.clients
+    assert closed_ws not in handler.clients
+
+
+class PingableWsMock(WsMock):
+    OPCODE_PING = 0x9
+
+    def __init__(self, answers_pings=True):
+        super().__init__()
+        self.answers_pings = answers_pings
+        self.pings = 0
+
+    def send_frame(self, payload, opcode):
+        assert opcode == self.OPCODE_PING
+        self.pings += 1
+        if self.answers_pings:
+            # Like geventwebsocket, when reading the pong frame
+            self.handle_pong(None, b"")
+
+    def handle_pong(self, header, payload):
+        pass
+
+
+def test_active_clients_without_network_traffic(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+
+    handler = OSUpdaterFrontendMessageHandler()
+    clients = [PingableWsMock() for _ in range(3)]
+    for ws in clients:
+        handler.register_client(ws)
+    # Registering twice doesn't count twice
+    handler.register_client(clients[0])
+
+    assert handler.active_clients() == 3
+    assert handler.active_clients(exclude=clients[0]) == 2
+    assert handler.active_clients(exclude=WsMock()) == 3
+
+    handler.unregister_client(clients[1])
+    assert handler.active_clients() == 2
+
+    handler.flush(timeout=5)
+    assert all(ws.messages == [] and ws.pings == 0 for ws in clients)
+
+
+def test_state_counts_other_clients(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+    from pt_os_web_portal.os_updater.types import MessageType
+
+    handler = OSUpdaterFrontendMessageHandler()
+    first, second = WsMock(), WsMock()
+    handler.register_client(first)
+    handler.register_client(second)
+
+    handler.create_emit_state_message(first)(MessageType.STATUS, False)
+    handler.flush(timeout=5)
+    assert first.messages[-1]["payload"]["clients"] == 1
+
+    handler.unregister_client(second)
+    handler.create_emit_state_message(first)(MessageType.STATUS, False)
+    handler.flush(timeout=5)
+    assert first.messages[-1]["payload"]["clients"] == 0
+
+
+def test_state_is_queued_after_the_messages_sent_to_the_client(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+    from pt_os_web_portal.os_updater.types import MessageType
+
+    handler = OSUpdaterFrontendMessageHandler()
+    send_event = Event()
+    ws = WsMock(send_event)
+    handler.register_client(ws)
+
+    handler.send_to(ws, status_message("line"))
+    handler.create_emit_state_message(ws)(MessageType.STATUS, False)
+    # Nothing was written to the socket from the caller's thread
+    assert ws.messages == []
+
+    send_event.set()
+    handler.flush(timeout=5)
+    assert [m["type"] for m in ws.messages] == ["OS_UPGRADE", "STATE"]
+
+
+def test_state_does_not_register_the_client(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+    from pt_os_web_portal.os_updater.types import MessageType
+
+    handler = OSUpdaterFrontendMessageHandler()
+    ws = WsMock()
+
+    handler.create_emit_state_message(ws)(MessageType.STATUS, False)
+
+    assert ws.messages[-1]["type"] == "STATE"
+    assert ws not in handler.clients
+
+
+def test_heartbeat_removes_unresponsive_clients(patch_modules, mocker):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+
+    # A heartbeat left by other tests would keep waiting for its interval
+    assert wait_for_condition(
+        lambda: OSUpdaterFrontendMessageHandler.heartbeat_thread is None, timeout=5
+    )
+    mocker.patch.object(OSUpdaterFrontendMessageHandler, "HEARTBEAT_INTERVAL", 0.05)
+    mocker.patch.object(OSUpdaterFrontendMessageHandler, "HEARTBEAT_TIMEOUT", 0.3)
+
+    handler = OSUpdaterFrontendMessageHandler()
+    responsive = PingableWsMock()
+    unresponsive = PingableWsMock(answers_pings=False)
+    closed = PingableWsMock()
+    handler.register_client(responsive)
+    handler.register_client(unresponsive)
+    handler.register_client(closed)
+    closed.closed = True
+
+    assert wait_for_condition(lambda: handler.active_clients() == 1, timeout=5)
+    assert responsive in handler.clients
+    assert responsive.pings > 0
+    assert unresponsive.pings > 0
+
+    # The heartbeat stops once there are no clients
+    handler.unregister_client(responsive)
+    assert wait_for_condition(
+        lambda: OSUpdaterFrontendMessageHandler.heartbeat_thread is None, timeout=5
+    )
+
+
+def test_client_that_fails_is_unregistered(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+
+    class FailingWsMock(WsMock):
+        def send(self, data):
+            raise ConnectionResetError()
+
+    handler = OSUpdaterFrontendMessageHandler()
+    ws = FailingWsMock()
+    handler.register_client(ws)
+    handler.send_to(ws, status_message("line"))
+
+    assert wait_for_condition(lambda: handler.active_clients() == 0, timeout=5)
+
+
+def test_history_is_bounded_in_lines_and_bytes(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import MessageHistory
+
+    history = MessageHistory(max_lines=10, max_bytes=1000)
+    history.add(status_message("Starting", status="START"))
+    for i in range(100):
+        history.add(status_message(f"line {i}"))
+    assert len(history) == 10
+
+    history.add(status_message("x" * 400 + "\n" + "y" * 400 + "\n" + "z" * 400))
+    assert len(history) == 2
+    assert history.size_in_bytes == 800
+
+    # Lines of other phases are kept when a phase finishes
+    history.add(
+        status_message("Updating", status="START", message_type="UPDATE_SOURCES")
+    )
+    history.add(status_message("Hit:1", message_type="UPDATE_SOURCES"))
+    history.add(status_message("Finished", status="FINISH"))
+    assert len(history) == 1
+    assert history.size_in_bytes == len("Hit:1")
+
+
+def test_history_replay_is_compacted(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import MessageHistory
+
+    history = MessageHistory()
+    history.add(
+        status_message("Updating", status="START", message_type="UPDATE_SOURCES")
+    )
+    history.add(status_message("Hit:1", message_type="UPDATE_SOURCES"))
+    history.add(
+        status_message("Finished", status="FINISH", message_type="UPDATE_SOURCES")
+    )
+    # Messages that don't report progress aren't kept
+    history.add({"type": "SIZE", "payload": {"size": 1, "status": "STATUS"}})
+    assert history.replay_messages() == []
+
+    history.add(status_message("Starting", status="START"))
+    for i in range(500):
+        message = status_message(f"line {i}")
+        message["payload"]["percent"] = i / 10
+        history.add(message)
+
+    replayed = history.replay_messages()
+    assert [(m["type"], m["payload"]["status"]) for m in replayed] == [
+        ("OS_UPGRADE", "START"),
+        ("OS_UPGRADE", "STATUS"),
+    ]
+    assert replayed[1]["payload"]["percent"] == 49.9
+    assert replayed[1]["payload"]["message"].split("\n") == [
+        f"line {i}" for i in range(500 - MessageHistory.REPLAY_LINES, 500)
+    ]
+
+    history.add(status_message("Failed", status="ERROR"))
+    assert history.replay_messages() == []
+
+
+def test_late_client_gets_replay_then_live_messages(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import (
+        OSUpdaterFrontendMessageHandler,
+    )
+    from pt_os_web_portal.os_updater.types import MessageType
+
+    handler = OSUpdaterFrontendMessageHandler()
+    first = WsMock()
+    handler.register_client(first)
+    emit = handler.create_emit_os_upgrade_message(first)
+    emit(MessageType.START, "Starting", 0.0)
+    for i in range(10):
+        emit(MessageType.STATUS, f"line {i}", float(i))
+
+    late = WsMock()
+    handler.register_client(late)
+    # Ignored: there's history to replay
+    handler.replay(late, [status_message("stale", status="START")])
+    emit(MessageType.STATUS, "line 10", 10.0)
+    handler.flush(timeout=5)
+
+    assert [m["type"] for m in late.messages] == ["REPLAY", "OS_UPGRADE"]
+    replayed = late.messages[0]["payload"]["messages"]
+    assert [m["payload"]["status"] for m in replayed] == ["START", "STATUS"]
+    assert replayed[1]["payload"]["message"].split("\n") == [
+        f"line {i}" for i in range(10)
+    ]
+    assert late.messages[1]["payload"]["message"] == "line 10"
+
+    # Without history, the given messages are replayed
+    emit(MessageType.FINISH, "Finished", 100.0)
+    handler.replay(late, [status_message("Interrupted", status="ERROR")])
+    handler.flush(timeout=5)
+    assert late.messages[-1]["type"] == "REPLAY"
+    assert late.messages[-1]["payload"]["messages"] == [
+        status_message("Interrupted", status="ERROR")
+    ]
+
+
+def test_progress_updates_do_not_add_lines(patch_modules):
+    from pt_os_web_portal.os_updater.message_handler import BufferedClient
+
+    ws = WsMock()
+    client = BufferedClient(ws)
+    progress = status_message("")
+    progress["payload"]["percent"] = 50.0
+
+    client.put(progress)
+    client.put(status_message("line"))
+    client.put(progress)
+    assert client.wait_until_sent(timeout=5)
+
+    assert [
+        (m["payload"]["percent"], m["payload"]["message"]) for m in ws.messages
+    ] == [(50.0, "line")]
@@ -79,7 +79,7 @@ def test_rover_controller_status_controller_starting(app, mocker):
     )
     # requests.get raises an exception when controller is still starting
     requests_get_mock = mocker.patch(
-        "pt_os_web_portal.backend.routes.requests.get", side_effect=Exception()
+        "pt_os_web_portal.backend.helpers.system.requests.get", side_effect=Exception()
     )
 
     response = app.get("/rover-controller-status")
@@ -101,7 +101,7 @@ def test_rover_controller_status_active(app, mocker):
         return_value="active",
     )
     requests_get_mock = mocker.patch(
-        "pt_os_web_portal.backend.routes.requests.get",
+        "pt_os_web_portal.backend.helpers.system.requests.get",
         return_value=dotdict({"status_code": 200}),
     )
 
@@ -0,0 +1,200 @@
+import gzip
+
+import pytest
+
+hashed_js = "static/js/main.1a2b3c4d.chunk.js"
+hashed_css = "static/css/main.5e6f7a8b.chunk.css"
+bundle_js = "static/js/2.9c8b7a6d.chunk.js"
+bundle_content = "function hello() { return 'hello world'; }\n" * 200
+
+
+@pytest.fixture
+def build_folder(app, tmp_path, monkeypatch):
+    files = {
+        "index.html": "<html></html>",
+        "manifest.json": "{}",
+        hashed_js: "console.log('hi');",
+        hashed_css: "body {}",
+        bundle_js: bundle_content,
+    }
+    for name, content in files.items():
+        file_path = tmp_path / name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+
+    monkeypatch.setattr(app.application, "static_folder", str(tmp_path))
+    yield tmp_path
+
+
+def test_is_fingerprinted_asset(patch_modules):
+    from pt_os_web_portal.backend.static_files import is_fingerprinted_asset
+
+    assert is_fingerprinted_asset(hashed_js)
+    assert is_fingerprinted_asset(hashed_css)
+    assert is_fingerprinted_asset("static/js/2.abcdef12.chunk.js.map")
+    assert is_fingerprinted_asset("static/media/logo.5d5d9eef.svg")
+    assert not is_fingerprinted_asset("index.html")
+    assert not is_fingerprinted_asset("manifest.json")
+    assert not is_fingerprinted_asset("static/js/main.js")
+
+
+@pytest.mark.parametrize("filename", [hashed_js, hashed_css])
+def test_fingerprinted_assets_are_immutable(app, build_folder, filename):
+    response = app.get(f"/{filename}")
+
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "max-age=31536000" in response.headers["Cache-Control"]
+    assert response.headers.get("ETag")
+    assert response.headers.get("Last-Modified")
+
+
+@pytest.mark.parametrize("filename", [hashed_js, "manifest.json"])
+def test_repeat_load_receives_not_modified(app, build_folder, filename):
+    first = app.get(f"/{filename}")
+    etag = first.headers["ETag"]
+
+    second = app.get(f"/{filename}", headers={"If-None-Match": etag})
+
+    assert second.status_code == 304
+    assert second.data == b""
+
+
+def test_repeat_load_with_last_modified_receives_not_modified(app, build_folder):
+    first = app.get("/manifest.json")
+
+    second = app.get(
+        "/manifest.json",
+        headers={"If-Modified-Since": first.headers["Last-Modified"]},
+    )
+
+    assert second.status_code == 304
+
+
+def test_unhashed_assets_are_revalidated(app, build_folder):
+    response = app.get("/manifest.json")
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.headers.get("ETag")
+
+
+@pytest.mark.parametrize("route", ["/", "/index.html", "/non-existant-route"])
+def test_index_is_never_stored(app, build_folder, route):
+    response = app.get(route)
+
+    assert response.status_code == 200
+    assert "no-store" in response.headers["Cache-Control"]
+    assert response.headers.get("ETag") is None
+
+
+def test_api_routes_are_never_stored(app, build_folder):
+    response = app.get("/status")
+
+    assert response.status_code == 200
+    assert "no-store" in response.headers["Cache-Control"]
+    assert response.headers["Pragma"] == "no-cache"
+
+
+def test_precompress_directory_skips_small_files(patch_modules, build_folder):
+    from pt_os_web_portal.backend.precompress import precompress_directory
+
+    created = precompress_directory(str(build_folder))
+
+    assert str(build_folder / f"{bundle_js}.gz") in created
+    assert not (build_folder / f"{hashed_js}.gz").exists()
+    assert gzip.decompress((build_folder / f"{bundle_js}.gz").read_bytes()) == (
+        bundle_content.encode()
+    )
+
+
+def test_serves_precompressed_gzip_file(app, build_folder):
+    from pt_os_web_portal.backend.precompress import precompress_directory
+
+    precompress_directory(str(build_folder))
+    (build_folder / f"{bundle_js}.gz").write_bytes(
+        gzip.compress(b"precompressed content")
+    )
+
+    response = app.get(f"/{bundle_js}", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert "javascript" in response.headers["Content-Type"]
+    assert gzip.decompress(response.data) == b"precompressed content"
+
+
+def test_serves_precompressed_brotli_file_when_accepted(app, build_folder):
+    brotli = pytest.importorskip("brotli")
+    from pt_os_web_portal.backend.precompress import precompress_directory
+
+    precompress_directory(str(build_folder))
+
+    response = app.get(f"/{bundle_js}", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.data) == bundle_content.encode()
+
+
+def test_serves_identity_when_no_encoding_accepted(app, build_folder):
+    response = app.get(f"/{bundle_js}", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.data == bundle_content.encode()
+
+
+def test_compresses_on_the_fly_without_precompressed_file(app, build_folder):
+    from pt_os_web_portal.backend.static_files import compress_file
+
+    compress_file.cache_clear()
+    headers = {"Accept-Encoding": "gzip"}
+
+    first = app.get(f"/{bundle_js}", headers=headers)
+    second = app.get(f"/{bundle_js}", headers=headers)
+
+    for response in (first, second):
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(response.data) == bundle_content.encode()
+    assert compress_file.cache_info().misses == 1
+    assert compress_file.cache_info().hits == 1
+
+
+def test_compressed_on_the_fly_repeat_load_receives_not_modified(app, build_folder):
+    headers = {"Accept-Encoding": "gzip"}
+    first = app.get(f"/{bundle_js}", headers=headers)
+
+    second = app.get(
+        f"/{bundle_js}", headers={**headers, "If-None-Match": first.headers["ETag"]}
+    )
+
+    assert second.status_code == 304
+    assert "immutable" in second.headers["Cache-Control"]
+
+
+def test_serves_precompressed_brotli_file_without_brotli_module(
+    app, build_folder, mocker
+):
+    from pt_os_web_portal.backend.precompress import gzip_compress
+
+    mocker.patch(
+        "pt_os_web_portal.backend.static_files.encoders",
+        return_value={"gzip": gzip_compress},
+    )
+    (build_folder / f"{bundle_js}.br").write_bytes(b"brotli content")
+    headers = {"Accept-Encoding": "gzip, br"}
+
+    response = app.get(f"/{bundle_js}", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.data == b"brotli content"
+
+    # Without a precompressed file, it's compressed on the fly with gzip
+    (build_folder / f"{bundle_js}.br").unlink()
+    response = app.get(f"/{bundle_js}", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == bundle_content.encode()
@@ -0,0 +1,246 @@
+from json import loads as jloads
+from threading import Event
+from time import sleep
+
+from tests.utils import wait_for_condition, wait_for_jobs
+
+
+class WsMock:
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    def send(self, data):
+        self.messages.append(jloads(data))
+
+
+def test_new_client_receives_status_then_deltas(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    stream = StatusStream()
+    mocker.patch.object(stream, "probes", return_value={})
+    ws = WsMock()
+
+    stream.add_client(ws)
+    stream.update("connected", True)
+    stream.update("connected", True)
+    stream.update_item("updater", "upgrade", "started")
+    assert stream.flush(timeout=5)
+    stream.remove_client(ws)
+
+    assert ws.messages == [
+        {
+            "type": "STATUS",
+            "payload": {
+                "connected": False,
+                "hasConnectedDevice": False,
+                "updater": {},
+                "jobs": {},
+                "finalise": {},
+            },
+        },
+        {"type": "STATUS_DELTA", "payload": {"connected": True}},
+        {"type": "STATUS_DELTA", "payload": {"updater": {"upgrade": "started"}}},
+    ]
+
+
+def test_closed_clients_are_removed(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    stream = StatusStream()
+    mocker.patch.object(stream, "probes", return_value={})
+    open_ws = WsMock()
+    closed_ws = WsMock()
+
+    stream.add_client(open_ws)
+    stream.add_client(closed_ws)
+    assert stream.flush(timeout=5)
+    closed_ws.closed = True
+    stream.update("connected", True)
+    assert stream.flush(timeout=5)
+
+    assert len(open_ws.messages) == 2
+    assert len(closed_ws.messages) == 1
+    assert set(stream._clients) == {open_ws}
+    stream.remove_client(open_ws)
+
+
+def test_clients_share_a_single_probe_loop(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    stream = StatusStream()
+    probe_mock = mocker.Mock(return_value=True)
+    mocker.patch.object(stream, "probes", return_value={"connected": probe_mock})
+
+    clients = [WsMock() for _ in range(5)]
+    for ws in clients:
+        stream.add_client(ws)
+
+    wait_for_condition(lambda: probe_mock.call_count == 1)
+    sleep(0.2)
+    assert probe_mock.call_count == 1
+    assert stream.flush(timeout=5)
+    for ws in clients:
+        # Clients added after the first probe get it in their STATUS message
+        assert ws.messages[-1]["payload"]["connected"] is True
+
+    for ws in clients:
+        stream.remove_client(ws)
+    wait_for_condition(lambda: stream._probe_thread is None)
+
+
+def test_status_is_updated_from_app_events(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.jobs import job_queue
+    from pt_os_web_portal.backend.helpers.status_stream import (
+        setup_status_stream_event_handlers,
+        status_stream,
+    )
+    from pt_os_web_portal.event import AppEvents, post_event
+
+    mocker.patch.object(status_stream, "probes", return_value={})
+    setup_status_stream_event_handlers()
+    ws = WsMock()
+    status_stream.add_client(ws)
+
+    post_event(AppEvents.IS_CONNECTED_TO_INTERNET, True)
+    post_event(AppEvents.OS_UPDATER_UPGRADE, "started")
+    run_event = Event()
+    job = job_queue.submit("test", run_event.set)
+    wait_for_jobs()
+    assert status_stream.flush(timeout=5)
+    status_stream.remove_client(ws)
+
+    deltas = [m["payload"] for m in ws.messages if m["type"] == "STATUS_DELTA"]
+    assert {"connected": True} in deltas
+    assert {"updater": {"upgrade": "started"}} in deltas
+    assert deltas[-1]["jobs"]["test"]["id"] == job.id
+    assert deltas[-1]["jobs"]["test"]["status"] == "SUCCESS"
+    assert status_stream.status()["jobs"]["test"]["status"] == "SUCCESS"
+
+
+def test_slow_clients_do_not_block_updates(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    stream = StatusStream()
+    mocker.patch.object(stream, "probes", return_value={})
+    send_event = Event()
+
+    class StalledWsMock(WsMock):
+        def send(self, data):
+            send_event.wait()
+            super().send(data)
+
+    stalled_ws = StalledWsMock()
+    ws = WsMock()
+    stream.add_client(stalled_ws)
+    stream.add_client(ws)
+
+    stream.update("connected", True)
+    stream.update("hasConnectedDevice", True)
+    assert stream.status()["hasConnectedDevice"] is True
+    assert wait_for_condition(lambda: len(ws.messages) == 3)
+    assert stalled_ws.messages == []
+
+    send_event.set()
+    assert stream.flush(timeout=5)
+    assert stalled_ws.messages == ws.messages
+    stream.remove_client(stalled_ws)
+    stream.remove_client(ws)
+
+
+def test_connectivity_is_probed_when_not_probed_in_the_background(
+    patch_modules, mocker
+):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    is_connected_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.status_stream.connectivity.is_connected",
+        return_value=True,
+    )
+    stream = StatusStream()
+    assert "connected" not in stream.probes()
+
+    stream.probe_connectivity = True
+    assert stream.probes()["connected"]() is True
+    is_connected_mock.assert_called_once_with(max_age=stream.PROBE_INTERVAL)
+
+
+def test_requested_values_are_only_probed_while_a_client_needs_them(
+    patch_modules, mocker
+):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    rover_controller_mock = mocker.Mock(return_value="active")
+    wifi_connection_mock = mocker.Mock(return_value={"ssid": "home"})
+    mocker.patch.object(
+        StatusStream,
+        "REQUESTED_PROBES",
+        {
+            "roverController": rover_controller_mock,
+            "wifiConnection": wifi_connection_mock,
+        },
+    )
+    stream = StatusStream()
+    stream.PROBE_INTERVAL = 0.05
+
+    ws = WsMock()
+    stream.add_client(ws)
+    sleep(0.2)
+    assert stream.probes() == {}
+    rover_controller_mock.assert_not_called()
+
+    rover_ws = WsMock()
+    stream.add_client(rover_ws, probes=["roverController", "unknown"])
+    assert wait_for_condition(
+        lambda: stream.status().get("roverController") == "active"
+    )
+    assert list(stream.probes()) == ["roverController"]
+    wifi_connection_mock.assert_not_called()
+    assert stream.flush(timeout=5)
+    assert {"roverController": "active"} in [
+        m["payload"] for m in ws.messages if m["type"] == "STATUS_DELTA"
+    ]
+
+    stream.remove_client(rover_ws)
+    assert "roverController" not in stream.status()
+    assert stream.probes() == {}
+    call_count = rover_controller_mock.call_count
+    sleep(0.2)
+    assert rover_controller_mock.call_count == call_count
+
+    stream.remove_client(ws)
+    wait_for_condition(lambda: stream._probe_thread is None)
+
+
+def test_requested_values_are_probed_as_soon_as_a_client_asks(patch_modules, mocker):
+    from pt_os_web_portal.backend.helpers.status_stream import StatusStream
+
+    rover_controller_mock = mocker.Mock(return_value="active")
+    mocker.patch.object(
+        StatusStream, "REQUESTED_PROBES", {"roverController": rover_controller_mock}
+    )
+    is_connected_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.status_stream.connectivity.is_connected",
+        return_value=True,
+    )
+    stream = StatusStream()
+    stream.PROBE_INTERVAL = 60
+    stream.probe_connectivity = True
+
+    ws = WsMock()
+    stream.add_client(ws)
+    # The probe loop waits for the next interval
+    assert wait_for_condition(lambda: is_connected_mock.call_count == 1, timeout=5)
+    rover_ws = WsMock()
+    stream.add_client(rover_ws, probes=["roverController"])
+
+    assert wait_for_condition(lambda: rover_controller_mock.call_count == 1, timeout=5)
+    assert stream.flush(timeout=5)
+    assert rover_ws.messages[-1] == {
+        "type": "STATUS_DELTA",
+        "payload": {"roverController": "active"},
+    }
+
+    stream.remove_client(ws)
+    stream.remove_client(rover_ws)
+    wait_for_condition(lambda: stream._probe_thread is None)
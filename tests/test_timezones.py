@@ -1,6 +1,7 @@
 from flask import json
 
 from tests.data.timezone_data import timezones_list
+from tests.utils import wait_for_jobs
 
 
 def test_list_timezones_correct_format(app):
@@ -26,12 +27,13 @@ def test_set_locale_success(app, mocker):
     )
 
     successful_response = app.post("/set-timezone", json={"timezone": valid_timezone})
+    wait_for_jobs()
     run_mock.assert_called_once_with(
         f"raspi-config nonint do_change_timezone {valid_timezone}",
         timeout=10,
     )
     assert successful_response.status_code == 200
-    assert successful_response.data == b"OK"
+    assert "jobId" in json.loads(successful_response.data)
 
 
 def test_set_locale_failure_wrong_type(app):
@@ -44,3 +46,66 @@ def test_set_locale_failure_invalid_code(app):
         "/set-timezone", json={"timezone": "fake-timezone"}
     )
     assert no_locale_found_error.status_code == 400
+
+
+def test_timezone_catalogue_calls_timedatectl_once(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.timezone.use_test_path", return_value=False
+    )
+    run_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.timezone.run_command",
+        return_value="Europe/Andorra\nEurope/London",
+    )
+    from pt_os_web_portal.backend.helpers.timezone import TimezoneCatalogue
+
+    catalogue = TimezoneCatalogue()
+    for _ in range(3):
+        timezones = catalogue.timezones()
+        assert catalogue.is_available("Europe/London")
+        assert not catalogue.is_available("Asia/Dubai")
+
+    run_mock.assert_called_once_with("timedatectl list-timezones", timeout=10)
+    assert timezones == [
+        {"countryCode": "AD", "timezone": "Europe/Andorra"},
+        {"countryCode": "GB", "timezone": "Europe/London"},
+    ]
+
+
+def test_timezone_catalogue_refreshes_when_zone_tab_changes(
+    patch_modules, mocker, tmp_path
+):
+    from os import utime
+
+    zone_tab = tmp_path / "zone.tab"
+    zone_tab.write_text("# comment\nAD\t+4230+00131\tEurope/Andorra\n")
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.timezone.zone_tab",
+        return_value=str(zone_tab),
+    )
+    from pt_os_web_portal.backend.helpers.timezone import TimezoneCatalogue
+
+    catalogue = TimezoneCatalogue()
+    assert catalogue.is_available("Europe/Andorra")
+    assert not catalogue.is_available("Asia/Dubai")
+
+    zone_tab.write_text(zone_tab.read_text() + "AE\t+2518+05518\tAsia/Dubai\n")
+    utime(zone_tab, (0, 0))
+
+    assert catalogue.is_available("Asia/Dubai")
+
+
+def test_empty_timezone_catalogue_is_not_cached(patch_modules, mocker):
+    mocker.patch(
+        "pt_os_web_portal.backend.helpers.timezone.use_test_path", return_value=False
+    )
+    # timedatectl is missing or failed
+    run_mock = mocker.patch(
+        "pt_os_web_portal.backend.helpers.timezone.run_command", return_value=""
+    )
+    from pt_os_web_portal.backend.helpers.timezone import TimezoneCatalogue
+
+    catalogue = TimezoneCatalogue()
+    assert catalogue.timezones() == []
+
+    run_mock.return_value = "Europe/London"
+    assert catalogue.timezones() == [{"countryCode": "GB", "timezone": "Europe/London"}]
@@ -1,6 +1,7 @@
 from flask import json
 
 from tests.data.wifi_country_data import country_code_sample, wifi_country_list
+from tests.utils import wait_for_jobs
 
 
 def test_list_wifi_countries_gets_correct_formats(app):
@@ -39,12 +40,13 @@ def test_set_wifi_country_success(app, mocker):
     successful_response = app.post(
         "/set-wifi-country", json={"wifi_country": valid_country_code}
     )
+    wait_for_jobs()
     run_mock.assert_called_once_with(
         f"raspi-config nonint do_wifi_country {valid_country_code}",
         timeout=15,
     )
     assert successful_response.status_code == 200
-    assert successful_response.data == b"OK"
+    assert "jobId" in json.loads(successful_response.data)
 
 
 def test_set_wifi_country_failure_wrong_type(app):
@@ -57,3 +59,16 @@ def test_set_wifi_country_failure_invalid_code(app):
         "/set-wifi-country", json={"wifi_country": "fake-country-code"}
     )
     assert no_locale_found_error.status_code == 400
+
+
+def test_set_wifi_country_job_fails_for_invalid_code(app, mocker):
+    run_mock = mocker.patch("pt_os_web_portal.backend.helpers.wifi_country.run_command")
+    from pt_os_web_portal.backend.helpers.jobs import JobStatus, job_queue
+    from pt_os_web_portal.backend.helpers.wifi_country import set_wifi_country
+
+    job = job_queue.submit("wifi_country", set_wifi_country, "fake-country-code")
+    wait_for_jobs()
+
+    assert job.status == JobStatus.FAILED
+    assert "Not available" in job.error
+    run_mock.assert_not_called()
@@ -77,7 +77,7 @@ def test_post_wifi_credentials_failure_on_wrong_password_type(app, mocker):
 
 def test_get_is_connected_response_if_connected(app, mocker):
     run_mock = mocker.patch(
-        "pt_os_web_portal.backend.routes.is_connected_to_internet",
+        "pt_os_web_portal.backend.routes.connectivity.is_connected",
         return_value=True,
     )
 
@@ -90,7 +90,8 @@ def test_get_is_connected_response_if_connected(app, mocker):
 
 def test_get_is_connected_response_if_disconnected(app, mocker):
     run_mock = mocker.patch(
-        "pt_os_web_portal.backend.routes.is_connected_to_internet", return_value=False
+        "pt_os_web_portal.backend.routes.connectivity.is_connected",
+        return_value=False,
     )
 
     response = app.get("/is-connected")
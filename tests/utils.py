@@ -46,3 +46,10 @@ def wait_for_condition(condition, timeout=10):
     while not condition() and time() - start_time < timeout:
         sleep(0.1)
     return condition()
+
+
+def wait_for_jobs(timeout=5):
+    """waits until all background jobs from the job queue are done"""
+    from pt_os_web_portal.backend.helpers.jobs import job_queue
+
+    assert job_queue.wait(timeout=timeout)